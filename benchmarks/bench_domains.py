@@ -0,0 +1,51 @@
+"""Per-record cost of resolving the domain of an item url.
+
+    python benchmarks/bench_domains.py [n_records]
+
+Compares a ``tldextract.extract`` call per record (what ``get_domain_counts`` used to
+do on every call) with the memoized, offline ``domains.get_domain_from_url``.
+"""
+import os
+import sys
+import random
+import timeit
+import tldextract
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pocket_stats'))
+
+import domains  # noqa: E402
+
+
+HOSTS = ['www.google.com', 'medium.com', 'm.facebook.com', 'blog.example.co.uk', 'news.ycombinator.com',
+         'en.wikipedia.org', 'github.com', 'arxiv.org', 'www.bbc.co.uk', 'towardsdatascience.com']
+
+
+def synthetic_urls(n: int, n_hosts: int = 500, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    hosts = [f'sub{i}.{rng.choice(HOSTS)}' for i in range(n_hosts)]
+    return [f'https://{rng.choice(hosts)}/article/{i}?ref={rng.randrange(100)}' for i in range(n)]
+
+
+def per_record_us(fn, urls: list, repeat: int = 3) -> float:
+    best = min(timeit.repeat(lambda: [fn(u) for u in urls], number=1, repeat=repeat))
+    return best / len(urls) * 1e6
+
+
+def main(n: int) -> None:
+    urls = synthetic_urls(n)
+    extractor = tldextract.TLDExtract(suffix_list_urls=())
+
+    def uncached(url):
+        r = extractor(url)
+        return r.domain + '.' + r.suffix
+
+    domains.get_domain_from_hostname.cache_clear()
+    before = per_record_us(uncached, urls)
+    after = per_record_us(domains.get_domain_from_url, urls)
+    print(f'{n} records, {domains.get_domain_from_hostname.cache_info().currsize} distinct hostnames')
+    print(f'tldextract per record: {before:8.2f} us')
+    print(f'memoized per record:   {after:8.2f} us ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
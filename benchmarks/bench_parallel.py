@@ -0,0 +1,66 @@
+"""Title tokenization in this process and on a joblib process pool, to pick POCKET_STATS_PARALLEL_MIN_RECORDS.
+
+    python benchmarks/bench_parallel.py [--jobs n] [n_records ...]
+
+``cold`` includes starting the worker processes (the first large library of a
+gunicorn worker, or the first one after the workers were idle for 5 minutes),
+``warm`` reuses them. Below about 1 MB of titles (~20000 records) joblib pickles
+the arrays to every worker instead of memory mapping them. The printed cutoffs
+are the smallest sizes from which the pool is faster than one process: set
+``POCKET_STATS_PARALLEL_MIN_RECORDS`` between them on the machine that serves
+the dashboard, closer to the cold one when large libraries are rare.
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pocket_stats'))
+
+import data  # noqa: E402
+from text import TitleIndex  # noqa: E402
+from parallel import parallel_title_index  # noqa: E402
+from synthetic import synthetic_records  # noqa: E402
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(sizes: list, n_jobs: int) -> None:
+    # imported here like in parallel.py, so the first cold run pays for it too
+    from joblib.externals.loky import get_reusable_executor
+    print(f'{n_jobs} processes, {os.cpu_count()} cores')
+    print(f"{'records':>8} {'serial':>8} {'cold':>8} {'warm':>8}")
+    cutoffs = {'warm': None, 'cold': None}
+    for n in sizes:
+        table = data.build_table(synthetic_records(n))
+        langs, codes = table.categories['lang'], table.column('lang')
+        serial = timed(lambda: TitleIndex.from_titles(table.titles, (langs[code] for code in codes)))
+        get_reusable_executor().shutdown(wait=True)
+        cold = timed(lambda: parallel_title_index(table.titles, codes, langs, n_jobs))
+        warm = timed(lambda: parallel_title_index(table.titles, codes, langs, n_jobs))
+        print(f'{n:>8} {serial:>8.3f} {cold:>8.3f} {warm:>8.3f}', flush=True)
+        for name, seconds in [('warm', warm), ('cold', cold)]:
+            # the smallest size from which the pool is faster for every larger size
+            if seconds >= serial:
+                cutoffs[name] = None
+            elif cutoffs[name] is None:
+                cutoffs[name] = n
+    for name, cutoff in cutoffs.items():
+        if cutoff is None:
+            print(f'A {name} process pool is never faster here')
+        else:
+            print(f'A {name} process pool is faster from {cutoff} records')
+    if cutoffs['warm'] is None:
+        print('Set POCKET_STATS_PARALLEL_JOBS=1')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('sizes', type=int, nargs='*', default=[5000, 10000, 20000, 50000, 100000, 200000])
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    args = parser.parse_args()
+    main(args.sizes, args.jobs)
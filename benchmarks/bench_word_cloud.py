@@ -0,0 +1,35 @@
+"""Layout time of the word cloud for growing numbers of words.
+
+    python benchmarks/bench_word_cloud.py [k ...]
+
+Word counts follow a Zipf distribution over synthetic words, like the titles of a
+large library.
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'pocket_stats'))
+
+from word_cloud import layout_words  # noqa: E402
+
+
+def synthetic_word_counts(n: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = {''.join(rng.choice(letters) for _ in range(rng.randint(3, 12))) for _ in range(n * 2)}
+    return {w: int(10000 / (rank + 1)) + 1 for rank, w in enumerate(sorted(words)[:n])}
+
+
+def main(ks: list) -> None:
+    print(f"{'k':>6} {'placed':>7} {'seconds':>8}")
+    for k in ks:
+        word_counts = synthetic_word_counts(k)
+        start = time.perf_counter()
+        placed = layout_words(word_counts, k=k)
+        print(f'{k:>6} {len(placed):>7} {time.perf_counter() - start:>8.3f}')
+
+
+if __name__ == '__main__':
+    main([int(k) for k in sys.argv[1:]] or [100, 200, 500, 1000, 2000, 5000])
@@ -0,0 +1,179 @@
+"""Time and peak memory of the statistics, the chart builders and a dashboard reload on synthetic libraries.
+
+    python benchmarks/run_benchmarks.py [--sizes 1000 10000 ...] [--save-baseline] [--check]
+
+Every ``get_*`` function of ``data.py`` and every ``*_plot`` builder of
+``visualization.py`` is run on a fresh ``ArticleTable`` of each size, i.e.
+without the indexes built by a previous call. ``reload`` is what a click on the
+reload button computes: the table, the dashboard aggregates and every section,
+from a library that is already fetched. ``reload_unchanged`` is the same click
+when the library did not change since the last one. Times are the best of ``--repeat`` runs;
+peak memory is measured in a separate run with ``tracemalloc``.
+
+Results are compared with ``benchmarks/baseline.json``; ``--check`` exits with 1
+when a benchmark is more than ``--tolerance`` times slower than its baseline.
+Baselines are only comparable on the same machine: rebuild them with
+``--save-baseline`` before changing the code you want to measure.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+# the largest libraries, their tables and aggregates must stay in the cache, or a reload would fetch them
+os.environ.setdefault('POCKET_STATS_CACHE_BACKEND', 'memory')
+os.environ.setdefault('POCKET_STATS_CACHE_MAX_BYTES', str(16 * 1024 ** 3))
+sys.path.append(os.path.join(CURRENT_DIR, '..', 'pocket_stats'))
+
+import data  # noqa: E402
+import visualization  # noqa: E402
+from table import ArticleTable  # noqa: E402
+from cache import get_cache  # noqa: E402
+from aggregates import get_aggregates  # noqa: E402
+from synthetic import synthetic_records  # noqa: E402
+
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+BASELINE_FILE = os.path.join(CURRENT_DIR, 'baseline.json')
+BENCHMARK_TOKEN = 'benchmark'
+MIN_SECONDS = 0.005  # faster benchmarks are too noisy to be compared with the tolerance
+
+# name -> function of a fresh ArticleTable
+STATISTICS: Dict[str, Callable[[ArticleTable], object]] = {
+    'get_title_index': data.get_title_index,
+    'count_words_in_title': data.count_words_in_title,
+    'get_top_terms': data.get_top_terms,
+    'get_word_counts': data.get_word_counts,
+    'get_reading_time': data.get_reading_time,
+    'get_time_series': data.get_time_series,
+    'get_added_time_series': data.get_added_time_series,
+    'get_archived_time_series': data.get_archived_time_series,
+    'get_reading_index': data.get_reading_index,
+    'get_average_readed_word': lambda table: data.get_average_readed_word(table, n_last_days=30),
+    'get_words_read_rolling': data.get_words_read_rolling,
+    'get_domain_counts': data.get_domain_counts,
+    'get_language_counts': data.get_language_counts,
+    'get_favorite_count': data.get_favorite_count,
+    'get_unread_count': data.get_unread_count,
+    'get_composition': data.get_composition,
+}
+PLOTS: Dict[str, Callable[[ArticleTable], object]] = {
+    'word_cloud_plot': visualization.word_cloud_plot,
+    'articles_over_time_plot': visualization.articles_over_time_plot,
+    'word_counts_plot': visualization.word_counts_plot,
+    'reading_time_plot': visualization.reading_time_plot,
+    'domain_counts_plot': visualization.domain_counts_plot,
+    'language_counts_plot': visualization.language_counts_plot,
+    'favorite_count_plot': visualization.favorite_count_plot,
+    'composition_plot': visualization.composition_plot,
+}
+
+
+def fresh_table(table: ArticleTable) -> ArticleTable:
+    # same columns, without the masks and indexes cached on the table by earlier calls
+    return ArticleTable(table.columns, table.categories, table.item_ids, table.titles)
+
+
+def reload(records: List[Dict]) -> None:
+    # a changed library: the table, the aggregates and every section are computed again
+    get_cache().delete(data.make_key('aggregates', BENCHMARK_TOKEN, None))
+    reload_unchanged(records)
+
+
+def reload_unchanged(records: List[Dict]) -> None:
+    # a refetch of the same library: the aggregates are served from their materialized snapshot
+    data.put_data_entry(BENCHMARK_TOKEN, records)
+    get_aggregates(BENCHMARK_TOKEN)
+    for name in visualization.SECTIONS:
+        visualization.build_section(name, BENCHMARK_TOKEN, None)
+
+
+def measure(fn: Callable[[], object], setup: Callable[[], tuple], repeat: int) -> Tuple[float, float]:
+    """(best time in seconds, peak traced memory in MB) of ``fn(*setup())``."""
+    best = float('inf')
+    for _ in range(repeat):
+        args = setup()
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    args = setup()
+    tracemalloc.start()
+    try:
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 2 ** 20
+
+
+def run(sizes: List[int], repeat: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results = {}
+    for n in sizes:
+        records = synthetic_records(n)
+        table = data.build_table(records)
+        benchmarks = [('build_table', data.build_table, lambda: (records,))]
+        benchmarks += [(name, fn, lambda: (fresh_table(table),)) for name, fn in {**STATISTICS, **PLOTS}.items()]
+        benchmarks.append(('reload', reload, lambda: (records,)))
+        benchmarks.append(('reload_unchanged', reload_unchanged, lambda: (records,)))
+        results[str(n)] = {}
+        for name, fn, setup in benchmarks:
+            seconds, peak_mb = measure(fn, setup, repeat)
+            results[str(n)][name] = {'seconds': round(seconds, 6), 'peak_mb': round(peak_mb, 3)}
+            print(f'{n:>8} {name:<26} {seconds:>10.4f} s {peak_mb:>10.2f} MB', flush=True)
+        get_cache().delete(data.make_key('data', BENCHMARK_TOKEN))
+        get_cache().delete(data.make_key('aggregates', BENCHMARK_TOKEN, None))
+    return results
+
+
+def regressions(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    ans = []
+    for n, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            before = baseline.get(n, {}).get(name)
+            if before is None or max(result['seconds'], before['seconds']) < MIN_SECONDS:
+                continue
+            if result['seconds'] > tolerance * before['seconds']:
+                ans.append(f'{name} on {n} records: {result["seconds"]:.4f} s, baseline {before["seconds"]:.4f} s')
+            if result['peak_mb'] > tolerance * max(before['peak_mb'], 1):
+                ans.append(f'{name} on {n} records: {result["peak_mb"]:.2f} MB, baseline {before["peak_mb"]:.2f} MB')
+    return ans
+
+
+def main(args: argparse.Namespace) -> int:
+    results = run(args.sizes, args.repeat)
+    if args.save_baseline:
+        baseline = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+        if os.path.isfile(args.baseline):
+            with open(args.baseline, 'r') as fi:
+                old = json.load(fi)['results']
+            baseline['results'] = {**old, **results}  # keep the sizes that were not run
+        with open(args.baseline, 'w') as fo:
+            json.dump(baseline, fo, indent=2, sort_keys=True)
+        print(f'Saved the baseline to {args.baseline}')
+        return 0
+    if not os.path.isfile(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --save-baseline first')
+        return 0
+    with open(args.baseline, 'r') as fi:
+        found = regressions(results, json.load(fi)['results'], args.tolerance)
+    for line in found:
+        print(f'REGRESSION {line}')
+    if not found:
+        print(f'No benchmark is more than {args.tolerance}x slower or larger than the baseline')
+    return 1 if (found and args.check) else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='numbers of records')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the best one is kept')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='JSON file of the baseline results')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='slowdown ratio reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with 1 when there is a regression')
+    sys.exit(main(parser.parse_args()))
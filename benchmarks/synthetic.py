@@ -0,0 +1,81 @@
+"""Synthetic Pocket libraries, with the fields and value types of the records returned by the Pocket API.
+
+    from synthetic import synthetic_records
+    records = synthetic_records(100000)
+
+Domains and title words follow Zipf distributions, most items are in English,
+about half of them are archived and a few are favorited or have no word count,
+like a real library. The records only depend on ``n``, ``seed`` and ``now``.
+"""
+import random
+import itertools
+from typing import List, Dict
+
+
+SITES = ['medium.com', 'github.com', 'en.wikipedia.org', 'news.ycombinator.com', 'arxiv.org', 'www.bbc.co.uk',
+         'towardsdatascience.com', 'www.nytimes.com', 'blog.example.co.uk', 'dev.to', 'stackoverflow.com',
+         'www.theguardian.com', 'lwn.net', 'www.economist.com', 'martinheinz.dev']
+LANGUAGES = ['en'] * 85 + ['fr'] * 4 + ['de'] * 3 + ['es'] * 3 + ['vi'] * 2 + ['ja'] + [''] * 2
+WORDS = ['python', 'data', 'learning', 'system', 'design', 'performance', 'linux', 'kernel', 'memory', 'career',
+         'advice', 'programmer', 'startup', 'history', 'science', 'web', 'database', 'network', 'security',
+         'rust', 'go', 'javascript', 'cloud', 'distributed', 'cache', 'latency', 'profiling', 'strace', 'syscall',
+         'book', 'review', 'guide', 'introduction', 'deep', 'dive', 'why', 'how', 'the', 'a', 'to', 'of', 'and',
+         'in', 'is', 'for', 'your', 'with', 'on', 'what', 'we', 'you', 'should', 'never', 'best', 'practices']
+YEARS = 6  # time span of the library, ending at ``now``
+DAY = 24 * 3600
+
+
+def zipf_weights(n: int, s: float) -> List[float]:
+    # cumulative weights, for random.choices(cum_weights=...)
+    return list(itertools.accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+
+WORD_WEIGHTS = zipf_weights(len(WORDS), 0.8)
+
+
+def synthetic_record(rng: random.Random, item_id: int, host: str, title: str, now: int) -> Dict:
+    time_added = now - int(rng.random() ** 0.7 * YEARS * 365 * DAY)  # more items added recently
+    status = rng.choices(['0', '1', '2'], weights=[45, 54, 1])[0]
+    time_read = min(now, time_added + int(rng.expovariate(1 / (30 * DAY)))) if status == '1' else 0
+    favorite = '1' if rng.random() < 0.05 else '0'
+    time_favorited = min(now, time_added + int(rng.expovariate(1 / (10 * DAY)))) if favorite == '1' else 0
+    word_count = 0 if rng.random() < 0.03 else max(50, int(rng.lognormvariate(7, 0.8)))
+    url = f'https://{host}/{item_id}/{title.lower().replace(" ", "-")}'
+    return {
+        'item_id': str(item_id),
+        'resolved_id': str(item_id),
+        'given_url': url,
+        'given_title': title,
+        'favorite': favorite,
+        'status': status,
+        'time_added': str(time_added),
+        'time_updated': str(max(time_added, time_read, time_favorited)),
+        'time_read': str(time_read),
+        'time_favorited': str(time_favorited),
+        'sort_id': 0,
+        'resolved_title': title,
+        'resolved_url': url,
+        'excerpt': title + '. ' + ' '.join(rng.choices(WORDS, cum_weights=WORD_WEIGHTS, k=30)),
+        'is_article': '1',
+        'is_index': '0',
+        'has_video': '1' if rng.random() < 0.05 else '0',
+        'has_image': '1' if rng.random() < 0.6 else '0',
+        'word_count': str(word_count),
+        'lang': rng.choice(LANGUAGES),
+        'time_to_read': max(1, word_count // 220),
+        'listen_duration_estimate': int(word_count / 2.6),
+    }
+
+
+def synthetic_records(n: int, seed: int = 0, now: int = 1600000000, n_hosts: int = None) -> List[Dict]:
+    """``n`` Pocket records, newest first like the ones returned by ``data.fetch_data()``."""
+    rng = random.Random(seed)
+    n_hosts = n_hosts or max(10, n // 20)
+    hosts = [SITES[i % len(SITES)] if i < len(SITES) else f'sub{i}.{rng.choice(SITES)}' for i in range(n_hosts)]
+    host_choices = rng.choices(hosts, cum_weights=zipf_weights(n_hosts, 1.1), k=n)
+    records = []
+    for i in range(n):
+        title = ' '.join(rng.choices(WORDS, cum_weights=WORD_WEIGHTS, k=rng.randint(3, 10))).capitalize()
+        records.append(synthetic_record(rng, 100000000 + i, host_choices[i], title, now))
+    records.sort(key=lambda r: -int(r['time_added']))
+    return records
@@ -1,5 +1,6 @@
 import click
 from data import fetch_data as _fetch_data
+from constants import configure_logging
 
 
 @click.command()
@@ -7,7 +8,7 @@ from data import fetch_data as _fetch_data
 @click.option('--limit', type=int, default=None, help='Number of items to be fetched')
 @click.option('--overwrite_cache', is_flag=True, help='Will overwrite the local cache')
 def fetch_data(offset: int, limit: int, overwrite_cache: bool) -> None:
-    ans = _fetch_data(offset, limit, overwrite_cache)
+    ans = _fetch_data(offset=offset, limit=limit, overwrite_cache=overwrite_cache)
     if len(ans) > 0:
         print('Sample record:')
         print(ans[0])
@@ -15,7 +16,7 @@ def fetch_data(offset: int, limit: int, overwrite_cache: bool) -> None:
 
 @click.group()
 def cli() -> None:
-    pass
+    configure_logging()
 
 
 cli.add_command(fetch_data)
@@ -0,0 +1,379 @@
+import logging
+import numpy as np
+from collections import Counter
+from typing import List, Dict, Tuple, Any, Optional
+from table import ArticleTable, STATUS_UNREAD, STATUS_ARCHIVED, MISSING_STATUS
+from data import Dataset, as_table, count_words_in_title, get_composition
+from data import get_data_entry, get_table, get_fingerprint, get_reading_index
+from fingerprint import column_fingerprints
+from cache import get_cache, make_key
+from coalesce import IN_FLIGHT
+from instrumentation import timed
+from constants import DEFAULT_READING_SPEED, READING_TIME_BIN_MINUTES, READING_DISTRIBUTION_BIN_WORDS
+from timeseries import DEFAULT_EVENTS, DEFAULT_GRANULARITY, TimeZone, time_series
+from reading_index import ReadingIndex, DEFAULT_ROLLING_WINDOW_DAYS
+
+
+# aggregate spec format: (name, params)
+# every spec of a compute_aggregates() call is answered from the same sweep over the table
+AggregateSpec = Tuple[str, Dict[str, Any]]
+
+STATUSES = (STATUS_UNREAD, STATUS_ARCHIVED)
+DEFAULT_WORD_COUNT_BIN_SIZE = 500
+N_LAST_DAY_OPTIONS = [360, 90, 30, 7, 2]
+
+DASHBOARD_AGGREGATES: List[AggregateSpec] = [
+    ('count', {}),
+    ('title_word_counts', {}),
+    ('time_series', {'granularity': DEFAULT_GRANULARITY}),
+    ('average_readed_words', {'n_last_days': N_LAST_DAY_OPTIONS}),
+    ('words_read_rolling', {'window_days': DEFAULT_ROLLING_WINDOW_DAYS}),
+    ('word_count_histogram', {'bin_size': DEFAULT_WORD_COUNT_BIN_SIZE}),
+    ('reading_distribution', {'bin_words': READING_DISTRIBUTION_BIN_WORDS}),
+    ('domain_counts', {}),
+    ('language_counts', {}),
+    ('favorite_count', {}),
+    ('composition', {}),
+]
+
+
+class _Sweep:
+    # lazily computed intermediate columns shared by the aggregates of one compute_aggregates() call
+
+    def __init__(self, table: ArticleTable):
+        self.table = table
+        self._cache = {}
+
+    def get(self, name: str, compute) -> Any:
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    @property
+    def status_row(self) -> np.ndarray:
+        # row index per record: 0 for MISSING_STATUS, then one row per Pocket status
+        return self.get('status_row', lambda: self.table.column('status').astype(np.int64) - MISSING_STATUS)
+
+    def split_by_status(self, codes: np.ndarray, n_codes: int) -> Dict[Any, np.ndarray]:
+        # one bincount over (status, code) pairs instead of one pass per status
+        n_rows = STATUS_ARCHIVED - MISSING_STATUS + 2
+        rows = np.minimum(self.status_row, n_rows - 1)
+        counts = np.bincount(rows * n_codes + codes, minlength=n_rows * n_codes).reshape(n_rows, n_codes)
+        ans = {status: counts[status - MISSING_STATUS] for status in STATUSES}
+        ans['all'] = counts.sum(axis=0)
+        return ans
+
+
+def _count(sweep: _Sweep) -> int:
+    return len(sweep.table)
+
+
+def _title_word_counts(sweep: _Sweep) -> Dict[str, int]:
+    return count_words_in_title(sweep.table)
+
+
+def _time_series(sweep: _Sweep, events: Tuple[str, ...] = DEFAULT_EVENTS,
+                 granularity: str = DEFAULT_GRANULARITY, tz: TimeZone = None):
+    return time_series(sweep.table, events, granularity, tz)
+
+
+def _added_time_series(sweep: _Sweep, granularity: str = DEFAULT_GRANULARITY, tz: TimeZone = None):
+    return time_series(sweep.table, ('added',), granularity, tz)
+
+
+def _archived_time_series(sweep: _Sweep, granularity: str = DEFAULT_GRANULARITY, tz: TimeZone = None):
+    return time_series(sweep.table, ('archived',), granularity, tz)
+
+
+def average_readed_words(index: ReadingIndex, n_last_days: List[int]) -> Dict[int, float]:
+    return {n: index.average_words_since(n) for n in n_last_days}
+
+
+def _average_readed_words(sweep: _Sweep, n_last_days: List[int]) -> Dict[int, float]:
+    return average_readed_words(get_reading_index(sweep.table), n_last_days)
+
+
+def _words_read_rolling(sweep: _Sweep, window_days: int = DEFAULT_ROLLING_WINDOW_DAYS, tz: TimeZone = None):
+    return get_reading_index(sweep.table).rolling(window_days, tz)
+
+
+def _histogram(sweep: _Sweep, values: np.ndarray, valid: np.ndarray,
+               bin_size: float = None, edges: List[float] = None) -> Dict[Any, np.ndarray]:
+    # per-status counts of values in bins of bin_size from 0, or between the given edges (last bin closed)
+    if edges is None:
+        max_value = values[valid].max() if valid.any() else 0
+        n_bins = int(max_value // bin_size) + 1
+        edges = np.arange(n_bins + 1) * bin_size
+        bins = values // bin_size
+    else:
+        edges = np.asarray(edges)
+        n_bins = len(edges) - 1
+        bins = np.minimum(np.searchsorted(edges, values, side='right') - 1, n_bins - 1)
+        valid = valid & (values >= edges[0]) & (values <= edges[-1])
+    bins = np.where(valid, bins, n_bins).astype(np.int64)  # invalid records go to an extra, dropped bin
+    ans = {k: v[:n_bins] for k, v in sweep.split_by_status(bins, n_bins + 1).items()}
+    ans['edges'] = edges
+    return ans
+
+
+def _word_count_histogram(sweep: _Sweep, bin_size: int = DEFAULT_WORD_COUNT_BIN_SIZE,
+                          edges: List[float] = None) -> Dict[Any, np.ndarray]:
+    word_counts = sweep.table.column('word_count')
+    return _histogram(sweep, word_counts, word_counts >= 0, bin_size, edges)
+
+
+def _reading_time_histogram(sweep: _Sweep, reading_speed: int = DEFAULT_READING_SPEED,
+                            bin_minutes: float = READING_TIME_BIN_MINUTES,
+                            edges: List[float] = None) -> Dict[Any, np.ndarray]:
+    # minutes to read each article, the ones without word count are left out like in get_reading_time()
+    word_counts = sweep.table.column('word_count')
+    return _histogram(sweep, word_counts / reading_speed, word_counts > 0, bin_minutes, edges)
+
+
+def _reading_distribution(sweep: _Sweep, bin_words: int = READING_DISTRIBUTION_BIN_WORDS) -> Dict[Any, Any]:
+    # fine word count histogram and total words of the articles with a word count, see rebin_reading_time()
+    word_counts = sweep.table.column('word_count')
+    valid = word_counts > 0
+    ans = _histogram(sweep, word_counts, valid, bin_words)
+    status = sweep.table.column('status')
+    ans['total_words'] = {s: int(word_counts[valid & (status == s)].sum()) for s in STATUSES}
+    return ans
+
+
+def rebin_reading_time(distribution: Dict[Any, Any], reading_speed: int = DEFAULT_READING_SPEED,
+                       bin_minutes: float = READING_TIME_BIN_MINUTES) -> Dict[Any, np.ndarray]:
+    """Reading time histogram for any reading speed from a ``reading_distribution`` aggregate.
+
+    Costs O(number of word count bins): each bin is moved, by the center of its
+    edges rescaled to minutes, into a bin of ``bin_minutes``. The same is done in
+    the browser by ``visualization.READING_TIME_CLIENTSIDE``.
+    """
+    edges = np.asarray(distribution['edges'], dtype=np.float64)
+    bins = ((edges[:-1] + edges[1:]) / 2 / reading_speed // bin_minutes).astype(np.int64)
+    n_bins = int(bins[-1]) + 1 if len(bins) > 0 else 1
+    ans = {s: np.bincount(bins, weights=distribution[s], minlength=n_bins).astype(np.int64) for s in STATUSES}
+    ans['edges'] = np.arange(n_bins + 1) * bin_minutes
+    return ans
+
+
+def _domain_counts(sweep: _Sweep) -> Dict[Any, Dict[str, int]]:
+    table = sweep.table
+    domains = table.categories['domain']
+    counts = sweep.split_by_status(table.column('domain'), len(domains))
+    return {k: Counter({domains[code]: int(cnt) for code, cnt in enumerate(v) if cnt > 0}) for k, v in counts.items()}
+
+
+def _language_counts(sweep: _Sweep) -> Dict[str, int]:
+    return Counter(sweep.table.category_counts('lang'))
+
+
+def _favorite_count(sweep: _Sweep) -> Dict[str, int]:
+    total = len(sweep.table)
+    cnt = int(np.count_nonzero(sweep.table.column('favorite') == 1))
+    return {
+        'count': cnt,
+        'percent': 1.0 * cnt / total if total > 0 else 0,
+    }
+
+
+def _composition(sweep: _Sweep) -> Dict[str, int]:
+    return get_composition(sweep.table)
+
+
+AGGREGATORS = {
+    'count': _count,
+    'title_word_counts': _title_word_counts,
+    'time_series': _time_series,
+    'added_time_series': _added_time_series,
+    'archived_time_series': _archived_time_series,
+    'average_readed_words': _average_readed_words,
+    'words_read_rolling': _words_read_rolling,
+    'word_count_histogram': _word_count_histogram,
+    'reading_time_histogram': _reading_time_histogram,
+    'reading_distribution': _reading_distribution,
+    'domain_counts': _domain_counts,
+    'language_counts': _language_counts,
+    'favorite_count': _favorite_count,
+    'composition': _composition,
+}
+
+# columns each aggregate is computed from, see fingerprint.column_fingerprints():
+# a materialized aggregate is reused while the digests of its columns are unchanged
+TIME_SERIES_COLUMNS = ('time_added', 'status', 'favorite', 'time_favorited', 'time_read')
+READING_INDEX_COLUMNS = ('status', 'time_updated', 'word_count')
+AGGREGATE_COLUMNS = {
+    'count': ('rows',),
+    'title_word_counts': ('titles', 'lang'),
+    'time_series': TIME_SERIES_COLUMNS,
+    'added_time_series': ('time_added',),
+    'archived_time_series': ('time_added', 'status'),
+    'average_readed_words': READING_INDEX_COLUMNS,
+    'words_read_rolling': READING_INDEX_COLUMNS,
+    'word_count_histogram': ('word_count', 'status'),
+    'reading_time_histogram': ('word_count', 'status'),
+    'reading_distribution': ('word_count', 'status'),
+    'domain_counts': ('domain', 'status'),
+    'language_counts': ('lang',),
+    'favorite_count': ('rows', 'favorite'),
+    'composition': ('rows', 'status', 'favorite', 'is_article', 'has_video', 'has_image'),
+}
+# aggregates relative to the current time: answered from the materialized ReadingIndex on every call
+TIME_RELATIVE_AGGREGATES = {'average_readed_words': average_readed_words}
+
+
+@timed()
+def compute_aggregates(data: Dataset, specs: List[AggregateSpec] = DASHBOARD_AGGREGATES) -> Dict[str, Any]:
+    """Compute every aggregate in ``specs`` with shared intermediate columns.
+
+    Per-status aggregates (``domain_counts``, ``word_count_histogram``) are returned as
+    ``{STATUS_UNREAD: ..., STATUS_ARCHIVED: ..., 'all': ...}``.
+    """
+    sweep = _Sweep(as_table(data))
+    ans = {}
+    for name, params in specs:
+        if name not in AGGREGATORS:
+            raise NotImplementedError(name)
+        ans[name] = AGGREGATORS[name](sweep, **params)
+    return ans
+
+
+def _spec_key(spec: AggregateSpec) -> str:
+    return repr(spec)
+
+
+def _unchanged(snapshot: Dict[str, Any], columns: Dict[str, str], names: Tuple[str, ...]) -> bool:
+    return all(snapshot['columns'].get(name) == columns[name] for name in names)
+
+
+@timed()
+def materialize(table: ArticleTable, specs: List[AggregateSpec], fingerprint: str,
+                previous: Dict[str, Any] = None) -> Dict[str, Any]:
+    """Materialized aggregates of ``table``, as stored by ``get_aggregates()``.
+
+    Aggregates of ``previous``, the snapshot of an older version of the library,
+    are kept when the columns they are computed from (``AGGREGATE_COLUMNS``) are
+    unchanged: archiving items does not count the title words again. Only the
+    others, and the ones in ``specs`` it does not have, are computed.
+    """
+    columns = column_fingerprints(table)
+    values, reading_index = {}, None
+    if previous is not None:
+        values = {key: entry for key, entry in previous['values'].items()
+                  if _unchanged(previous, columns, AGGREGATE_COLUMNS[entry[0]])}
+        if _unchanged(previous, columns, READING_INDEX_COLUMNS):
+            reading_index = previous['reading_index']
+    sweep = _Sweep(table)
+    for name, params in specs:
+        if name not in AGGREGATORS:
+            raise NotImplementedError(name)
+        key = _spec_key((name, params))
+        if key not in values:
+            values[key] = (name, AGGREGATORS[name](sweep, **params))
+    if reading_index is None and any(name in TIME_RELATIVE_AGGREGATES for name, _ in specs):
+        reading_index = get_reading_index(table)
+    return {'fingerprint': fingerprint, 'columns': columns, 'values': values, 'reading_index': reading_index}
+
+
+def serve_aggregates(snapshot: Dict[str, Any], specs: List[AggregateSpec]) -> Dict[str, Any]:
+    ans = {}
+    for spec in specs:
+        name, params = spec
+        if name in TIME_RELATIVE_AGGREGATES:
+            ans[name] = TIME_RELATIVE_AGGREGATES[name](snapshot['reading_index'], **params)
+        else:
+            ans[name] = snapshot['values'][_spec_key(spec)][1]
+    return ans
+
+
+def _view(entry: Dict[str, Any], limit: int = None) -> List[Dict]:
+    return entry['items'] if limit is None else entry['items'][:limit]
+
+
+def _view_length(entry: Dict[str, Any], limit: int = None) -> int:
+    return len(entry['items']) if limit is None else min(limit, len(entry['items']))
+
+
+def _with_incremental(snapshot: Dict[str, Any], incremental: Any, entry: Dict[str, Any],
+                      limit: Optional[int]) -> Dict[str, Any]:
+    # what update_aggregates() needs to follow the next delta sync of the library
+    records = {str(record['item_id']): record for record in _view(entry, limit)}
+    incremental.last_sync = entry['last_sync']
+    return dict(snapshot, incremental=incremental, records=records, view=(entry['items'], _view_length(entry, limit)))
+
+
+def update_aggregates(snapshot: Optional[Dict[str, Any]], entry: Dict[str, Any], limit: Optional[int],
+                      fingerprint: str) -> Optional[Dict[str, Any]]:
+    """``snapshot`` updated with the delta sync ``entry`` is the result of, None when it is not the one before it.
+
+    The dashboard aggregates are updated in place by the ``incremental.IncrementalAggregates``
+    kept in the snapshot: only the records changed by the sync, or pushed in or
+    out of the newest ``limit`` items by it, are retracted and applied again.
+    The aggregates served from ``snapshot`` meanwhile are copies, left as they are.
+    """
+    changes = entry['changes']
+    incremental = None if snapshot is None else snapshot.get('incremental')
+    if (incremental is None) or (changes is None):
+        return None
+    view = (entry['items'], _view_length(entry, limit))
+    try:
+        updated = incremental.apply_sync(changes['since'], entry['last_sync'], snapshot['records'],
+                                         snapshot['view'], view, changes['time_added'])
+    except ValueError as e:  # the snapshot does not hold the records the aggregates were computed from
+        logging.warning(f'Materializing the aggregates again: {e}')
+        return None
+    if updated is None:
+        return None
+    aggregates, reading_index = updated
+    return {
+        'fingerprint': fingerprint,
+        'columns': {},  # unknown, a later materialize() computes its aggregates again
+        'values': {_spec_key(spec): (spec[0], aggregates[spec[0]]) for spec in DASHBOARD_AGGREGATES},
+        'reading_index': reading_index,
+        'incremental': incremental,
+        'records': snapshot['records'],
+        'view': view,
+    }
+
+
+@timed()
+def get_aggregates(access_token: str, limit: int = None,
+                   specs: List[AggregateSpec] = DASHBOARD_AGGREGATES) -> Dict[str, Any]:
+    """Aggregates of the library of ``access_token``, from its materialized snapshot.
+
+    One snapshot is cached per token and limit, tagged with the content fingerprint
+    of the library (item IDs and ``time_updated``). A refetch that changes nothing
+    is answered from it without building the table; a delta sync of the local
+    snapshot of the library is applied to it by ``update_aggregates()``; otherwise
+    ``materialize()`` only recomputes the aggregates of the changed columns.
+    """
+    from incremental import IncrementalAggregates  # incremental imports this module
+    entry = get_data_entry(access_token, limit)
+    fingerprint = get_fingerprint(access_token, limit)
+    cache = get_cache()
+    key = make_key('aggregates', access_token, limit)
+    snapshot = cache.get(key)
+    fresh = (snapshot is not None) and (snapshot['fingerprint'] == fingerprint)
+    if fresh and snapshot.get('incremental') is not None and snapshot['incremental'].last_sync != entry['last_sync'] \
+            and snapshot['incremental'].skip_sync(entry['last_sync']):
+        # a delta sync that changed none of these items, the next one follows it
+        snapshot = dict(snapshot, view=(entry['items'], snapshot['view'][1]))
+        cache.set(key, snapshot)
+    if not (fresh and all(_spec_key(spec) in snapshot['values'] for spec in specs)):
+        def rematerialize() -> Dict[str, Any]:
+            updated = None if fresh else update_aggregates(snapshot, entry, limit, fingerprint)
+            if (updated is not None) and all(_spec_key(spec) in updated['values'] for spec in specs):
+                cache.set(key, updated)
+                return updated
+            current = snapshot if fresh else updated  # aggregates of this content, if any
+            table = get_table(access_token, limit)
+            ans = materialize(table, specs, fingerprint, snapshot if updated is None else updated)
+            if entry['last_sync'] is not None:  # from a local snapshot, the next load can be a delta sync
+                incremental = None if current is None else current.get('incremental')
+                if (incremental is None) or (incremental.last_sync is None):  # None: an update failed halfway
+                    incremental = IncrementalAggregates.from_table(table)
+                ans = _with_incremental(ans, incremental, entry, limit)
+            cache.set(key, ans)
+            return ans
+        # concurrent reloads of the same library share one computation
+        snapshot = IN_FLIGHT.do(make_key('materialize', access_token, limit, fingerprint, specs), rematerialize)
+    return serve_aggregates(snapshot, specs)
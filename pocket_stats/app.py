@@ -3,8 +3,10 @@ import os
 import flask
 from flask_wtf.csrf import CSRFProtect
 from visualization import create_app
+from constants import configure_logging
 
 
+configure_logging()
 server = flask.Flask(__name__)  # define flask app.server
 csrf = CSRFProtect(server)
 server.config['SECRET_KEY'] = os.urandom(32)  # for csrf
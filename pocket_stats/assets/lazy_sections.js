@@ -0,0 +1,30 @@
+// Renders the dashboard sections below the fold when they scroll into view:
+// the first time a .lazy-section is visible, its hidden trigger button is clicked,
+// which fires the section callback (see LAZY_SECTIONS in visualization.py).
+(function() {
+    function trigger(section) {
+        var button = section.querySelector('.lazy-section-trigger');
+        if (button) {
+            button.click();
+        }
+    }
+    var observer = ('IntersectionObserver' in window) ? new IntersectionObserver(function(entries) {
+        entries.forEach(function(entry) {
+            if (entry.isIntersecting) {
+                trigger(entry.target);
+                observer.unobserve(entry.target);
+            }
+        });
+    }, {rootMargin: '200px'}) : {observe: trigger};  // old browsers render every section
+    // the sections are created by the Dash renderer after the page is loaded, and are only
+    // watched once a chart is drawn: before that the empty page shows every section at once
+    new MutationObserver(function() {
+        if (!document.querySelector('.js-plotly-plot')) {
+            return;
+        }
+        document.querySelectorAll('.lazy-section:not([data-lazy-observed])').forEach(function(section) {
+            section.setAttribute('data-lazy-observed', '1');
+            observer.observe(section);
+        });
+    }).observe(document.documentElement, {childList: true, subtree: true});
+})();
@@ -0,0 +1,405 @@
+import os
+import sys
+import math
+import mmap
+import time
+import socket
+import pickle
+import struct
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
+from constants import CACHE_BACKEND, CACHE_MAX_BYTES, CACHE_TTL, CACHE_DIR, MEMCACHED_SERVER, MEMCACHED_MAX_ITEM_BYTES
+from constants import MAX_LRU_CACHE_SIZE
+
+SIZE_SAMPLE = 64  # elements of a large container whose size is measured, the others are assumed alike
+SIZE_MAX_DEPTH = 8
+
+
+def make_key(*parts: Any) -> str:
+    # access tokens must not leak into file names or memcached keys
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+def _sample(values: list) -> list:
+    step = max(1, len(values) // SIZE_SAMPLE)
+    return values[::step][:SIZE_SAMPLE]
+
+
+def estimate_size(value: Any, depth: int = 0) -> int:
+    """Approximate memory held by ``value``, without pickling it.
+
+    Arrays and tables (``ArticleTable``, pandas) report their ``nbytes`` or
+    memory usage; only a sample of the elements of large containers is measured.
+    """
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    if hasattr(value, 'memory_usage'):  # pandas, imported by the caller
+        usage = value.memory_usage(index=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    size = sys.getsizeof(value)
+    if depth >= SIZE_MAX_DEPTH or isinstance(value, (str, bytes, bytearray, int, float)):
+        return size
+    if hasattr(value, '__slots__'):  # e.g. records.CompactRecord, also a Mapping
+        values = [getattr(value, name, None) for name in value.__slots__]
+        n = len(values)
+    elif isinstance(value, Mapping):
+        values = _sample(list(value.keys())) + _sample(list(value.values()))
+        n = 2 * len(value)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        values = _sample(list(value))
+        n = len(value)
+    elif hasattr(value, '__dict__'):
+        values, n = _sample(list(vars(value).values())), len(vars(value))
+    else:
+        return size
+    if not values:
+        return size
+    return size + sum(estimate_size(v, depth + 1) for v in values) * n // len(values)
+
+
+class CacheStats:
+    # updated from the render threads and the refresh threads, see count()
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.rejected = 0  # sets the backend refused to store
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'sets': self.sets,
+                'rejected': self.rejected,
+                'evictions': self.evictions,
+                'hit_ratio': 1.0 * self.hits / total if total > 0 else 0,
+            }
+
+
+class CacheBackend:
+    """Key/value cache interface shared by all backends.
+
+    ``ttl`` is in seconds, ``None`` means the entry only leaves the cache when it is
+    evicted. Values must be picklable.
+    """
+
+    def __init__(self, default_ttl: float = None):
+        self.default_ttl = default_ttl
+        self.stats = CacheStats()
+
+    def _expire_at(self, ttl: Optional[float]) -> float:
+        ttl = self.default_ttl if ttl is None else ttl
+        return 0 if not ttl else time.time() + ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    # in-process LRU, sized by estimate_size() of the values
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, max_entries: int = MAX_LRU_CACHE_SIZE,
+                 default_ttl: float = None):
+        super().__init__(default_ttl)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.n_bytes = 0
+        self._entries: 'OrderedDict[str, Tuple[float, int, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] and entry[0] < time.time():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.stats.count('misses')
+                return None
+            self._entries.move_to_end(key)
+            self.stats.count('hits')
+            return entry[2]
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._expire_at(ttl), size, value)
+            self.n_bytes += size
+            self.stats.count('sets')
+            while len(self._entries) > 1 and (self.n_bytes > self.max_bytes or len(self._entries) > self.max_entries):
+                self._remove(next(iter(self._entries)))
+                self.stats.count('evictions')
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        self.n_bytes -= self._entries.pop(key)[1]
+
+
+class FileCache(CacheBackend):
+    """Cache shared by all processes of a host, one memory-mapped file per key.
+
+    Each file is an 8 bytes expiry time followed by the pickled value. Writes go
+    through a temporary file and ``os.replace``, so readers never see partial entries.
+    """
+
+    HEADER = struct.Struct('<d')
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES, default_ttl: float = None):
+        super().__init__(default_ttl)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.cache')
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            with open(self._path(key), 'rb') as fi, mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                expire_at, = self.HEADER.unpack_from(mm)
+                if expire_at and expire_at < time.time():
+                    value = None
+                else:
+                    value = pickle.loads(mm[self.HEADER.size:])
+        except (FileNotFoundError, ValueError):  # ValueError: empty file cannot be mapped
+            value = None
+        if value is not None:
+            try:
+                os.utime(self._path(key))  # last access time, used for LRU eviction
+            except FileNotFoundError:  # evicted by another process since it was read
+                value = None
+        if value is None:
+            self.stats.count('misses')
+            return None
+        self.stats.count('hits')
+        return value
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fo:
+            fo.write(self.HEADER.pack(self._expire_at(ttl)))
+            pickle.dump(value, fo, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self.stats.count('sets')
+        self._evict(keep=self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def n_bytes(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.cache'))
+
+    def _evict(self, keep: str) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # removed by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self.stats.count('evictions')
+
+
+class MemcachedCache(CacheBackend):
+    """Minimal client for the memcached text protocol (get / set / delete).
+
+    Size based eviction is done by the server (``memcached -m``); the client only
+    counts hits and misses. Connection errors are logged and behave like misses.
+
+    Values larger than the item size limit of the server (``max_item_bytes``,
+    ``memcached -I``) are split in chunks, stored under ``<key>.<digest>.<i>``
+    before a small entry under ``key`` lists them (memcached flag ``CHUNKED``).
+    A read that misses a chunk evicted by the server, or gets the chunks of another
+    value, is a miss. Sets the server refuses count as ``rejected`` in the stats.
+    """
+
+    CHUNKED = 1  # memcached flags of the entry listing the chunks of a large value
+    ITEM_OVERHEAD = 1024  # key and item header, stored by memcached in the same max_item_bytes
+    GET_BATCH = 100  # keys per get command
+    MAX_RELATIVE_TTL = 30 * 24 * 3600  # larger expiration times are unix times for memcached
+
+    def __init__(self, server: str = MEMCACHED_SERVER, default_ttl: float = None, timeout: float = 3,
+                 max_item_bytes: int = MEMCACHED_MAX_ITEM_BYTES):
+        super().__init__(default_ttl)
+        host, port = server.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.timeout = timeout
+        self.chunk_size = max_item_bytes - self.ITEM_OVERHEAD
+        self._local = threading.local()
+
+    def _socket(self) -> socket.socket:
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            self._local.sock = sock
+            self._local.buffer = b''
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+        self._local.sock = None
+
+    def _read(self, n: int = None) -> bytes:
+        # read a line (without '\r\n') when n is None, else exactly n bytes plus the trailing '\r\n'
+        while True:
+            buffer = self._local.buffer
+            if n is None and b'\r\n' in buffer:
+                line, self._local.buffer = buffer.split(b'\r\n', 1)
+                return line
+            if n is not None and len(buffer) >= n + 2:
+                self._local.buffer = buffer[n + 2:]
+                return buffer[:n]
+            chunk = self._socket().recv(65536)
+            if not chunk:
+                raise ConnectionError('memcached closed the connection')
+            self._local.buffer = buffer + chunk
+
+    def _command(self, line: bytes, payload: bytes = None) -> bytes:
+        self._socket().sendall(line + b'\r\n' + (payload + b'\r\n' if payload is not None else b''))
+        return self._read()
+
+    def _get_many(self, keys: List[str]) -> Dict[str, Tuple[int, bytes]]:
+        # flags and payload of the keys found
+        entries = {}
+        for i in range(0, len(keys), self.GET_BATCH):
+            header = self._command(('get ' + ' '.join(keys[i:i + self.GET_BATCH])).encode())
+            while header.startswith(b'VALUE '):
+                _, name, flags, n_bytes = header.split()[:4]
+                entries[name.decode()] = (int(flags), self._read(int(n_bytes)))
+                header = self._read()
+            if header != b'END':
+                raise ConnectionError(f'unexpected memcached response {header!r}')
+        return entries
+
+    def _chunk_key(self, key: str, digest: str, i: int) -> str:
+        return f'{key}.{digest[:16]}.{i}'
+
+    def _get_chunks(self, key: str, listing: bytes) -> Optional[bytes]:
+        n, digest = listing.decode().split()
+        keys = [self._chunk_key(key, digest, i) for i in range(int(n))]
+        entries = self._get_many(keys)
+        if len(entries) < len(keys):
+            return None
+        payload = b''.join(entries[k][1] for k in keys)
+        return payload if hashlib.sha256(payload).hexdigest() == digest else None
+
+    def get(self, key: str) -> Optional[Any]:
+        value = None
+        try:
+            entry = self._get_many([key]).get(key)
+            if entry is not None:
+                flags, payload = entry
+                if flags == self.CHUNKED:
+                    payload = self._get_chunks(key, payload)
+                value = None if payload is None else pickle.loads(payload)
+        except (OSError, ConnectionError) as e:
+            logging.warning(f'memcached get failed: {e}')
+            self._close()
+            value = None
+        if value is None:
+            self.stats.count('misses')
+            return None
+        self.stats.count('hits')
+        return value
+
+    def _store(self, key: str, flags: int, exptime: int, payload: bytes) -> bool:
+        reply = self._command(f'set {key} {flags} {exptime} {len(payload)}'.encode(), payload)
+        if reply != b'STORED':
+            logging.warning(f'memcached did not store {key} ({len(payload)} bytes): {reply!r}')
+            return False
+        return True
+
+    def set(self, key: str, value: Any, ttl: float = None) -> None:
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        ttl = self.default_ttl if ttl is None else ttl
+        exptime = int(math.ceil(ttl)) if ttl else 0  # whole seconds, 0 would never expire
+        if exptime > self.MAX_RELATIVE_TTL:
+            exptime += int(time.time())
+        try:
+            if len(payload) <= self.chunk_size:
+                stored = self._store(key, 0, exptime, payload)
+            else:
+                # the chunks first, so the listing is never read without them
+                digest = hashlib.sha256(payload).hexdigest()
+                starts = range(0, len(payload), self.chunk_size)
+                stored = all(self._store(self._chunk_key(key, digest, i), 0, exptime,
+                                         payload[start:start + self.chunk_size]) for i, start in enumerate(starts))
+                stored = stored and self._store(key, self.CHUNKED, exptime, f'{len(starts)} {digest}'.encode())
+            self.stats.count('sets' if stored else 'rejected')
+        except (OSError, ConnectionError) as e:
+            logging.warning(f'memcached set failed: {e}')
+            self._close()
+
+    def delete(self, key: str) -> None:
+        # the chunks of a large value are left to the LRU eviction of the server
+        try:
+            self._command(f'delete {key}'.encode())
+        except (OSError, ConnectionError) as e:
+            logging.warning(f'memcached delete failed: {e}')
+            self._close()
+
+
+def create_cache(backend: str = CACHE_BACKEND, default_ttl: float = CACHE_TTL) -> CacheBackend:
+    if backend == 'memory':
+        return MemoryCache(default_ttl=default_ttl)
+    elif backend == 'file':
+        return FileCache(default_ttl=default_ttl)
+    elif backend == 'memcached':
+        return MemcachedCache(default_ttl=default_ttl)
+    raise NotImplementedError(backend)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> CacheBackend:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = create_cache()
+    return _cache
@@ -0,0 +1,74 @@
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Runs one call at a time per key: concurrent calls with the same key wait for it and share its result.
+
+    Nothing is kept once the call returns, this only coalesces the calls in
+    flight, e.g. the table build of a double-clicked reload. An exception is
+    raised in every caller that waited for the failed call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
+
+
+class LatestRequests:
+    """Numbers the requests of each key, so a slow one can tell it was superseded by a newer one.
+
+    A key is only kept while its latest request runs: ``end()`` drops it, so
+    there are never more keys than requests in flight.
+    """
+
+    def __init__(self):
+        self._latest: Dict[Hashable, int] = {}
+        self._tickets = itertools.count(1)  # never reused, unlike a count per key that restarts once dropped
+        self._lock = threading.Lock()
+
+    def begin(self, key: Hashable) -> int:
+        with self._lock:
+            ticket = self._latest[key] = next(self._tickets)
+            return ticket
+
+    def is_latest(self, key: Hashable, ticket: int) -> bool:
+        with self._lock:
+            return self._latest.get(key) == ticket
+
+    def end(self, key: Hashable, ticket: int) -> None:
+        with self._lock:
+            if self._latest.get(key) == ticket:
+                del self._latest[key]
+
+
+# shared by the data loads and the figure builds of this process, keyed by cache.make_key()
+IN_FLIGHT = SingleFlight()
+# requests of the dashboard controls, keyed by (control, session ID of the tab)
+LATEST_REQUESTS = LatestRequests()
@@ -3,15 +3,67 @@ import logging
 import os
 import pytz
 import string
+import tempfile
 
 
-DEFAULT_TZINFO = pytz.utc
+# timezone of the calendar days / weeks / months of the time series, can also be picked in the dashboard
+DEFAULT_TIMEZONE = os.environ.get('POCKET_STATS_TIMEZONE', 'UTC')
+DEFAULT_TZINFO = pytz.timezone(DEFAULT_TIMEZONE)
 CONSUMER_KEY = os.environ.get('POCKET_STATS_CONSUMER_KEY', None)
 ACCESS_TOKEN = os.environ.get('POCKET_STATS_ACCESS_TOKEN', None)
 GTAG_ID = os.environ.get('GTAG_ID', '')
 DEFAULT_READING_SPEED = 225  # words per minute
 MAX_LRU_CACHE_SIZE = 128
-MAX_NUMBER_OF_RECORDS = 1000
+MAX_NUMBER_OF_RECORDS = 1000  # largest numeric choice of the records slider, the next step means all records
+# keep only the fields used by the statistics (records.CompactRecord) in the snapshot loads and caches
+COMPACT_RECORDS = os.environ.get('POCKET_STATS_COMPACT_RECORDS', '1') == '1'
+# local snapshots of fetched libraries, see storage.SnapshotStore. Opt-in: they are never evicted, and the /tmp of
+# App Engine is in memory, so by default ('') the libraries are always fetched from Pocket.
+SNAPSHOT_DIR = os.environ.get('POCKET_STATS_SNAPSHOT_DIR', '')
+# cache of fetched libraries and derived tables / aggregates, see cache.py
+CACHE_BACKEND = os.environ.get('POCKET_STATS_CACHE_BACKEND', 'memory')  # 'memory', 'file' or 'memcached'
+CACHE_MAX_BYTES = int(os.environ.get('POCKET_STATS_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+CACHE_TTL = float(os.environ.get('POCKET_STATS_CACHE_TTL', 0)) or None  # seconds, 0 means no expiry
+CACHE_DIR = os.environ.get('POCKET_STATS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'pocket_stats_cache'))
+MEMCACHED_SERVER = os.environ.get('POCKET_STATS_MEMCACHED_SERVER', '127.0.0.1:11211')
+# item size limit of the memcached server (memcached -I, 1 MB by default), larger values are stored in chunks
+MEMCACHED_MAX_ITEM_BYTES = int(os.environ.get('POCKET_STATS_MEMCACHED_MAX_ITEM_BYTES', 1024 * 1024))
+# cached libraries older than this (seconds) are served as they are and refreshed in the background, 0 means never
+REFRESH_AFTER = float(os.environ.get('POCKET_STATS_REFRESH_AFTER', 0)) or None
+REFRESH_THREADS = int(os.environ.get('POCKET_STATS_REFRESH_THREADS', 2))  # see refresh.RefreshScheduler
+REFRESH_MAX_QUEUED = 64  # refreshes waiting for a thread, the next ones are dropped
+# Pocket API paging, see fetch.fetch_pages()
+FETCH_PAGE_SIZE = 500
+FETCH_CONCURRENCY = int(os.environ.get('POCKET_STATS_FETCH_CONCURRENCY', 4))
+FETCH_MAX_RETRIES = 5
+FETCH_BACKOFF_BASE = 1.0  # seconds
+FETCH_BACKOFF_MAX = 60.0  # seconds
+DOMAIN_CACHE_SIZE = 65536  # hostnames whose domain is memoized by domains.get_domain_from_hostname()
+READING_TIME_BIN_MINUTES = 5  # width of the bins of the reading time histogram
+# width (words) of the cached word count bins the reading time histogram is rebinned from, for any reading speed
+READING_DISTRIBUTION_BIN_WORDS = 25
+FIGURE_DECIMALS = 2  # decimals kept in the numeric arrays of the figures sent to the browser
+# callback responses larger than this are logged, see payload.ResponseSizeReport
+RESPONSE_SIZE_WARNING_BYTES = int(os.environ.get('POCKET_STATS_RESPONSE_SIZE_WARNING_BYTES', 1024 * 1024))
+# word cloud layout, see word_cloud.layout_words()
+WORD_CLOUD_MAX_WORDS = 200
+WORD_CLOUD_SIZE = (1200, 500)  # canvas (width, height) in pixels
+WORD_CLOUD_FONT_SIZES = (10, 60)  # font size of the least and most frequent words
+# dashboard sections are built in parallel on this many threads per process, see render.RenderPool
+RENDER_THREADS = int(os.environ.get('POCKET_STATS_RENDER_THREADS', 4))
+RENDER_MAX_RESULTS = 64  # built sections kept per process
+# titles of libraries of at least PARALLEL_MIN_RECORDS items are tokenized by PARALLEL_JOBS processes (joblib n_jobs,
+# -1 means one per core), see parallel.parallel_title_index(). The threshold depends on the cores and the cost of
+# starting the pool, measure it with benchmarks/bench_parallel.py
+PARALLEL_JOBS = int(os.environ.get('POCKET_STATS_PARALLEL_JOBS', -1))
+PARALLEL_MIN_RECORDS = int(os.environ.get('POCKET_STATS_PARALLEL_MIN_RECORDS', 50000))
+STREAM_REFRESH_INTERVAL_MS = 1000  # how often partial charts are redrawn while a library is being fetched
+STREAM_ERROR_TTL = 600  # seconds a failed streaming load is kept to show its error, see streaming.StreamingLoad
+# opt-in timings of the data and visualization functions and of the callbacks, served at /metrics
+INSTRUMENTATION = os.environ.get('POCKET_STATS_INSTRUMENTATION', '0') == '1'
+# /_profile?seconds=n profiles the callbacks of the next n seconds, only when enabled
+PROFILING = os.environ.get('POCKET_STATS_PROFILING', '0') == '1'
+PROFILE_MAX_SECONDS = 300
 
 # custom index string for Dash app
 DASH_APP_INDEX_STRING = string.Template('''
@@ -49,11 +101,16 @@ DASH_APP_INDEX_STRING = string.Template('''
     'gtag_id': GTAG_ID,
 })
 
-# logging
-root = logging.getLogger()
-root.setLevel(logging.INFO)
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - [%(levelname)s] - %(name)s - %(message)s')
-handler.setFormatter(formatter)
-root.addHandler(handler)
+
+def configure_logging() -> None:
+    # called by the entry points (app.py, __main__.py), importing the package doesn't touch the root logger
+    root = logging.getLogger()
+    if any(getattr(h, 'pocket_stats', False) for h in root.handlers):
+        return
+    root.setLevel(logging.INFO)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(logging.INFO)
+    formatter = logging.Formatter('%(asctime)s - [%(levelname)s] - %(name)s - %(message)s')
+    handler.setFormatter(formatter)
+    handler.pocket_stats = True
+    root.addHandler(handler)
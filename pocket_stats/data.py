@@ -2,26 +2,39 @@ import errno
 import os
 import json
 import logging
-import tldextract
-from datetime import datetime, timedelta
-from pocket import Pocket
-from typing import List, Dict
+import time
+import threading
+from datetime import datetime
+from typing import Any, List, Dict, Union, Tuple, Callable, Iterator, Optional, TYPE_CHECKING
 from collections import Counter
-from nltk.corpus import stopwords
-import pandas as pd
-from functools import lru_cache
-from constants import CONSUMER_KEY, ACCESS_TOKEN
+import numpy as np
+from table import ArticleTable, STATUS_UNREAD, STATUS_ARCHIVED, STATUS_DELETED
+from filters import match_value, record_value, get_filter_mask
+from storage import SnapshotStore, Sync
+from cache import get_cache, make_key
+from fetch import fetch_pages
+from domains import get_domain_from_url
+from records import compact_records
+from fingerprint import content_fingerprint
+from refresh import KeyedLocks, RefreshScheduler
+from coalesce import IN_FLIGHT
+from text import TitleIndex, get_stopwords
+from parallel import parallel_jobs, parallel_title_index
+from timeseries import DEFAULT_EVENTS, DEFAULT_GRANULARITY, TimeZone, time_series
+from reading_index import ReadingIndex, DEFAULT_ROLLING_WINDOW_DAYS
+from instrumentation import timed, record_fetch
+from constants import CONSUMER_KEY, ACCESS_TOKEN, SNAPSHOT_DIR
 from constants import DEFAULT_TZINFO, DEFAULT_READING_SPEED
-from constants import MAX_LRU_CACHE_SIZE, MAX_NUMBER_OF_RECORDS
+from constants import FETCH_CONCURRENCY, COMPACT_RECORDS, REFRESH_AFTER
 
-
-invalid_words = stopwords.words('english')
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def is_valid_word(w):
     if len(w) == 0:
         return False
-    return w not in invalid_words
+    return w not in get_stopwords('en')
 
 
 def normalize_language_name(lang: str) -> str:
@@ -31,11 +44,6 @@ def normalize_language_name(lang: str) -> str:
     return lang
 
 
-def get_domain_from_url(url: str) -> str:
-    extract_result = tldextract.extract(url)
-    return extract_result.domain + '.' + extract_result.suffix
-
-
 def epoch_to_yyymmdd(epoch: int):
     return datetime.fromtimestamp(int(epoch), tz=DEFAULT_TZINFO).strftime('%Y%m%d')
 
@@ -52,53 +60,254 @@ def load_cache(cache_file: str) -> List[Dict]:
         return json.load(fi)
 
 
-def fetch_data(offset: int = 0, limit: int = None,
-               consumer_key: str = CONSUMER_KEY, access_token: str = ACCESS_TOKEN) -> List[Dict]:
+def iter_data(offset: int = 0, limit: int = None,
+              consumer_key: str = CONSUMER_KEY, access_token: str = ACCESS_TOKEN,
+              since: int = None, concurrency: int = FETCH_CONCURRENCY, compact: bool = False,
+              on_since: Callable[[int], None] = None) -> Iterator[List[Dict]]:
+    # streaming version of fetch_data(): yields the new items of each page as soon as it arrives
     assert (consumer_key is not None) and (access_token is not None), \
         'Please set value for POCKET_STATS_CONSUMER_KEY and POCKET_STATS_ACCESS_TOKEN environment variables'
-    assert 0 < limit and limit <= MAX_NUMBER_OF_RECORDS, limit
+    assert (limit is None) or (0 < limit), limit
+    from pocket import Pocket  # with requests, only needed when something is fetched
     api = Pocket(consumer_key=consumer_key, access_token=access_token)
+    start_time = time.perf_counter()
+    seen_ids = set()  # an item can show up twice when the library changes between two pages
+    for page in fetch_pages(api, offset=offset, limit=limit, since=since, concurrency=concurrency, on_since=on_since):
+        new_items = []
+        for item in page:
+            if item['item_id'] not in seen_ids:
+                seen_ids.add(item['item_id'])
+                new_items.append(item)
+        elapsed = time.perf_counter() - start_time
+        logging.info(f'Fetched {len(page)} records. Total = {len(seen_ids)} now '
+                     f'({len(seen_ids) / elapsed:.0f} items/s).')
+        if len(new_items) > 0:
+            # with compact=True the raw page is dropped here, so at most `concurrency` raw pages are alive
+            yield compact_records(new_items) if compact else new_items
+    record_fetch(len(seen_ids), time.perf_counter() - start_time)
+
+
+@timed()
+def fetch_data(offset: int = 0, limit: int = None,
+               consumer_key: str = CONSUMER_KEY, access_token: str = ACCESS_TOKEN,
+               since: int = None, overwrite_cache: bool = False,
+               concurrency: int = FETCH_CONCURRENCY, progress: Callable[[int], None] = None,
+               compact: bool = False, on_sync_time: Callable[[int], None] = None) -> List[Dict]:
+    # on_sync_time gets the `since` to pass to the next delta sync to get the items changed after this fetch
+    assert not (overwrite_cache and offset > 0), 'Only a fetch from offset 0 can overwrite the local snapshot'
+    server_times = []
+    local_time = int(time.time())
     ans = []
-    count = 500
-    if limit is not None:
-        limit += offset
-        count = min(count, limit)
-    while (limit is None) or (offset < limit):
-        response = api.retrieve(
-            offset=offset, count=count,
-            state='all',  # both unread and archived items
-        )
-        items = response.get('list', {})
-        n = len(items)
-        if n == 0:
-            break
-        ans.extend(item for k, item in items.items())
-        logging.info(f'Fetched {n} records. Total = {len(ans)} now.')
-        offset += n
+    for page in iter_data(offset=offset, limit=limit, consumer_key=consumer_key, access_token=access_token,
+                          since=since, concurrency=concurrency, compact=compact, on_since=server_times.append):
+        ans.extend(page)
+        if progress is not None:
+            progress(len(ans))
+    sync_time = get_sync_time(server_times, local_time)
+    if on_sync_time is not None:
+        on_sync_time(sync_time)
+    if overwrite_cache:
+        if not SNAPSHOT_DIR:
+            logging.warning('POCKET_STATS_SNAPSHOT_DIR is not set, the fetched library is not saved.')
+        save_snapshot(access_token, ans, limit=limit, sync_time=sync_time)
     return ans
 
 
-@lru_cache(maxsize=MAX_LRU_CACHE_SIZE)
-def get_data(access_token: str, limit: int = None) -> List[Dict]:
-    # TODO: load from Memcache or DB
-    return fetch_data(
+def get_sync_time(server_times: List[int], local_time: int) -> int:
+    """``since`` of the next delta sync of a fetch, from the ``since`` of its Pocket responses.
+
+    The earliest one, so nothing changed while the pages were fetched is missed.
+    Pocket's clock is used rather than ours, the local time of the start of the
+    fetch is only a fallback for responses without ``since``.
+    """
+    return min(server_times, default=local_time)
+
+
+def save_snapshot(access_token: str, items: List[Dict], limit: int, sync_time: int,
+                  store: SnapshotStore = None) -> None:
+    # items are the result of a full fetch of the newest `limit` items that started at sync_time
+    if store is None:
+        if not SNAPSHOT_DIR:
+            return
+        store = SnapshotStore()
+    complete = (limit is None) or (len(items) < limit)
+    store.save(access_token, items, last_sync=sync_time, complete=complete)
+
+
+def has_snapshot(access_token: str, limit: int = None) -> bool:
+    return bool(SNAPSHOT_DIR) and SnapshotStore().covers(access_token, limit)
+
+
+@timed()
+def sync_data(access_token: str, limit: int = None, consumer_key: str = CONSUMER_KEY,
+              store: SnapshotStore = None, compact: bool = COMPACT_RECORDS,
+              on_sync: Callable[[Sync], None] = None) -> List[Dict]:
+    """Return the newest ``limit`` items, refreshing the local snapshot first.
+
+    Without a usable snapshot this is a full fetch; otherwise only the items
+    changed since the last sync are requested from Pocket. With ``compact``
+    the items are ``records.CompactRecord`` instead of the full Pocket dicts.
+    ``on_sync`` gets the ``storage.Sync`` made, e.g. to update aggregates with its
+    changed items only.
+    """
+    if store is None:
+        if not SNAPSHOT_DIR:
+            return fetch_data(limit=limit, consumer_key=consumer_key, access_token=access_token, compact=compact)
+        store = SnapshotStore()
+    snapshot = store.load(access_token, limit=limit, compact=compact)
+    sync_times = []
+    if (snapshot is None) or (not snapshot.covers(limit)):
+        items = fetch_data(limit=limit, consumer_key=consumer_key, access_token=access_token, compact=compact,
+                           on_sync_time=sync_times.append)
+        save_snapshot(access_token, items, limit=limit, sync_time=sync_times[0], store=store)
+        sync = Sync(sync_times[0])
+    else:
+        changed = fetch_data(consumer_key=consumer_key, access_token=access_token, since=snapshot.last_sync,
+                             on_sync_time=sync_times.append)
+        if len(changed) == 0:
+            items = snapshot.items
+            sync = Sync(snapshot.last_sync, since=snapshot.last_sync, changed=[])
+        else:
+            logging.info(f'Applying {len(changed)} changed records to the local snapshot.')
+            store.apply_delta(access_token, changed, last_sync=sync_times[0])
+            items = store.load(access_token, limit=limit, compact=compact).items
+            sync = Sync(sync_times[0], since=snapshot.last_sync, changed=changed)
+    if on_sync is not None:
+        on_sync(sync)
+    return items
+
+
+def _entry_covers(entry: Dict, limit: int = None) -> bool:
+    return entry['complete'] or (limit is not None and len(entry['items']) >= limit)
+
+
+def peek_data_entry(access_token: str, limit: int = None) -> Optional[Dict]:
+    # the cached library if it already holds the newest `limit` items, without fetching anything
+    entry = get_cache().get(make_key('data', access_token))
+    return entry if (entry is not None) and _entry_covers(entry, limit) else None
+
+
+def put_data_entry(access_token: str, items: List[Dict], limit: int = None, sync: Sync = None) -> Dict:
+    entry = {
+        'items': items,
+        'complete': (limit is None) or (len(items) < limit),
+        'version': time.time(),  # time of the fetch, derived cache entries are keyed by it
+        # with a local snapshot: last_sync of the items, and the items changed since the previous sync when they
+        # are the result of a delta sync (item ID -> time_added, None when deleted), see aggregates.get_aggregates()
+        'last_sync': None if sync is None else sync.last_sync,
+        'changes': None if (sync is None) or (sync.since is None) else {
+            'since': sync.since,
+            'time_added': {
+                str(item['item_id']): None if str(item.get('status')) == str(STATUS_DELETED)
+                else int(item.get('time_added') or 0) for item in sync.changed
+            },
+        },
+    }
+    get_cache().set(make_key('data', access_token), entry)
+    return entry
+
+
+def _fetch_data_entry(access_token: str, limit: int = None) -> Dict:
+    # a delta sync when the library has a local snapshot
+    syncs = []
+    items = sync_data(
         limit=limit,
         access_token=access_token,
+        on_sync=syncs.append,
     )
+    return put_data_entry(access_token, items, limit, sync=syncs[0] if syncs else None)
+
+
+def refresh_data_entry(access_token: str, limit: int = None) -> Dict:
+    with FETCH_LOCKS.hold(access_token):
+        return _fetch_data_entry(access_token, limit)
+
+
+FETCH_LOCKS = KeyedLocks()
+_refresh_scheduler = None
+_refresh_scheduler_lock = threading.Lock()
+
+
+def get_refresh_scheduler() -> RefreshScheduler:
+    global _refresh_scheduler
+    with _refresh_scheduler_lock:
+        if _refresh_scheduler is None:
+            _refresh_scheduler = RefreshScheduler(refresh_data_entry)
+        return _refresh_scheduler
+
+
+@timed()
+def get_data_entry(access_token: str, limit: int = None, refresh_after: float = REFRESH_AFTER) -> Dict:
+    """The cached library of ``access_token`` covering ``limit`` items, fetched when there is none.
+
+    One cache entry per token holds the newest items fetched so far, so smaller
+    limits are slices of it. An entry fetched more than ``refresh_after`` seconds
+    ago is returned as it is, and refreshed in the background for the next calls.
+    Concurrent calls for a token that is not cached yet wait for a single fetch.
+    """
+    entry = peek_data_entry(access_token, limit)
+    if entry is None:
+        with FETCH_LOCKS.hold(access_token):
+            entry = peek_data_entry(access_token, limit)  # fetched by the call this one waited for
+            if entry is None:
+                return _fetch_data_entry(access_token, limit)
+    if refresh_after and time.time() - entry['version'] > refresh_after:
+        # the whole cached entry is refreshed, not only the `limit` items asked for
+        get_refresh_scheduler().schedule(access_token, None if entry['complete'] else len(entry['items']))
+    return entry
+
+
+def _limited_items(entry: Dict, limit: int = None) -> List[Dict]:
+    return entry['items'] if limit is None else entry['items'][:limit]
+
+
+def get_data(access_token: str, limit: int = None) -> List[Dict]:
+    return _limited_items(get_data_entry(access_token, limit), limit)
+
+
+@timed()
+def build_table(data: List[Dict]) -> ArticleTable:
+    return ArticleTable.from_records(data, get_domain=get_domain_from_url,
+                                     normalize_language=normalize_language_name)
+
+
+def _cached_build(key: str, build: Callable[[], Any]) -> Any:
+    # concurrent misses of the same key, e.g. from a double-clicked reload, share one build
+    def build_and_cache() -> Any:
+        value = get_cache().get(key)  # cached by a leader that finished after our miss
+        if value is None:
+            value = build()
+            get_cache().set(key, value)
+        return value
+    value = get_cache().get(key)
+    return IN_FLIGHT.do(key, build_and_cache) if value is None else value
+
+
+@timed()
+def get_table(access_token: str, limit: int = None) -> ArticleTable:
+    entry = get_data_entry(access_token, limit)
+    return _cached_build(make_key('table', access_token, limit, entry['version']),
+                         lambda: build_table(_limited_items(entry, limit)))
+
+
+def get_fingerprint(access_token: str, limit: int = None) -> str:
+    # content of the library, unlike its version which changes on every fetch, see aggregates.get_aggregates()
+    entry = get_data_entry(access_token, limit)
+    return _cached_build(make_key('fingerprint', access_token, limit, entry['version']),
+                         lambda: content_fingerprint(_limited_items(entry, limit)))
+
+
+# every get_* function accepts either the raw records or a prebuilt ArticleTable
+Dataset = Union[List[Dict], ArticleTable]
+
+
+def as_table(data: Dataset) -> ArticleTable:
+    return build_table(data) if isinstance(data, list) else data
 
 
-# filter format: [key, operation, expected_value]
 def should_pass_filter(filter: List, record: Dict):
     key, op, expected = filter
-    expected = str(expected) if expected is not None else None
-    value = record.get(key, None)
-    value = str(value) if value is not None else None
-    if op == '=':
-        return value == expected
-    elif op == '!=':
-        return value != expected
-    else:
-        raise NotImplementedError
+    return match_value(op, record_value(record, key, op), expected)
 
 
 def should_pass_filters(filters: List[List], record: Dict) -> bool:
@@ -108,79 +317,152 @@ def should_pass_filters(filters: List[List], record: Dict) -> bool:
     return True
 
 
-def count_words_in_title(data: List[Dict]) -> Dict[str, int]:
-    words = []
-    for record in data:
-        title = record['given_title']
-        words.extend(x.strip().lower() for x in title.split(' ') if is_valid_word(x.strip().lower()))
-    return Counter(words)
+def filter_mask(data: Dataset, table: ArticleTable, filters: List[List]) -> np.ndarray:
+    # raw records can also be filtered on the fields the table does not keep, e.g. resolved_url
+    return get_filter_mask(table, filters, records=data if isinstance(data, list) else None)
 
 
-def get_word_counts(data: List[Dict], filters: List[List] = []) -> List[int]:
-    return [int(record.get('word_count', -99999))
-            for record in data
-            if should_pass_filters(filters, record)]
+@timed()
+def get_title_index(data: Dataset) -> TitleIndex:
+    table = as_table(data)
+    if table.title_index is None:
+        langs = table.categories['lang']
+        n_jobs = parallel_jobs(len(table))
+        if n_jobs > 1:
+            table.title_index = parallel_title_index(table.titles, table.column('lang'), langs, n_jobs)
+        else:
+            table.title_index = TitleIndex.from_titles(table.titles, (langs[code] for code in table.column('lang')))
+    return table.title_index
 
 
-def get_reading_time(data: List[Dict],
+@timed()
+def count_words_in_title(data: Dataset, filters: List[List] = []) -> Dict[str, int]:
+    table = as_table(data)
+    mask = filter_mask(data, table, filters) if filters else None
+    return get_title_index(table).term_counts(mask)
+
+
+@timed()
+def get_top_terms(data: Dataset, n: int = 20, filters: List[List] = []) -> List[Tuple[str, int]]:
+    # e.g. filters=[['domain', '=', 'medium.com']] or [['time_added', '>=', datetime(2020, 7, 1)]]
+    table = as_table(data)
+    mask = filter_mask(data, table, filters) if filters else None
+    return get_title_index(table).top_terms(n, mask)
+
+
+@timed()
+def get_word_counts(data: Dataset, filters: List[List] = []) -> List[int]:
+    table = as_table(data)
+    return table.column('word_count')[filter_mask(data, table, filters)].tolist()
+
+
+@timed()
+def get_reading_time(data: Dataset,
                      reading_speed: int = DEFAULT_READING_SPEED,
                      filters: List[List] = []) -> List[float]:
     # because some records in data don't have the 'time_to_read' field
-    word_counts = get_word_counts(data, filters=filters)
-    return [wc / reading_speed for wc in word_counts if wc > 0]
+    word_counts = np.asarray(get_word_counts(data, filters=filters))
+    return (word_counts[word_counts > 0] / reading_speed).tolist()
 
 
-def get_added_time_series(data: List[Dict]) -> pd.DataFrame:
-    added_date_counts = Counter(epoch_to_yyymmdd(record['time_added']) for record in data)
-    df = pd.DataFrame.from_dict({datetime.strptime(d, '%Y%m%d'): cnt for d, cnt in added_date_counts.items()},
-                                orient='index', columns=['All articles'])
-    if len(df) > 0:
-        df.index = df.index.tz_localize('UTC')
-    return df
+@timed()
+def get_time_series(data: Dataset, events: Tuple[str, ...] = DEFAULT_EVENTS,
+                    granularity: str = DEFAULT_GRANULARITY, tz: TimeZone = None) -> 'pd.DataFrame':
+    # e.g. get_time_series(data, ('added', 'read'), granularity='week', tz='Europe/Paris')
+    return time_series(as_table(data), events, granularity, tz)
 
 
-def get_archived_time_series(data: List[Dict]) -> pd.DataFrame:
-    archived_date_counts = Counter(
-        epoch_to_yyymmdd(record['time_added']) for record in data
-        if int(record['status']) == 1
-    )
-    df = pd.DataFrame.from_dict({datetime.strptime(d, '%Y%m%d'): cnt for d, cnt in archived_date_counts.items()},
-                                orient='index', columns=['Archived articles'])
-    if len(df) > 0:
-        df.index = df.index.tz_localize('UTC')
-    return df
+@timed()
+def get_added_time_series(data: Dataset, granularity: str = DEFAULT_GRANULARITY, tz: TimeZone = None) -> 'pd.DataFrame':
+    return get_time_series(data, ('added',), granularity, tz)
+
+
+@timed()
+def get_archived_time_series(data: Dataset, granularity: str = DEFAULT_GRANULARITY,
+                             tz: TimeZone = None) -> 'pd.DataFrame':
+    return get_time_series(data, ('archived',), granularity, tz)
+
+
+@timed()
+def get_reading_index(data: Dataset) -> ReadingIndex:
+    table = as_table(data)
+    if table.reading_index is None:
+        table.reading_index = ReadingIndex.from_table(table)
+    return table.reading_index
+
+
+@timed()
+def get_average_readed_word(data: Dataset, n_last_days: int) -> float:
+    # average word count of the archived articles with time_updated in the last n_last_days days
+    return get_reading_index(data).average_words_since(n_last_days)
+
+
+@timed()
+def get_words_read_rolling(data: Dataset, window_days: int = DEFAULT_ROLLING_WINDOW_DAYS,
+                           tz: TimeZone = None) -> 'pd.DataFrame':
+    # e.g. the 30-day moving average of the words read per day: get_words_read_rolling(data, 30)['Words read per day']
+    return get_reading_index(data).rolling(window_days, tz)
+
+
+@timed()
+def get_domain_counts(data: Dataset, filters: List[List] = []) -> Dict[str, int]:
+    table = as_table(data)
+    return Counter(table.category_counts('domain', filter_mask(data, table, filters)))
+
+
+@timed()
+def get_language_counts(data: Dataset) -> Dict[str, int]:
+    return Counter(as_table(data).category_counts('lang'))
+
+
+# composition key -> (column, predicate of its values), counted by count_items() and get_composition()
+# 'videos' and 'images' are the items that have some or are one (has_video / has_image of 1 or 2)
+COMPOSITION = {
+    'unread': ('status', lambda c: c == STATUS_UNREAD),
+    'archived': ('status', lambda c: c == STATUS_ARCHIVED),
+    'deleted': ('status', lambda c: c == STATUS_DELETED),
+    'favorited': ('favorite', lambda c: c == 1),
+    'articles': ('is_article', lambda c: c == 1),
+    'videos': ('has_video', lambda c: c > 0),
+    'images': ('has_image', lambda c: c > 0),
+}
+COMPOSITION_KEYS = ('total',) + tuple(COMPOSITION)
 
 
-def get_average_readed_word(data: List[Dict], n_last_days: int) -> float:
-    # find the ones that are archived, time_updated >= min_date
-    min_date = datetime.now() - timedelta(days=n_last_days)
-    records = [
-        record for record in data
-        if (int(record['status']) == 1) and (datetime.fromtimestamp(int(record['time_updated'])) >= min_date)
-    ]
-    word_counts = get_word_counts(records)
-    return 0 if len(word_counts) == 0 else sum(word_counts) / len(word_counts)
+def count_items(data: Dataset, key: str, filters: List[List] = []) -> int:
+    # e.g. count_items(data, 'videos'), on the int8 column of the table: no DataFrame, no wider copy
+    table = as_table(data)
+    return _count_masked(table, key, filter_mask(data, table, filters) if filters else None)
 
 
-def get_domain_counts(data: List[Dict], filters: List[List] = []) -> Dict[str, int]:
-    return Counter(get_domain_from_url(record['resolved_url'])
-                   for record in data
-                   if should_pass_filters(filters, record))
+def _count_masked(table: ArticleTable, key: str, mask: Optional[np.ndarray]) -> int:
+    if key == 'total':
+        return len(table) if mask is None else int(np.count_nonzero(mask))
+    name, predicate = COMPOSITION[key]
+    column = table.column(name) if mask is None else table.column(name)[mask]
+    return int(np.count_nonzero(predicate(column)))
 
 
-def get_language_counts(data: List[Dict]) -> Dict[str, int]:
-    return Counter(normalize_language_name(record['lang']) for record in data)
+@timed()
+def get_composition(data: Dataset, filters: List[List] = []) -> Dict[str, int]:
+    """Number of items in total, per status, favorited, and with articles, videos or images."""
+    table = as_table(data)
+    # one mask for every key, from data since raw records can be filtered on fields the table does not keep
+    mask = filter_mask(data, table, filters) if filters else None
+    return {key: _count_masked(table, key, mask) for key in COMPOSITION_KEYS}
 
 
-def get_favorite_count(data: List[Dict]) -> Dict[str, int]:
-    total = len(data)
-    cnt = sum(1 for record in data if int(record['favorite']) == 1)
+@timed()
+def get_favorite_count(data: Dataset) -> Dict[str, int]:
+    table = as_table(data)
+    total = len(table)
+    cnt = count_items(table, 'favorited')
     return {
         'count': cnt,
         'percent': 1.0 * cnt / total if total > 0 else 0,
     }
 
 
-def get_unread_count(data: List[Dict]) -> int:
-    df = pd.DataFrame.from_dict(data)
-    return df.query("status == '0'").status.count()
+@timed()
+def get_unread_count(data: Dataset) -> int:
+    return count_items(data, 'unread')
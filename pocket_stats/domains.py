@@ -0,0 +1,33 @@
+import re
+from functools import lru_cache
+from constants import DOMAIN_CACHE_SIZE
+
+
+_SCHEME_RE = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*://')
+_PATH_RE = re.compile(r'[/?#\\]')
+
+
+def get_hostname(url: str) -> str:
+    # like urlsplit(url).hostname, but also for the scheme-less urls tldextract accepts
+    netloc = _PATH_RE.split(_SCHEME_RE.sub('', url.strip()), 1)[0]
+    netloc = netloc.rsplit('@', 1)[-1]  # user:password@
+    if netloc.startswith('['):  # IPv6 literal
+        return netloc.split(']', 1)[0] + ']'
+    return netloc.split(':', 1)[0].rstrip('.').lower()
+
+
+@lru_cache(maxsize=None)
+def get_extractor():
+    # only the public suffix list snapshot bundled with tldextract is used, it never goes to the network
+    import tldextract  # loaded with its suffix list on the first domain lookup, not at import
+    return tldextract.TLDExtract(suffix_list_urls=())
+
+
+@lru_cache(maxsize=DOMAIN_CACHE_SIZE)
+def get_domain_from_hostname(hostname: str) -> str:
+    extract_result = get_extractor()(hostname)
+    return extract_result.domain + '.' + extract_result.suffix
+
+
+def get_domain_from_url(url: str) -> str:
+    return get_domain_from_hostname(get_hostname(url))
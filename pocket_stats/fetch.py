@@ -0,0 +1,123 @@
+import time
+import random
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Iterator, Callable, TYPE_CHECKING
+from constants import FETCH_PAGE_SIZE, FETCH_CONCURRENCY, FETCH_MAX_RETRIES, FETCH_BACKOFF_BASE, FETCH_BACKOFF_MAX
+
+if TYPE_CHECKING:
+    from pocket import Pocket, PocketException
+
+
+def is_rate_limited(e: 'PocketException') -> bool:
+    return e.http_code == 429 or (e.http_code == 403 and '0' in (e.user_remaining, e.key_remaining))
+
+
+def is_retryable(e: Exception) -> bool:
+    # the Pocket client and requests are only imported once there is something to fetch
+    import requests
+    from pocket import PocketException, PocketAutException
+    if isinstance(e, PocketAutException):
+        return False
+    if isinstance(e, PocketException):
+        return e.http_code >= 500 or is_rate_limited(e)
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+
+def backoff_delay(attempt: int, e: Exception,
+                  base: float = FETCH_BACKOFF_BASE, max_delay: float = FETCH_BACKOFF_MAX) -> float:
+    # wait for the rate limit window to reset when Pocket tells us when, else full jitter exponential backoff
+    from pocket import PocketException
+    if isinstance(e, PocketException) and is_rate_limited(e):
+        resets = [float(r) for r in (e.user_reset, e.key_reset) if r is not None]
+        if resets:
+            return min(max(resets), max_delay)
+    return random.uniform(0, min(max_delay, base * 2 ** attempt))
+
+
+def retrieve_page(api: 'Pocket', offset: int, count: int, since: int = None,
+                  max_retries: int = FETCH_MAX_RETRIES, backoff_base: float = FETCH_BACKOFF_BASE,
+                  stop: threading.Event = None, on_since: Callable[[int], None] = None) -> List[Dict]:
+    # stop is set by fetch_pages() when the page is not needed anymore, so no more retries are made.
+    # on_since gets the `since` of the response, Pocket's time of the request to pass to the next delta sync
+    attempt = 0
+    while True:
+        try:
+            response = api.retrieve(
+                offset=offset, count=count,
+                state='all',  # both unread and archived items
+                since=since,  # only items changed after this epoch
+            )
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e) or (stop is not None and stop.is_set()):
+                raise
+            delay = backoff_delay(attempt, e, base=backoff_base)
+            logging.warning(f'Pocket request at offset {offset} failed ({e!r}), retrying in {delay:.2f}s.')
+            time.sleep(delay)
+            if stop is not None and stop.is_set():
+                raise
+            attempt += 1
+            continue
+        if (on_since is not None) and response.get('since'):
+            on_since(int(response['since']))
+        # Pocket returns an empty list instead of an empty dict when there is nothing left
+        return list((response.get('list') or {}).values())
+
+
+def fetch_pages(api: 'Pocket', offset: int = 0, limit: int = None, since: int = None,
+                count: int = FETCH_PAGE_SIZE, concurrency: int = FETCH_CONCURRENCY,
+                max_retries: int = FETCH_MAX_RETRIES, backoff_base: float = FETCH_BACKOFF_BASE,
+                on_since: Callable[[int], None] = None) -> Iterator[List[Dict]]:
+    """Yield the pages of a Pocket library in offset order.
+
+    Up to ``concurrency`` consecutive ``count``-item windows are requested at the same
+    time. Pocket can return fewer items than asked for, at the end of the library or
+    when it caps ``count``: after a short page the requests for the windows after it
+    are cancelled or discarded, and the rest is fetched one page at a time from the
+    end of the short page. An empty page ends the library. ``on_since`` is passed to
+    ``retrieve_page()``.
+    """
+    end = None if limit is None else offset + limit
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    stop = threading.Event()
+    pending = {}
+    next_start = offset
+    workers = max(1, concurrency)
+
+    def submit() -> bool:
+        nonlocal next_start
+        if (end is not None) and (next_start >= end):
+            return False
+        size = count if end is None else min(count, end - next_start)
+        future = pool.submit(retrieve_page, api, next_start, size, since, max_retries, backoff_base, stop, on_since)
+        pending[next_start] = (size, future)
+        next_start += size
+        return True
+
+    def discard_pending() -> None:
+        for _, future in pending.values():
+            future.cancel()
+        pending.clear()
+
+    try:
+        while len(pending) < workers and submit():
+            pass
+        while pending:
+            start = min(pending)
+            size, future = pending.pop(start)
+            items = future.result()
+            if len(items) == 0:
+                break
+            yield items
+            if len(items) < size:
+                # the windows after this one would skip the items Pocket did not return
+                discard_pending()
+                next_start = start + len(items)
+                workers = 1
+            while len(pending) < workers and submit():
+                pass
+    finally:
+        stop.set()
+        discard_pending()
+        pool.shutdown(wait=False)
@@ -0,0 +1,203 @@
+import numpy as np
+from datetime import date, datetime
+from typing import List, Dict, Any, Callable, Tuple, Optional
+from table import ArticleTable, MISSING_STATUS, MISSING_WORD_COUNT, to_int
+from constants import DEFAULT_TZINFO
+
+
+# filter format: [key, operation, expected_value]
+#   '=', '!='                 compare the string forms of both sides
+#   '<', '<=', '>', '>='      numeric comparison, datetimes are converted to epochs (naive ones and dates are in
+#                             DEFAULT_TZINFO, like the days of the time series)
+#   'in', 'not in'            expected_value is a list of accepted values
+#   'between'                 expected_value is [low, high], both ends included
+#   'contains'                substring test on the string form of the value
+OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'in', 'not in', 'between', 'contains')
+
+NUMERIC_COMPARATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+}
+RANGE_OPERATORS = tuple(NUMERIC_COMPARATORS) + ('between',)
+
+# column value stored for a field that is absent from the record (or not a number): it filters like None
+MISSING_VALUES = {
+    'status': MISSING_STATUS,
+    'word_count': MISSING_WORD_COUNT,
+}
+# Pocket sends '0' for the epochs that are not set (an unread article has no time_read):
+# no numeric comparison ('<', ..., 'between') matches them
+UNSET_EPOCHS = ('time_added', 'time_updated', 'time_read', 'time_favorited')
+# fields kept as lists of strings on the table, other fields are only on the raw records
+TEXT_COLUMNS = {
+    'item_id': 'item_ids',
+    'given_title': 'titles',
+}
+
+
+def _to_number(value: Any) -> float:
+    # not in the timezone of the server: the same filter selects the same items on every host
+    if isinstance(value, datetime):
+        return (value if value.tzinfo is not None else DEFAULT_TZINFO.localize(value)).timestamp()
+    if isinstance(value, date):
+        return DEFAULT_TZINFO.localize(datetime(value.year, value.month, value.day)).timestamp()
+    return float(value)
+
+
+def _to_str(value: Any) -> str:
+    return str(value) if value is not None else None
+
+
+def match_value(op: str, value: Any, expected: Any) -> bool:
+    if op == '=':
+        return _to_str(value) == _to_str(expected)
+    elif op == '!=':
+        return _to_str(value) != _to_str(expected)
+    elif op == 'in':
+        return _to_str(value) in {_to_str(e) for e in expected}
+    elif op == 'not in':
+        return _to_str(value) not in {_to_str(e) for e in expected}
+    elif op == 'contains':
+        return value is not None and str(expected) in str(value)
+    elif op in NUMERIC_COMPARATORS or op == 'between':
+        if value is None:
+            return False
+        try:
+            value = _to_number(value)
+        except ValueError:
+            return False
+        if op == 'between':
+            low, high = expected
+            return _to_number(low) <= value <= _to_number(high)
+        return bool(NUMERIC_COMPARATORS[op](value, _to_number(expected)))
+    raise NotImplementedError(op)
+
+
+def is_missing(key: str, op: str, value: Any) -> bool:
+    if value is None:
+        return False
+    if key in MISSING_VALUES:
+        return to_int(value, MISSING_VALUES[key]) == MISSING_VALUES[key]
+    return key in UNSET_EPOCHS and op in RANGE_OPERATORS and to_int(value, None) == 0
+
+
+def record_value(record: Dict, key: str, op: str) -> Any:
+    # the value of `key` that filters see, None when it is missing; an absent epoch is unset like Pocket's '0'
+    value = record.get(key, '0' if key in UNSET_EPOCHS else None)
+    return None if is_missing(key, op, value) else value
+
+
+def _missing_rows(key: str, op: str, column: np.ndarray) -> Optional[np.ndarray]:
+    if key in MISSING_VALUES:
+        return column == MISSING_VALUES[key]
+    if key in UNSET_EPOCHS and op in RANGE_OPERATORS:
+        return column == 0
+    return None
+
+
+def _exact_ints(values: List[Any]) -> List[int]:
+    # values whose string form is an integer, mirroring the '=' string semantics
+    ans = []
+    for v in values:
+        try:
+            ans.append(int(str(v)))
+        except ValueError:
+            pass
+    return ans
+
+
+def _categorical_mask(table: ArticleTable, key: str, op: str, expected: Any) -> np.ndarray:
+    # evaluate once per distinct category, then broadcast through the codes
+    categories = table.categories[key]
+    passed = np.fromiter((match_value(op, c, expected) for c in categories), dtype=bool, count=len(categories))
+    return passed[table.column(key)]
+
+
+def _numeric_mask(table: ArticleTable, key: str, op: str, expected: Any) -> np.ndarray:
+    column = table.column(key)
+    mask = _present_numeric_mask(column, op, expected)
+    missing = _missing_rows(key, op, column)
+    if missing is not None and missing.any():
+        mask = np.where(missing, match_value(op, None, expected), mask)
+    return mask
+
+
+def _present_numeric_mask(column: np.ndarray, op: str, expected: Any) -> np.ndarray:
+    if op in ('=', '!=', 'in', 'not in'):
+        accepted = _exact_ints([expected] if op in ('=', '!=') else expected)
+        mask = np.isin(column, accepted)
+        return ~mask if op in ('!=', 'not in') else mask
+    elif op in NUMERIC_COMPARATORS:
+        return NUMERIC_COMPARATORS[op](column, _to_number(expected))
+    elif op == 'between':
+        low, high = expected
+        return (column >= _to_number(low)) & (column <= _to_number(high))
+    elif op == 'contains':
+        uniques, inverse = np.unique(column, return_inverse=True)
+        passed = np.fromiter((match_value(op, v, expected) for v in uniques), dtype=bool, count=len(uniques))
+        return passed[inverse]
+    raise NotImplementedError(op)
+
+
+def _values_mask(values: List[Any], op: str, expected: Any) -> np.ndarray:
+    return np.fromiter((match_value(op, v, expected) for v in values), dtype=bool, count=len(values))
+
+
+def compile_filter(filter: List) -> Callable[..., np.ndarray]:
+    """Predicate of ``(table, records=None)``, the mask of the rows passing ``filter``.
+
+    Keys that are not columns of the table (``resolved_url``, ``excerpt``, ...)
+    are matched record by record on ``records``, the raw records of the table.
+    """
+    key, op, expected = filter
+    if op not in OPERATORS:
+        raise NotImplementedError(op)
+
+    def predicate(table: ArticleTable, records: List[Dict] = None) -> np.ndarray:
+        if key in table.categories:
+            return _categorical_mask(table, key, op, expected)
+        if key in table.columns:
+            return _numeric_mask(table, key, op, expected)
+        if key in TEXT_COLUMNS:
+            return _values_mask(getattr(table, TEXT_COLUMNS[key]), op, expected)
+        if records is None:
+            raise KeyError(f'{key!r} is not a column of the table, filter the raw records on it instead')
+        return _values_mask([record_value(r, key, op) for r in records], op, expected)
+    return predicate
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def filter_cache_key(filters: List[List]) -> Tuple:
+    return tuple((key, op, _freeze(expected)) for key, op, expected in filters)
+
+
+def get_filter_mask(table: ArticleTable, filters: List[List], records: List[Dict] = None) -> np.ndarray:
+    """Boolean mask of the rows passing all ``filters``.
+
+    Masks are cached on the table per filter and per filter list, so asking for
+    ``status = 0`` again on the same table is a dictionary lookup. ``records``,
+    the records the table was built from, are needed to filter on the fields
+    that are not columns of the table.
+    """
+    cache = table.mask_cache
+    key = filter_cache_key(filters)
+    if key in cache:
+        return cache[key]
+    mask = np.ones(len(table), dtype=bool)
+    for f, f_key in zip(filters, key):
+        single_key = (f_key,)
+        if single_key not in cache:
+            single_mask = compile_filter(f)(table, records)
+            single_mask.flags.writeable = False
+            cache[single_key] = single_mask
+        mask &= cache[single_key]
+    mask.flags.writeable = False
+    cache[key] = mask
+    return mask
@@ -0,0 +1,37 @@
+import hashlib
+import numpy as np
+from typing import List, Dict, Mapping
+from table import ArticleTable, NUMERIC_COLUMNS, CATEGORICAL_COLUMNS
+
+
+def _digest(*chunks: bytes) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for chunk in chunks:
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def content_fingerprint(items: List[Mapping]) -> str:
+    """Digest of the item IDs and ``time_updated`` of a library, in order.
+
+    Pocket bumps ``time_updated`` whenever an item is read, favorited, tagged or
+    edited, so two libraries with the same fingerprint have the same statistics.
+    Raw Pocket dicts and ``records.CompactRecord`` of the same items match.
+    """
+    lines = '\n'.join(f"{item.get('item_id', '')}:{item.get('time_updated', 0)}" for item in items)
+    return _digest(lines.encode('utf-8'))
+
+
+def column_fingerprints(table: ArticleTable) -> Dict[str, str]:
+    """Digest of every column of ``table``, plus ``rows`` for its length.
+
+    Two tables have the same digest for a column when it holds the same values in
+    the same order, e.g. ``titles`` is unchanged when only items were archived.
+    """
+    ans = {'rows': str(len(table)), 'titles': _digest('\0'.join(table.titles).encode('utf-8'))}
+    for name in NUMERIC_COLUMNS:
+        ans[name] = _digest(np.ascontiguousarray(table.column(name)).tobytes())
+    for name in CATEGORICAL_COLUMNS:
+        categories = '\0'.join(table.categories[name]).encode('utf-8')
+        ans[name] = _digest(np.ascontiguousarray(table.column(name)).tobytes(), b'\1', categories)
+    return ans
@@ -0,0 +1,264 @@
+import threading
+import numpy as np
+from collections import Counter
+from typing import List, Dict, Mapping, Sequence, Optional, Tuple, Any
+from table import ArticleTable, STATUS_ARCHIVED, STATUS_DELETED
+from data import COMPOSITION_KEYS, build_table, count_words_in_title, get_composition
+from storage import order_key
+from timeseries import DEFAULT_EVENTS, bin_epochs, event_epochs, merge_counts
+from reading_index import ReadingIndex, DEFAULT_ROLLING_WINDOW_DAYS
+from aggregates import STATUSES, DEFAULT_WORD_COUNT_BIN_SIZE, N_LAST_DAY_OPTIONS
+from constants import READING_DISTRIBUTION_BIN_WORDS
+
+
+def _value_counts(values) -> Dict[Any, int]:
+    values, counts = np.unique(np.asarray(values), return_counts=True)
+    return dict(zip(values.tolist(), counts.tolist()))
+
+
+def _add_counts(counter: Counter, counts: Mapping[Any, int], sign: int) -> None:
+    # keys whose count drops to 0 are removed, so retracting a record leaves no trace of it
+    for key, cnt in counts.items():
+        total = counter[key] + sign * cnt
+        if total:
+            counter[key] = total
+        else:
+            counter.pop(key, None)
+
+
+# the first n items of a list in the order of storage.SnapshotStore.load(), without copying them
+View = Tuple[Sequence[Dict], int]
+
+
+def _find(view: View, key: Tuple[int, str]) -> Optional[int]:
+    items, n = view
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if order_key(items[mid]) < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo if (lo < n) and (order_key(items[lo]) == key) else None
+
+
+def view_delta(previous: Dict[str, Dict], old_view: View, view: View,
+               changed: Mapping[str, Optional[int]]) -> Tuple[List[Dict], List[Dict]]:
+    """The records to retract and to apply to follow a delta sync from ``old_view`` to ``view``.
+
+    ``previous`` maps the item IDs of ``old_view`` to their records, it is updated
+    to ``view``. ``changed`` maps the items changed by the sync to their
+    ``time_added``, None when deleted. A view of the newest items also gains the
+    items pushed into it by deletions and loses the ones pushed out by new items,
+    at its end: only these and the changed items are looked at, each changed item
+    is found with a binary search of the sorted view.
+    """
+    retracted = [previous.pop(item_id) for item_id in changed if item_id in previous]
+    applied = []
+    for item_id, time_added in changed.items():
+        i = None if time_added is None else _find(view, (-time_added, item_id))
+        if i is not None:
+            applied.append(view[0][i])
+    (old_items, n_old), (items, n) = old_view, view
+    if 0 < n < len(items):
+        last = order_key(items[n - 1])
+        for i in range(n_old - 1, -1, -1):
+            item_id = str(old_items[i]['item_id'])
+            if item_id in changed:
+                continue
+            if order_key(old_items[i]) <= last:
+                break
+            retracted.append(previous.pop(item_id))
+    for i in range(n - 1, -1, -1):
+        item_id = str(items[i]['item_id'])
+        if item_id in changed:
+            continue
+        if item_id in previous:
+            break
+        applied.append(items[i])
+    previous.update((str(record['item_id']), record) for record in applied)
+    return retracted, applied
+
+
+class IncrementalAggregates:
+    """Dashboard aggregates that are updated page by page while a library is fetched.
+
+    Every statistic is a mergeable counter, so ``apply()`` only touches the new
+    records and ``retract()`` removes records applied before, e.g. to follow the
+    delta syncs of a library with ``apply_sync()``, see ``aggregates.update_aggregates()``. ``to_aggregates()``
+    returns the same structure as ``aggregates.compute_aggregates(data, DASHBOARD_AGGREGATES)``
+    for the records applied so far.
+    """
+
+    def __init__(self, bin_size: int = DEFAULT_WORD_COUNT_BIN_SIZE, n_last_days: List[int] = N_LAST_DAY_OPTIONS):
+        self.bin_size = bin_size
+        self.n_last_days = n_last_days
+        self.count = 0
+        self.favorite_count = 0
+        self.composition = Counter()
+        self.title_words = Counter()
+        self.languages = Counter()
+        self.domains = {status: Counter() for status in STATUSES + ('all',)}
+        self.word_count_bins = {status: Counter() for status in STATUSES + ('all',)}
+        self.reading_bins = {status: Counter() for status in STATUSES + ('all',)}
+        self.total_words = {status: 0 for status in STATUSES}
+        self.event_days = {event: Counter() for event in DEFAULT_EVENTS}
+        self.archived_reads = Counter()  # (time_updated, word count) of the archived records -> count
+        self._reading_index = None  # of archived_reads, built again only when they change
+        self.last_sync = None  # of the library the records are from, see apply_sync()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_table(cls, table: ArticleTable) -> 'IncrementalAggregates':
+        """Aggregates of all the records of ``table``, like ``apply()`` of its records."""
+        ans = cls()
+        ans._merge_table(table, 1)
+        return ans
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # pickled by the file and memcached caches, without the lock
+        with self._lock:
+            return {k: v for k, v in self.__dict__.items() if k != '_lock'}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def apply(self, records: List[Dict]) -> None:
+        """Add ``records`` to every aggregate, in O(1) per aggregate and record."""
+        self._merge(records, 1)
+
+    def retract(self, records: List[Dict]) -> None:
+        """Remove ``records``, as they were when applied, from every aggregate.
+
+        Raises ValueError, without changing anything, when a count would go below
+        zero: the records were not all applied.
+        """
+        self._merge(records, -1)
+
+    def apply_delta(self, changed: List[Dict], previous: Mapping[str, Dict]) -> None:
+        """Apply the items changed since the last sync, as returned by Pocket with ``since``.
+
+        ``previous`` maps item IDs to the records applied before. An archived item
+        is retracted as unread and applied as archived; a deleted one (status 2)
+        is only retracted, like ``storage.SnapshotStore.apply_delta()`` drops it.
+        """
+        old = [previous[str(item['item_id'])] for item in changed if str(item['item_id']) in previous]
+        new = [item for item in changed if str(item.get('status')) != str(STATUS_DELETED)]
+        self.retract(old)
+        self.apply(new)
+
+    def apply_sync(self, since: int, last_sync: int, previous: Dict[str, Dict], old_view: View, view: View,
+                   changed: Mapping[str, Optional[int]]) -> Optional[Tuple[Dict[str, Any], ReadingIndex]]:
+        """Follow the delta sync of the library from ``since`` to ``last_sync``, see ``view_delta()``.
+
+        Returns ``to_aggregates()`` and ``reading_index()`` after it, or None when
+        these aggregates are not the ones of ``since``: another thread already
+        followed it, or a previous update failed halfway.
+        """
+        with self._lock:
+            if (self.last_sync is None) or (self.last_sync != since):
+                return None
+            self.last_sync = None  # until the whole sync is applied
+            retracted, applied = view_delta(previous, old_view, view, changed)
+            self.retract(retracted)
+            self.apply(applied)
+            self.last_sync = last_sync
+            return self.to_aggregates(), self.reading_index()
+
+    def skip_sync(self, last_sync: int) -> bool:
+        # a sync that changed none of the applied records, the next one follows it
+        with self._lock:
+            if self.last_sync is None:
+                return False
+            self.last_sync = last_sync
+            return True
+
+    def _merge(self, records: List[Dict], sign: int) -> None:
+        # the page is parsed into a small table outside the lock, only the merge is serialized
+        self._merge_table(build_table(records), sign)
+
+    def _merge_table(self, table: ArticleTable, sign: int) -> None:
+        status = table.column('status')
+        word_counts = table.column('word_count')
+        valid = word_counts >= 0
+        bins = word_counts // self.bin_size
+        readable = word_counts > 0
+        reading_bins = word_counts // READING_DISTRIBUTION_BIN_WORDS
+        composition = get_composition(table)
+        archived = status == STATUS_ARCHIVED
+        reads = Counter(zip(table.column('time_updated')[archived].tolist(), word_counts[archived].tolist()))
+        # (counter, counts) pairs, computed outside the lock
+        updates = [
+            (self.composition, composition),
+            (self.title_words, count_words_in_title(table)),
+            (self.languages, table.category_counts('lang')),
+            (self.domains['all'], table.category_counts('domain')),
+            (self.word_count_bins['all'], _value_counts(bins[valid])),
+            (self.reading_bins['all'], _value_counts(reading_bins[readable])),
+            (self.archived_reads, reads),
+        ]
+        for s in STATUSES:
+            updates += [
+                (self.domains[s], table.category_counts('domain', status == s)),
+                (self.word_count_bins[s], _value_counts(bins[valid & (status == s)])),
+                (self.reading_bins[s], _value_counts(reading_bins[readable & (status == s)])),
+            ]
+        updates += [(self.event_days[event], _value_counts(bin_epochs(event_epochs(table, event))))
+                    for event in DEFAULT_EVENTS]
+        total_words = {s: int(word_counts[readable & (status == s)].sum()) for s in STATUSES}
+        with self._lock:
+            if (sign < 0) and ((len(table) > self.count)
+                               or any(total_words[s] > self.total_words[s] for s in STATUSES)
+                               or any(cnt > counter.get(key, 0) for counter, counts in updates
+                                      for key, cnt in counts.items())):
+                raise ValueError('retracting records that were not applied')
+            self.count += sign * len(table)
+            self.favorite_count += sign * composition['favorited']
+            for counter, counts in updates:
+                _add_counts(counter, counts, sign)
+            for s in STATUSES:
+                self.total_words[s] += sign * total_words[s]
+            if reads:
+                self._reading_index = None
+
+    def reading_index(self) -> ReadingIndex:
+        with self._lock:
+            if self._reading_index is None:
+                # reads with the same time and word count are stored once, with their multiplicity
+                reads = np.array(list(self.archived_reads), dtype=np.int64).reshape(-1, 2)
+                repeats = np.fromiter(self.archived_reads.values(), dtype=np.int64, count=len(self.archived_reads))
+                self._reading_index = ReadingIndex(np.repeat(reads[:, 0], repeats), np.repeat(reads[:, 1], repeats))
+            return self._reading_index
+
+    @staticmethod
+    def _histogram(bin_counts: Dict[Any, Counter], bin_size: int) -> Dict[Any, np.ndarray]:
+        n_bins = max(bin_counts['all'], default=0) + 1
+        ans = {}
+        for k, counter in bin_counts.items():
+            ans[k] = np.zeros(n_bins, dtype=np.int64)
+            for b, cnt in counter.items():
+                ans[k][b] = cnt
+        ans['edges'] = np.arange(n_bins + 1) * bin_size
+        return ans
+
+    def to_aggregates(self) -> Dict[str, Any]:
+        with self._lock:
+            reading_index = self.reading_index()
+            return {
+                'count': self.count,
+                'title_word_counts': Counter(self.title_words),
+                'time_series': merge_counts(self.event_days),
+                'average_readed_words': {n: reading_index.average_words_since(n) for n in self.n_last_days},
+                'words_read_rolling': reading_index.rolling(DEFAULT_ROLLING_WINDOW_DAYS),
+                'word_count_histogram': self._histogram(self.word_count_bins, self.bin_size),
+                'reading_distribution': dict(self._histogram(self.reading_bins, READING_DISTRIBUTION_BIN_WORDS),
+                                             total_words=dict(self.total_words)),
+                'domain_counts': {k: Counter(v) for k, v in self.domains.items()},
+                'language_counts': Counter(self.languages),
+                'favorite_count': {
+                    'count': self.favorite_count,
+                    'percent': 1.0 * self.favorite_count / self.count if self.count > 0 else 0,
+                },
+                'composition': {k: self.composition[k] for k in COMPOSITION_KEYS},
+            }
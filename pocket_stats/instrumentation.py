@@ -0,0 +1,260 @@
+import io
+import time
+import pstats
+import cProfile
+import threading
+import functools
+import contextlib
+from typing import Callable, Dict, Iterator, Optional, TYPE_CHECKING
+from cache import get_cache
+from domains import get_domain_from_hostname
+from constants import INSTRUMENTATION, PROFILING, PROFILE_MAX_SECONDS
+
+
+if TYPE_CHECKING:
+    from payload import ResponseSizeReport
+
+
+METRICS_PATH = '/metrics'
+PROFILE_PATH = '/_profile'
+METRIC_PREFIX = 'pocket_stats'
+
+
+class Timings:
+    """Count, total and max duration (seconds) of the calls of each name."""
+
+    def __init__(self):
+        self.calls: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.calls.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['sum'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self.calls.items()}
+
+
+class Metrics:
+    """Timings of the instrumented functions and callbacks, and counters, of this process.
+
+    Disabled unless ``POCKET_STATS_INSTRUMENTATION=1``: the decorated functions
+    then only pay for a flag check.
+    """
+
+    def __init__(self, enabled: bool = INSTRUMENTATION):
+        self.enabled = enabled
+        self.functions = Timings()
+        self.callbacks = Timings()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        if self.enabled:
+            with self._lock:
+                self.gauges[name] = value
+
+
+METRICS = Metrics()
+
+
+def timed(name: str = None) -> Callable[[Callable], Callable]:
+    """Record the duration of every call of the decorated function, under ``module.function`` by default."""
+    def decorator(fn: Callable) -> Callable:
+        label = name or f'{fn.__module__}.{fn.__name__}'
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                METRICS.functions.add(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    # same as @timed(name), for a block of code
+    if not METRICS.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        METRICS.functions.add(name, time.perf_counter() - start)
+
+
+def record_fetch(n_items: int, seconds: float) -> None:
+    METRICS.inc('fetch_items_total', n_items)
+    METRICS.inc('fetch_seconds_total', seconds)
+    if seconds > 0:
+        METRICS.set_gauge('fetch_items_per_second', n_items / seconds)
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def timings_text(metric: str, label: str, timings: Dict[str, Dict[str, float]]) -> list:
+    lines = [f'# TYPE {metric} summary']
+    for name, stats in sorted(timings.items()):
+        labels = f'{{{label}="{escape_label(name)}"}}'
+        lines.append(f'{metric}_count{labels} {stats["count"]}')
+        lines.append(f'{metric}_sum{labels} {stats["sum"]:.6f}')
+    lines.append(f'# TYPE {metric}_max gauge')
+    lines += [f'{metric}_max{{{label}="{escape_label(name)}"}} {stats["max"]:.6f}'
+              for name, stats in sorted(timings.items())]
+    return lines
+
+
+def prometheus_text(metrics: Metrics = METRICS, report: 'ResponseSizeReport' = None) -> str:
+    """The metrics of this process in the Prometheus text exposition format."""
+    p = METRIC_PREFIX
+    lines = timings_text(f'{p}_function_seconds', 'function', metrics.functions.as_dict())
+    lines += timings_text(f'{p}_callback_seconds', 'output', metrics.callbacks.as_dict())
+    with metrics._lock:
+        counters, gauges = dict(metrics.counters), dict(metrics.gauges)
+    for name, value in sorted(counters.items()):
+        lines += [f'# TYPE {p}_{name} counter', f'{p}_{name} {value:g}']
+    for name, value in sorted(gauges.items()):
+        lines += [f'# TYPE {p}_{name} gauge', f'{p}_{name} {value:g}']
+    cache = get_cache().stats.as_dict()
+    for name in ('hits', 'misses', 'sets', 'rejected', 'evictions'):
+        lines += [f'# TYPE {p}_cache_{name}_total counter', f'{p}_cache_{name}_total {cache[name]}']
+    lines += [f'# TYPE {p}_cache_hit_ratio gauge', f'{p}_cache_hit_ratio {cache["hit_ratio"]:g}']
+    domains = get_domain_from_hostname.cache_info()
+    lines += [f'# TYPE {p}_domain_memo_hits_total counter', f'{p}_domain_memo_hits_total {domains.hits}',
+              f'# TYPE {p}_domain_memo_misses_total counter', f'{p}_domain_memo_misses_total {domains.misses}']
+    if report is not None:
+        sizes = report.as_dict()
+        lines.append(f'# TYPE {p}_callback_response_bytes summary')
+        for output, stats in sorted(sizes.items()):
+            labels = f'{{output="{escape_label(output)}"}}'
+            lines.append(f'{p}_callback_response_bytes_count{labels} {stats["count"]}')
+            lines.append(f'{p}_callback_response_bytes_sum{labels} {stats["total_bytes"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+    """cProfile of the callback requests and section builds started in a time window, in one ``pstats.Stats``.
+
+    Each profiled call has its own ``cProfile.Profile``, so the sections built on
+    the render threads are profiled as well as the Flask request threads.
+    """
+
+    def __init__(self):
+        self.deadline = 0.0
+        self.stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def start(self, seconds: float) -> None:
+        with self._lock:
+            self.deadline = time.time() + seconds
+            self.stats = None
+
+    def active(self) -> bool:
+        return time.time() < self.deadline
+
+    def begin(self) -> Optional[cProfile.Profile]:
+        if not self.active():
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def end(self, profile: Optional[cProfile.Profile]) -> None:
+        if profile is None:
+            return
+        profile.disable()
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    def text(self, sort: str = 'cumulative', limit: int = 50) -> str:
+        with self._lock:
+            if self.stats is None:
+                return 'Nothing profiled yet\n'
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+
+PROFILER = Profiler()
+
+
+def profiled(fn: Callable) -> Callable:
+    # calls made while PROFILER is active are added to its stats, e.g. builds running on other threads
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = PROFILER.begin()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            PROFILER.end(profile)
+    return wrapper
+
+
+def install_metrics(server, report: 'ResponseSizeReport' = None, metrics: Metrics = METRICS,
+                    profiling: bool = PROFILING, profiler: Profiler = PROFILER) -> None:
+    """Time every Dash callback request of a Flask ``server`` and serve the metrics at ``METRICS_PATH``.
+
+    The metrics are only served when they are enabled (``POCKET_STATS_INSTRUMENTATION=1``).
+    With ``profiling``, ``PROFILE_PATH?seconds=n`` profiles the next ``n`` seconds
+    of callbacks and ``PROFILE_PATH`` shows the result (``?sort=tottime`` to reorder).
+    """
+    # imported here so that the data functions can be timed without loading the web stack
+    import flask
+    from payload import DASH_UPDATE_PATH
+
+    @server.before_request
+    def start_callback_span():
+        if flask.request.path.endswith(DASH_UPDATE_PATH):
+            flask.g.callback_start = time.perf_counter()
+            flask.g.callback_profile = profiler.begin()
+
+    @server.after_request
+    def end_callback_span(response):
+        # the span covers the callback and the JSON serialization of its result
+        start = flask.g.pop('callback_start', None)
+        if start is not None and metrics.enabled:
+            body = flask.request.get_json(silent=True) or {}
+            metrics.callbacks.add(str(body.get('output', 'unknown')), time.perf_counter() - start)
+        profiler.end(flask.g.pop('callback_profile', None))
+        return response
+
+    if metrics.enabled:
+        @server.route(METRICS_PATH)
+        def prometheus_metrics():
+            return flask.Response(prometheus_text(metrics, report), mimetype='text/plain; version=0.0.4')
+
+    if profiling:
+        @server.route(PROFILE_PATH)
+        def callback_profile():
+            seconds = flask.request.args.get('seconds', type=float)
+            if seconds is not None:
+                seconds = min(max(seconds, 0), PROFILE_MAX_SECONDS)
+                profiler.start(seconds)
+                return flask.Response(f'Profiling the callbacks of the next {seconds:g} seconds\n',
+                                      mimetype='text/plain')
+            sort = flask.request.args.get('sort', 'cumulative')
+            if sort not in ('cumulative', 'tottime', 'ncalls'):
+                flask.abort(400)
+            return flask.Response(profiler.text(sort), mimetype='text/plain')
@@ -0,0 +1,64 @@
+import os
+import numpy as np
+from typing import List, Sequence, Tuple
+from text import TitleIndex
+from constants import PARALLEL_JOBS, PARALLEL_MIN_RECORDS
+
+
+def parallel_jobs(n_records: int, n_jobs: int = PARALLEL_JOBS, min_records: int = PARALLEL_MIN_RECORDS) -> int:
+    """Number of processes to aggregate ``n_records`` with, 1 means in this process.
+
+    ``n_jobs`` follows joblib: -1 is one process per core, -2 all cores but one.
+    """
+    if n_records < min_records:
+        return 1
+    cores = os.cpu_count() or 1
+    n = n_jobs if n_jobs > 0 else cores + 1 + n_jobs
+    return max(1, min(n, cores, n_records))
+
+
+def shard_bounds(n: int, n_shards: int) -> List[Tuple[int, int]]:
+    # contiguous [start, end) slices of about the same size, in order
+    edges = np.linspace(0, n, n_shards + 1).astype(np.int64)
+    return [(int(start), int(end)) for start, end in zip(edges[:-1], edges[1:]) if end > start]
+
+
+def encode_strings(strings: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """UTF-8 bytes of all ``strings`` in one array, and the offsets of each string in it.
+
+    Unlike a list of str, the two arrays are shared with the workers through
+    joblib's memory mapping instead of being pickled for each of them.
+    """
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def decode_strings(buffer: np.ndarray, offsets: np.ndarray, start: int, end: int) -> List[str]:
+    data = buffer[offsets[start]:offsets[end]].tobytes()
+    base = offsets[start]
+    return [data[offsets[i] - base:offsets[i + 1] - base].decode('utf-8') for i in range(start, end)]
+
+
+def _title_index_shard(buffer: np.ndarray, offsets: np.ndarray, lang_codes: np.ndarray, langs: List[str],
+                       start: int, end: int) -> TitleIndex:
+    titles = decode_strings(buffer, offsets, start, end)
+    return TitleIndex.from_titles(titles, (langs[code] for code in lang_codes[start:end]))
+
+
+def parallel_title_index(titles: Sequence[str], lang_codes: np.ndarray, langs: List[str], n_jobs: int) -> TitleIndex:
+    """``TitleIndex.from_titles()`` of the titles, tokenized by ``n_jobs`` processes.
+
+    Each process tokenizes a contiguous shard of the titles, read from memory
+    mapped arrays, and the shard indexes are concatenated in order, so the
+    result is the same as a tokenization in this process.
+    """
+    # imported here: only the largest libraries start a process pool
+    from joblib import Parallel, delayed
+    buffer, offsets = encode_strings(titles)
+    shards = Parallel(n_jobs=n_jobs)(
+        delayed(_title_index_shard)(buffer, offsets, lang_codes, langs, start, end)
+        for start, end in shard_bounds(len(titles), n_jobs)
+    )
+    return TitleIndex.concat(shards)
@@ -0,0 +1,98 @@
+import json
+import logging
+import threading
+import flask
+import numpy as np
+import plotly.graph_objs as go
+from typing import Dict, Any, Sequence
+from constants import FIGURE_DECIMALS, RESPONSE_SIZE_WARNING_BYTES, INSTRUMENTATION
+
+
+DASH_UPDATE_PATH = '/_dash-update-component'
+RESPONSE_SIZES_PATH = '/_response-sizes'
+
+
+def compact_values(values: Sequence, decimals: int = FIGURE_DECIMALS) -> np.ndarray:
+    # whole numbers are sent as ints and the others rounded, instead of 17 significant digits per float
+    values = np.asarray(values)
+    if values.dtype.kind != 'f':
+        return values
+    rounded = np.round(values, decimals)
+    if np.all(np.isfinite(rounded)) and np.array_equal(rounded, np.round(rounded)):
+        return rounded.astype(np.int64)
+    return rounded
+
+
+def histogram_bars(counts: np.ndarray, edges: np.ndarray, name: str, decimals: int = FIGURE_DECIMALS) -> go.Bar:
+    """``go.Bar`` trace of a histogram binned on the server.
+
+    Only one (center, width, count) triple per bin is sent to the browser, whatever
+    the number of articles, instead of the raw values of a ``go.Histogram``.
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    return go.Bar(
+        x=compact_values((edges[:-1] + edges[1:]) / 2, decimals),
+        y=compact_values(counts, decimals),
+        width=compact_values(edges[1:] - edges[:-1], decimals),
+        name=name,
+    )
+
+
+def slim_figure(fig: go.Figure, decimals: int = FIGURE_DECIMALS) -> go.Figure:
+    # round the numeric x / y arrays of every trace in place, e.g. of a px.line() built from floats
+    for trace in fig.data:
+        for key in ('x', 'y'):
+            values = getattr(trace, key, None)
+            if values is not None and np.asarray(values).dtype.kind == 'f':
+                setattr(trace, key, compact_values(values, decimals))
+    return fig
+
+
+class ResponseSizeReport:
+    """Number and size (bytes) of the Dash callback responses, per callback output."""
+
+    def __init__(self, warning_bytes: int = RESPONSE_SIZE_WARNING_BYTES):
+        self.warning_bytes = warning_bytes
+        self.callbacks: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, output: str, n_bytes: int) -> None:
+        with self._lock:
+            stats = self.callbacks.setdefault(output, {'count': 0, 'total_bytes': 0, 'max_bytes': 0})
+            stats['count'] += 1
+            stats['total_bytes'] += n_bytes
+            stats['max_bytes'] = max(stats['max_bytes'], n_bytes)
+        if n_bytes >= self.warning_bytes:
+            logging.warning(f'Callback response for {output} is {n_bytes} bytes')
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                output: dict(stats, mean_bytes=stats['total_bytes'] / stats['count'])
+                for output, stats in sorted(self.callbacks.items(), key=lambda p: -p[1]['total_bytes'])
+            }
+
+
+def install_response_size_report(server, report: ResponseSizeReport = None,
+                                 serve: bool = INSTRUMENTATION) -> ResponseSizeReport:
+    """Record the size of every Dash callback response of a Flask ``server``.
+
+    With ``serve`` (``POCKET_STATS_INSTRUMENTATION=1``) the report is served as
+    JSON at ``RESPONSE_SIZES_PATH``, the large responses are logged in any case.
+    Sizes are measured before Flask-Compress, i.e. what the browser has to parse.
+    """
+    report = ResponseSizeReport() if report is None else report
+
+    @server.after_request
+    def record_response_size(response):
+        if flask.request.path.endswith(DASH_UPDATE_PATH) and not response.direct_passthrough:
+            body = flask.request.get_json(silent=True) or {}
+            report.add(str(body.get('output', 'unknown')), len(response.get_data()))
+        return response
+
+    if serve:
+        @server.route(RESPONSE_SIZES_PATH)
+        def response_sizes():
+            return flask.Response(json.dumps(report.as_dict()), mimetype='application/json')
+
+    return report
@@ -0,0 +1,69 @@
+import numpy as np
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+from table import ArticleTable, STATUS_ARCHIVED
+from timeseries import TimeZone, get_timezone
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+DEFAULT_ROLLING_WINDOW_DAYS = 7
+
+
+class ReadingIndex:
+    """Archived articles sorted by ``time_updated``, with prefix sums of their word counts.
+
+    The number of articles and words read in any time window are two binary
+    searches away, so a window average costs O(log n) whatever the window.
+    """
+
+    def __init__(self, time_updated: np.ndarray, word_counts: np.ndarray):
+        order = np.argsort(time_updated, kind='stable')
+        self.times = np.asarray(time_updated, dtype=np.int64)[order]
+        self.cum_words = np.concatenate([[0], np.cumsum(np.asarray(word_counts, dtype=np.int64)[order])])
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def from_table(cls, table: ArticleTable) -> 'ReadingIndex':
+        archived = table.column('status') == STATUS_ARCHIVED
+        return cls(table.column('time_updated')[archived], table.column('word_count')[archived])
+
+    def window(self, start_epochs, end_epochs=None):
+        # (article count, word count) of the reads in [start, end), vectorized over the bounds
+        i = np.searchsorted(self.times, start_epochs, side='left')
+        j = len(self.times) if end_epochs is None else np.searchsorted(self.times, end_epochs, side='left')
+        return j - i, self.cum_words[j] - self.cum_words[i]
+
+    def average_words(self, start_epoch: float, end_epoch: float = None) -> float:
+        count, words = self.window(start_epoch, end_epoch)
+        return float(words / count) if count > 0 else 0
+
+    def average_words_since(self, n_last_days: int) -> float:
+        return self.average_words((datetime.now() - timedelta(days=n_last_days)).timestamp())
+
+    def rolling(self, window_days: int = DEFAULT_ROLLING_WINDOW_DAYS, tz: TimeZone = None) -> 'pd.DataFrame':
+        """Moving averages over the ``window_days`` local days ending at each day from the first read to the last.
+
+        Columns: words read per day, and words per article read, in the window.
+        """
+        import pandas as pd
+        if len(self.times) == 0:
+            return pd.DataFrame({'Words read per day': [], 'Words per article read': []}, index=pd.DatetimeIndex([]))
+        tz = get_timezone(tz)
+        first, last = pd.to_datetime(self.times[[0, -1]], unit='s', utc=True).tz_convert(tz).tz_localize(None)
+        days = pd.date_range(first.normalize(), last.normalize(), freq='D')  # naive local days, DST aware below
+
+        def localize(local_days: 'pd.DatetimeIndex') -> 'pd.DatetimeIndex':
+            return local_days.tz_localize(tz, ambiguous=False, nonexistent='shift_forward')
+
+        ends = localize(days + pd.Timedelta(days=1)).asi8 // 10 ** 9
+        starts = localize(days - pd.Timedelta(days=window_days - 1)).asi8 // 10 ** 9
+        counts, words = self.window(starts, ends)
+        per_article = np.divide(words, counts, out=np.zeros(len(days)), where=counts > 0)
+        return pd.DataFrame({
+            'Words read per day': words / window_days,
+            'Words per article read': per_article,
+        }, index=localize(days))
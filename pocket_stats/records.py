@@ -0,0 +1,55 @@
+import sys
+from collections.abc import Mapping
+from typing import List, Dict, Iterator, Any
+from table import NUMERIC_COLUMNS, to_int
+from domains import get_domain_from_url
+
+
+STRING_FIELDS = ('item_id', 'given_title', 'resolved_url', 'lang')
+RECORD_FIELDS = STRING_FIELDS + ('domain',) + tuple(NUMERIC_COLUMNS)
+_FIELD_SET = frozenset(RECORD_FIELDS)
+
+
+class CompactRecord(Mapping):
+    """Read-only record holding only the fields the statistics need.
+
+    It behaves like the Pocket item dict it was built from (``record['status']``,
+    ``record.get('lang')``) but stores numbers as ints in ``__slots__`` and drops
+    the excerpt, images, tags and other unused fields. The domain of
+    ``resolved_url`` is resolved once, here.
+    """
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, record: Mapping):
+        for name in STRING_FIELDS:
+            setattr(self, name, str(record.get(name, '')))
+        self.lang = sys.intern(self.lang)  # a handful of distinct values shared by all records
+        self.domain = sys.intern(get_domain_from_url(self.resolved_url))
+        for name, (_, default) in NUMERIC_COLUMNS.items():
+            setattr(self, name, to_int(record.get(name), default))
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(RECORD_FIELDS)
+
+    def __len__(self) -> int:
+        return len(RECORD_FIELDS)
+
+    def __repr__(self) -> str:
+        return f'CompactRecord({dict(self)!r})'
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in RECORD_FIELDS)
+
+    def __setstate__(self, state):
+        for name, value in zip(RECORD_FIELDS, state):
+            setattr(self, name, value)
+
+
+def compact_records(records: List[Dict]) -> List[CompactRecord]:
+    return [r if isinstance(r, CompactRecord) else CompactRecord(r) for r in records]
@@ -0,0 +1,83 @@
+import queue
+import logging
+import threading
+import contextlib
+from typing import Callable, Dict, Hashable, Iterator, List, Optional
+from constants import REFRESH_THREADS, REFRESH_MAX_QUEUED
+
+
+class KeyedLocks:
+    """One lock per key, e.g. per access token, dropped once nobody holds or waits for it."""
+
+    def __init__(self):
+        self._locks: Dict[Hashable, List] = {}  # key -> [lock, number of holders and waiters]
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def hold(self, key: Hashable) -> Iterator[None]:
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+
+class RefreshScheduler:
+    """Refreshes cached libraries on background threads, at most once at a time per token.
+
+    ``schedule()`` returns right away: a token already queued or being refreshed
+    is not queued again, and a refresh is dropped (and logged) when
+    ``max_queued`` refreshes are already waiting. The threads are started by the
+    first ``schedule()``, i.e. in the gunicorn worker and not in the preloading master.
+    """
+
+    def __init__(self, refresh: Callable[[str, Optional[int]], object],
+                 n_threads: int = REFRESH_THREADS, max_queued: int = REFRESH_MAX_QUEUED):
+        self.refresh = refresh
+        self.n_threads = n_threads
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._pending = set()  # tokens queued or being refreshed
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def schedule(self, access_token: str, limit: int = None) -> bool:
+        with self._lock:
+            if access_token in self._pending:
+                return False
+            try:
+                self._queue.put_nowait((access_token, limit))
+            except queue.Full:
+                logging.warning('Refresh queue is full, the cached library is served without refreshing it.')
+                return False
+            self._pending.add(access_token)
+            while len(self._threads) < self.n_threads:
+                thread = threading.Thread(target=self._work, name=f'refresh-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            return True
+
+    def pending(self, access_token: str) -> bool:
+        with self._lock:
+            return access_token in self._pending
+
+    def join(self) -> None:
+        # blocks until every scheduled refresh is done
+        self._queue.join()
+
+    def _work(self) -> None:
+        while True:
+            access_token, limit = self._queue.get()
+            try:
+                self.refresh(access_token, limit)
+            except Exception:
+                logging.exception('Background refresh of a library failed, the cached one is still served.')
+            finally:
+                with self._lock:
+                    self._pending.discard(access_token)
+                self._queue.task_done()
@@ -0,0 +1,54 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Hashable
+from constants import RENDER_THREADS, RENDER_MAX_RESULTS
+
+
+class RenderPool:
+    """Builds dashboard sections on a thread pool, at most once per key.
+
+    A section requested while it is being built (e.g. by the prefetch of the
+    reload callback) waits for that build instead of starting another one. The
+    ``max_results`` most recent results are kept for the next requests.
+    """
+
+    def __init__(self, max_workers: int = RENDER_THREADS, max_results: int = RENDER_MAX_RESULTS):
+        self.max_results = max_results
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='render')
+        self._futures: 'OrderedDict[Hashable, Future]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, fn: Callable, *args) -> Future:
+        with self._lock:
+            future = self._futures.get(key)
+            if future is None:
+                future = self._futures[key] = self._pool.submit(fn, *args)
+                while len(self._futures) > self.max_results:
+                    self._futures.popitem(last=False)
+            else:
+                self._futures.move_to_end(key)
+            return future
+
+    def result(self, key: Hashable, fn: Callable, *args) -> Any:
+        future = self.submit(key, fn, *args)
+        try:
+            return future.result()
+        except Exception:
+            # failed builds are not kept, the next request tries again
+            with self._lock:
+                if self._futures.get(key) is future:
+                    del self._futures[key]
+            raise
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def get_render_pool() -> RenderPool:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = RenderPool()
+        return _render_pool
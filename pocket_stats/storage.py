@@ -0,0 +1,132 @@
+import os
+import json
+import sqlite3
+import hashlib
+from contextlib import closing
+from typing import List, Dict, Optional, Tuple
+from constants import SNAPSHOT_DIR
+from table import STATUS_DELETED
+from records import CompactRecord
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS items (
+    item_id TEXT PRIMARY KEY,
+    time_added INTEGER NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_time_added ON items (time_added DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+
+class Snapshot:
+    def __init__(self, items: List[Dict], last_sync: int, complete: bool):
+        self.items = items  # newest first, like the Pocket API default sort
+        self.last_sync = last_sync
+        self.complete = complete  # True when the whole library was fetched, not only the newest items
+
+    def covers(self, limit: int = None) -> bool:
+        return self.complete or (limit is not None and len(self.items) >= limit)
+
+
+def order_key(record: Dict) -> Tuple[int, str]:
+    # the order of the items of SnapshotStore.load(): newest first, then by item ID
+    return -int(record.get('time_added') or 0), str(record['item_id'])
+
+
+class Sync:
+    # one sync of a library with Pocket: a full fetch when `since` is None, else a delta sync
+    def __init__(self, last_sync: int, since: int = None, changed: List[Dict] = None):
+        self.last_sync = last_sync  # to pass as ``since`` to the next delta sync
+        self.since = since  # last_sync of the snapshot the delta was applied to
+        self.changed = changed  # items changed since then, as returned by Pocket (deleted ones have status 2)
+
+
+class SnapshotStore:
+    """Local SQLite snapshot of a Pocket library, one database file per access token.
+
+    Tokens are only stored hashed (in the file name). ``last_sync`` is Pocket's
+    time of the latest fetch, to be passed as ``since`` to the next delta sync.
+    A snapshot of only the newest items holds every item added since
+    ``oldest_added``: the changed items added before are not stored by the delta
+    syncs, so the snapshot never has gaps and its newest items are the library's.
+    """
+
+    def __init__(self, snapshot_dir: str = SNAPSHOT_DIR):
+        self.snapshot_dir = snapshot_dir
+
+    def path(self, access_token: str) -> str:
+        name = hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+        return os.path.join(self.snapshot_dir, f'{name}.sqlite3')
+
+    def _connect(self, access_token: str) -> sqlite3.Connection:
+        os.makedirs(self.snapshot_dir, mode=0o700, exist_ok=True)
+        conn = sqlite3.connect(self.path(access_token), timeout=30)
+        conn.executescript(SCHEMA)
+        return conn
+
+    def load(self, access_token: str, limit: int = None, compact: bool = False) -> Optional[Snapshot]:
+        if not os.path.isfile(self.path(access_token)):
+            return None
+        with closing(self._connect(access_token)) as conn:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            if 'last_sync' not in meta:
+                return None
+            rows = conn.execute('SELECT record FROM items ORDER BY time_added DESC, item_id LIMIT ?',
+                                (-1 if limit is None else limit,))
+            if compact:  # never holds more than one full record in memory
+                items = [CompactRecord(json.loads(record)) for record, in rows]
+            else:
+                items = [json.loads(record) for record, in rows]
+        return Snapshot(items, last_sync=int(meta['last_sync']), complete=meta.get('complete') == '1')
+
+    def covers(self, access_token: str, limit: int = None) -> bool:
+        # same as load(access_token, limit).covers(limit), without reading the records
+        if not os.path.isfile(self.path(access_token)):
+            return False
+        with closing(self._connect(access_token)) as conn:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            n_items, = conn.execute('SELECT COUNT(*) FROM items WHERE time_added >= ?',
+                                    (int(meta.get('oldest_added', 0)),)).fetchone()
+        if 'last_sync' not in meta:
+            return False
+        return meta.get('complete') == '1' or (limit is not None and n_items >= limit)
+
+    def save(self, access_token: str, items: List[Dict], last_sync: int, complete: bool) -> None:
+        with closing(self._connect(access_token)) as conn, conn:
+            conn.execute('DELETE FROM items')
+            self._upsert(conn, items)
+            oldest_added = 0 if complete else min((int(item.get('time_added', 0)) for item in items), default=0)
+            self._set_meta(conn, last_sync, complete, oldest_added)
+
+    def apply_delta(self, access_token: str, items: List[Dict], last_sync: int) -> None:
+        with closing(self._connect(access_token)) as conn, conn:
+            meta = dict(conn.execute('SELECT key, value FROM meta'))
+            oldest_added = int(meta.get('oldest_added', 0))
+            deleted = [(item['item_id'],) for item in items if str(item.get('status')) == str(STATUS_DELETED)]
+            conn.executemany('DELETE FROM items WHERE item_id = ?', deleted)
+            # items added before the window of the snapshot stay out of it, like the ones never changed
+            self._upsert(conn, [item for item in items if str(item.get('status')) != str(STATUS_DELETED)
+                                and int(item.get('time_added', 0)) >= oldest_added])
+            self._set_meta(conn, last_sync, meta.get('complete') == '1', oldest_added)
+
+    def clear(self, access_token: str) -> None:
+        if os.path.isfile(self.path(access_token)):
+            os.remove(self.path(access_token))
+
+    @staticmethod
+    def _upsert(conn: sqlite3.Connection, items: List[Dict]) -> None:
+        conn.executemany(
+            'INSERT OR REPLACE INTO items (item_id, time_added, record) VALUES (?, ?, ?)',
+            ((str(item['item_id']), int(item.get('time_added', 0)), json.dumps(dict(item))) for item in items),
+        )
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, last_sync: int, complete: bool, oldest_added: int) -> None:
+        conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                         [('last_sync', str(last_sync)), ('complete', '1' if complete else '0'),
+                          ('oldest_added', str(oldest_added))])
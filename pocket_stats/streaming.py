@@ -0,0 +1,100 @@
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from data import iter_data, put_data_entry, save_snapshot, get_sync_time
+from incremental import IncrementalAggregates
+from constants import COMPACT_RECORDS, STREAM_ERROR_TTL
+
+
+class StreamingLoad:
+    """Background fetch of one library that keeps partial aggregates up to date.
+
+    When the fetch finishes, the items are stored in the data cache and the local
+    snapshot, so the next ``get_data`` call is served without another fetch, and
+    the load is dropped from the running loads. A failed one is kept for
+    ``STREAM_ERROR_TTL`` seconds, to report its error.
+    """
+
+    def __init__(self, access_token: str, limit: int = None):
+        self.access_token = access_token
+        self.limit = limit
+        self.aggregates = IncrementalAggregates()
+        self.items: List[Dict] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._snapshot = (-1, None)  # (count, aggregates) of the last snapshot()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'StreamingLoad':
+        self._thread.start()
+        return self
+
+    def join(self, timeout: float = None) -> None:
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        server_times = []
+        local_time = int(time.time())
+        try:
+            for page in iter_data(limit=self.limit, access_token=self.access_token, compact=COMPACT_RECORDS,
+                                  on_since=server_times.append):
+                self.aggregates.apply(page)
+                self.items.extend(page)
+            put_data_entry(self.access_token, self.items, self.limit)
+            save_snapshot(self.access_token, self.items, limit=self.limit,
+                          sync_time=get_sync_time(server_times, local_time))
+        except Exception as e:
+            logging.exception('Streaming load failed')
+            self.error = e
+        finally:
+            self.finished_at = time.time()
+            self.done = True
+        if self.error is None:
+            # served from the data cache from now on, even when no tab asks for this load anymore
+            with _loads_lock:
+                if _loads.get((self.access_token, self.limit)) is self:
+                    del _loads[(self.access_token, self.limit)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        # shared by the sections rendered for the same refresh, recomputed only when new pages arrived
+        count, aggregates = self._snapshot
+        if count != self.aggregates.count:
+            aggregates = self.aggregates.to_aggregates()
+            self._snapshot = (aggregates['count'], aggregates)
+        return aggregates
+
+
+_loads: Dict[Tuple[str, int], StreamingLoad] = {}
+_loads_lock = threading.Lock()
+
+
+def _drop_expired_loads(now: float) -> None:
+    # failed loads whose error was never asked for, e.g. the tab was closed
+    for key, load in list(_loads.items()):
+        if load.done and now - load.finished_at > STREAM_ERROR_TTL:
+            del _loads[key]
+
+
+def start_streaming_load(access_token: str, limit: int = None) -> StreamingLoad:
+    # at most one running load per (token, limit), finished ones are replaced
+    with _loads_lock:
+        _drop_expired_loads(time.time())
+        load = _loads.get((access_token, limit))
+        if (load is None) or load.done:
+            load = _loads[(access_token, limit)] = StreamingLoad(access_token, limit).start()
+        return load
+
+
+def get_streaming_load(access_token: str, limit: int = None) -> Optional[StreamingLoad]:
+    with _loads_lock:
+        return _loads.get((access_token, limit))
+
+
+def discard_streaming_load(access_token: str, limit: int = None) -> None:
+    with _loads_lock:
+        load = _loads.get((access_token, limit))
+        if (load is not None) and load.done:
+            del _loads[(access_token, limit)]
@@ -0,0 +1,125 @@
+import sys
+import numpy as np
+from typing import List, Dict, Tuple, Callable, Any
+
+
+STATUS_UNREAD = 0
+STATUS_ARCHIVED = 1
+STATUS_DELETED = 2
+MISSING_WORD_COUNT = -99999
+MISSING_STATUS = -1
+
+# column name -> (numpy dtype, default value when the field is missing)
+NUMERIC_COLUMNS = {
+    'status': (np.int8, MISSING_STATUS),
+    'favorite': (np.int8, 0),
+    'word_count': (np.int64, MISSING_WORD_COUNT),
+    'time_added': (np.int64, 0),
+    'time_updated': (np.int64, 0),
+    'time_read': (np.int64, 0),
+    'time_favorited': (np.int64, 0),
+    'is_article': (np.int8, 0),
+    'has_video': (np.int8, 0),
+    'has_image': (np.int8, 0),
+}
+
+# categorical column name -> raw field it is built from
+CATEGORICAL_COLUMNS = {
+    'domain': 'resolved_url',
+    'lang': 'lang',
+}
+
+
+def to_int(value: Any, default: int) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def encode_categories(values: List[str]) -> Tuple[np.ndarray, List[str]]:
+    index = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, v in enumerate(values):
+        code = index.get(v)
+        if code is None:
+            code = index[v] = len(index)
+        codes[i] = code
+    return codes, list(index)
+
+
+class ArticleTable:
+    """Columnar, read-only view of a Pocket library.
+
+    Numeric and epoch fields are stored as NumPy arrays, domain and language as
+    integer codes into ``categories[name]``. Build it once with ``from_records``
+    and pass it to the ``get_*`` functions in ``data.py``.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], categories: Dict[str, List[str]],
+                 item_ids: List[str], titles: List[str]):
+        self.columns = columns
+        self.categories = categories
+        self.item_ids = item_ids
+        self.titles = titles
+        # filter masks computed by filters.get_filter_mask(), keyed by the normalized filter list
+        self.mask_cache = {}
+        # text.TitleIndex of the titles, built by data.get_title_index() on first use
+        self.title_index = None
+        # reading_index.ReadingIndex of the archived rows, built by data.get_reading_index() on first use
+        self.reading_index = None
+
+    def __len__(self) -> int:
+        return len(self.item_ids)
+
+    @property
+    def nbytes(self) -> int:
+        # memory of the columns and strings, the masks and indexes built later are not counted
+        strings = sum(sys.getsizeof(s) for s in self.item_ids) + sum(sys.getsizeof(s) for s in self.titles)
+        return sum(col.nbytes for col in self.columns.values()) + strings
+
+    @classmethod
+    def from_records(cls, data: List[Dict],
+                     get_domain: Callable[[str], str],
+                     normalize_language: Callable[[str], str]) -> 'ArticleTable':
+        n = len(data)
+        columns = {name: np.empty(n, dtype=dtype) for name, (dtype, _) in NUMERIC_COLUMNS.items()}
+        raw_categories = {name: [] for name in CATEGORICAL_COLUMNS}
+        item_ids = []
+        titles = []
+        for i, record in enumerate(data):
+            for name, (_, default) in NUMERIC_COLUMNS.items():
+                columns[name][i] = to_int(record.get(name), default)
+            # compact records carry the domain resolved at ingest time
+            domain = record.get('domain')
+            if domain is None:
+                domain = get_domain(record.get('resolved_url', ''))
+            raw_categories['domain'].append(domain)
+            raw_categories['lang'].append(normalize_language(record.get('lang', '')))
+            item_ids.append(str(record.get('item_id', i)))
+            titles.append(record.get('given_title', ''))
+        categories = {}
+        for name, values in raw_categories.items():
+            columns[name], categories[name] = encode_categories(values)
+        return cls(columns, categories, item_ids, titles)
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            raise KeyError(f'ArticleTable has no column {name!r}')
+        return self.columns[name]
+
+    def take(self, mask: np.ndarray) -> 'ArticleTable':
+        indices = np.flatnonzero(mask)
+        return ArticleTable(
+            columns={name: col[indices] for name, col in self.columns.items()},
+            categories=self.categories,
+            item_ids=[self.item_ids[i] for i in indices],
+            titles=[self.titles[i] for i in indices],
+        )
+
+    def category_counts(self, name: str, mask: np.ndarray = None) -> Dict[str, int]:
+        codes = self.column(name)
+        if mask is not None:
+            codes = codes[mask]
+        counts = np.bincount(codes, minlength=len(self.categories[name]))
+        return {self.categories[name][code]: int(cnt) for code, cnt in enumerate(counts) if cnt > 0}
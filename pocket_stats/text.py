@@ -0,0 +1,137 @@
+import re
+import logging
+import unicodedata
+import numpy as np
+from collections import Counter
+from functools import lru_cache
+from typing import List, Dict, Tuple, Iterable, FrozenSet
+
+
+# Pocket language code -> name of the NLTK stopwords corpus
+STOPWORD_LANGUAGES = {
+    'ar': 'arabic', 'az': 'azerbaijani', 'da': 'danish', 'de': 'german', 'el': 'greek', 'en': 'english',
+    'es': 'spanish', 'fi': 'finnish', 'fr': 'french', 'hu': 'hungarian', 'id': 'indonesian', 'it': 'italian',
+    'kk': 'kazakh', 'ne': 'nepali', 'nl': 'dutch', 'no': 'norwegian', 'pt': 'portuguese', 'ro': 'romanian',
+    'ru': 'russian', 'sl': 'slovene', 'sv': 'swedish', 'tg': 'tajik', 'tr': 'turkish',
+}
+DEFAULT_STOPWORD_LANGUAGE = 'en'
+
+# runs of letters and digits in any script, joined by inner apostrophes ("don't") or hyphens ("e-mail")
+_TOKEN_RE = re.compile(r"[^\W_]+(?:['-][^\W_]+)*")
+_APOSTROPHES = str.maketrans({'’': "'", '‘': "'", 'ʼ': "'"})
+
+
+@lru_cache(maxsize=None)
+def _load_stopwords(name: str) -> FrozenSet[str]:
+    from nltk.corpus import stopwords  # the nltk package takes longer to import than the whole app
+    try:
+        return frozenset(stopwords.words(name))
+    except (LookupError, OSError):
+        logging.warning(f'NLTK stopwords for {name!r} are not installed, no words are removed for this language.')
+        return frozenset()
+
+
+@lru_cache(maxsize=None)
+def get_stopwords(lang: str) -> FrozenSet[str]:
+    # English stopwords are always removed, titles of non-English items often mix both
+    lang = lang.strip().lower().split('-')[0]
+    ans = _load_stopwords(STOPWORD_LANGUAGES[DEFAULT_STOPWORD_LANGUAGE])
+    if lang in STOPWORD_LANGUAGES and lang != DEFAULT_STOPWORD_LANGUAGE:
+        ans = ans | _load_stopwords(STOPWORD_LANGUAGES[lang])
+    return ans
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize('NFKC', text).translate(_APOSTROPHES).casefold()
+
+
+def tokenize_title(title: str, lang: str = DEFAULT_STOPWORD_LANGUAGE) -> List[str]:
+    words = get_stopwords(lang)
+    return [w for w in _TOKEN_RE.findall(normalize_text(title)) if w not in words]
+
+
+class TitleIndex:
+    """Tokenized titles of the rows of an ``ArticleTable``.
+
+    Titles are tokenized once. Row ``i`` owns ``token_ids[offsets[i]:offsets[i + 1]]``,
+    ids into ``terms``. The inverted index (term -> rows) is built on first use.
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, token_ids: np.ndarray):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.token_ids = token_ids
+        self._postings = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_titles(cls, titles: Iterable[str], langs: Iterable[str]) -> 'TitleIndex':
+        term_ids = {}
+        offsets = [0]
+        token_ids = []
+        for title, lang in zip(titles, langs):
+            for token in tokenize_title(title, lang):
+                term_id = term_ids.get(token)
+                if term_id is None:
+                    term_id = term_ids[token] = len(term_ids)
+                token_ids.append(term_id)
+            offsets.append(len(token_ids))
+        return cls(list(term_ids), np.asarray(offsets, dtype=np.int64), np.asarray(token_ids, dtype=np.int32))
+
+    @classmethod
+    def concat(cls, parts: List['TitleIndex']) -> 'TitleIndex':
+        """Index of the rows of ``parts``, in order, with terms numbered by first appearance like ``from_titles``."""
+        term_ids = {}
+        offsets = [np.zeros(1, dtype=np.int64)]
+        token_ids = []
+        n_tokens = 0
+        for part in parts:
+            # local term id -> global term id
+            mapping = np.empty(len(part.terms), dtype=np.int32)
+            for local_id, term in enumerate(part.terms):
+                term_id = term_ids.get(term)
+                if term_id is None:
+                    term_id = term_ids[term] = len(term_ids)
+                mapping[local_id] = term_id
+            token_ids.append(mapping[part.token_ids])
+            offsets.append(part.offsets[1:] + n_tokens)
+            n_tokens += len(part.token_ids)
+        return cls(list(term_ids), np.concatenate(offsets),
+                   np.concatenate(token_ids) if token_ids else np.empty(0, dtype=np.int32))
+
+    def row_tokens(self, row: int) -> List[str]:
+        return [self.terms[t] for t in self.token_ids[self.offsets[row]:self.offsets[row + 1]]]
+
+    def term_frequencies(self, mask: np.ndarray = None) -> np.ndarray:
+        token_ids = self.token_ids
+        if mask is not None:
+            token_ids = token_ids[np.repeat(mask, np.diff(self.offsets))]
+        return np.bincount(token_ids, minlength=len(self.terms))
+
+    def term_counts(self, mask: np.ndarray = None) -> Dict[str, int]:
+        counts = self.term_frequencies(mask)
+        return Counter({self.terms[t]: int(counts[t]) for t in np.flatnonzero(counts)})
+
+    def top_terms(self, n: int, mask: np.ndarray = None) -> List[Tuple[str, int]]:
+        counts = self.term_frequencies(mask)
+        top = np.flatnonzero(counts)
+        if len(top) > n:
+            top = top[np.argpartition(-counts[top], n - 1)[:n]]
+        # most frequent first, ties in order of first appearance
+        top = top[np.lexsort((top, -counts[top]))]
+        return [(self.terms[t], int(counts[t])) for t in top]
+
+    def rows_with(self, term: str) -> np.ndarray:
+        term_id = self.term_ids.get(normalize_text(term))
+        if term_id is None:
+            return np.empty(0, dtype=np.int64)
+        if self._postings is None:
+            rows = np.repeat(np.arange(len(self)), np.diff(self.offsets))
+            order = np.argsort(self.token_ids, kind='stable')
+            bounds = np.searchsorted(self.token_ids[order], np.arange(len(self.terms) + 1))
+            self._postings = (rows[order], bounds)
+        rows, bounds = self._postings
+        return np.unique(rows[bounds[term_id]:bounds[term_id + 1]])
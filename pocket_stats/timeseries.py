@@ -0,0 +1,101 @@
+import pytz
+import numpy as np
+from datetime import tzinfo
+from typing import Dict, Tuple, Union, Iterable, TYPE_CHECKING
+from table import ArticleTable, STATUS_ARCHIVED
+from constants import DEFAULT_TZINFO
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+GRANULARITIES = ('day', 'week', 'month')
+DEFAULT_GRANULARITY = 'day'
+
+# event name -> name of its column in the time series
+EVENTS = {
+    'added': 'All articles',
+    'archived': 'Archived articles',
+    'favorited': 'Favorited articles',
+    'read': 'Read articles',
+}
+DEFAULT_EVENTS = tuple(EVENTS)
+
+# 1970-01-01, day 0 of datetime64[D], is a Thursday
+_DAYS_AFTER_MONDAY_AT_EPOCH = 3
+
+TimeZone = Union[str, tzinfo, None]
+
+
+def get_timezone(tz: TimeZone = None) -> tzinfo:
+    # None means DEFAULT_TZINFO, names are resolved with pytz (unknown ones raise pytz.UnknownTimeZoneError)
+    if tz is None:
+        return DEFAULT_TZINFO
+    if isinstance(tz, str):
+        return pytz.timezone(tz)
+    return tz
+
+
+def coarsen_days(days: np.ndarray, granularity: str = DEFAULT_GRANULARITY) -> np.ndarray:
+    if granularity not in GRANULARITIES:
+        raise NotImplementedError(f'Time series granularity {granularity!r} is not supported')
+    days = days.astype('datetime64[D]')
+    if granularity == 'week':
+        return days - (days.astype(np.int64) + _DAYS_AFTER_MONDAY_AT_EPOCH) % 7
+    if granularity == 'month':
+        return days.astype('datetime64[M]').astype('datetime64[D]')
+    return days
+
+
+def bin_epochs(epochs: np.ndarray, granularity: str = DEFAULT_GRANULARITY, tz: TimeZone = None) -> np.ndarray:
+    """First local day (``datetime64[D]``) of the day, week (from Monday) or month of each epoch."""
+    import pandas as pd  # pandas is only loaded by the first chart, not at import
+    local = pd.to_datetime(np.asarray(epochs), unit='s', utc=True).tz_convert(get_timezone(tz)).tz_localize(None)
+    return coarsen_days(local.values, granularity)
+
+
+def event_epochs(table: ArticleTable, event: str) -> np.ndarray:
+    if event == 'added':
+        return table.column('time_added')
+    if event == 'archived':
+        # archived articles are counted at the time they were added, like the unread ones
+        return table.column('time_added')[table.column('status') == STATUS_ARCHIVED]
+    if event == 'favorited':
+        time_favorited = table.column('time_favorited')
+        return time_favorited[(table.column('favorite') == 1) & (time_favorited > 0)]
+    if event == 'read':
+        time_read = table.column('time_read')
+        return time_read[time_read > 0]
+    raise NotImplementedError(f'Time series event {event!r} is not supported')
+
+
+def counts_frame(bins: np.ndarray, event_codes: np.ndarray, weights: np.ndarray,
+                 events: Tuple[str, ...], tz: TimeZone = None) -> 'pd.DataFrame':
+    # one column per event, one row per bin holding at least one event
+    import pandas as pd
+    unique_bins, bin_codes = np.unique(bins.astype('datetime64[D]'), return_inverse=True)
+    counts = np.bincount(bin_codes * len(events) + event_codes, weights=weights,
+                         minlength=len(unique_bins) * len(events)).reshape(len(unique_bins), len(events))
+    index = pd.DatetimeIndex(unique_bins).tz_localize(get_timezone(tz), ambiguous=False, nonexistent='shift_forward')
+    return pd.DataFrame(counts.astype(np.int64), index=index, columns=[EVENTS[e] for e in events])
+
+
+def time_series(table: ArticleTable, events: Iterable[str] = DEFAULT_EVENTS,
+                granularity: str = DEFAULT_GRANULARITY, tz: TimeZone = None) -> 'pd.DataFrame':
+    """Number of articles per ``granularity`` bin for each event, all events binned in one pass."""
+    events = tuple(events)
+    epochs = [event_epochs(table, e) for e in events]
+    bins = bin_epochs(np.concatenate(epochs) if epochs else np.empty(0, dtype=np.int64), granularity, tz)
+    event_codes = np.repeat(np.arange(len(events)), [len(e) for e in epochs])
+    return counts_frame(bins, event_codes, np.ones(len(bins)), events, tz)
+
+
+def merge_counts(day_counts: Dict[str, Dict[np.datetime64, int]], granularity: str = DEFAULT_GRANULARITY,
+                 tz: TimeZone = None) -> 'pd.DataFrame':
+    # time series from per-event {local day: count} counters, e.g. the ones kept by IncrementalAggregates
+    events = tuple(day_counts)
+    days = [np.array(list(day_counts[e]), dtype='datetime64[D]') for e in events]
+    bins = coarsen_days(np.concatenate(days) if days else np.empty(0, dtype='datetime64[D]'), granularity)
+    event_codes = np.repeat(np.arange(len(events)), [len(d) for d in days])
+    weights = np.array([cnt for e in events for cnt in day_counts[e].values()], dtype=np.float64)
+    return counts_frame(bins, event_codes, weights, events, tz)
@@ -1,22 +1,45 @@
-import random
-import plotly
-import pandas as pd
-from typing import List, Dict, Tuple, Any
+import uuid
+import pytz
+from typing import List, Dict, Tuple, Any, Optional, TYPE_CHECKING
 import dash
-import dash_table
 import dash_core_components as dcc
 import dash_html_components as html
 from dash.dependencies import Input, Output, State
+from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
-import plotly.express as px
 
-from data import get_data, count_words_in_title, get_word_counts, get_reading_time, get_average_readed_word
-from data import get_added_time_series, get_archived_time_series
-from data import get_language_counts, get_favorite_count, get_domain_counts
+from data import Dataset, get_table, get_fingerprint, get_time_series, peek_data_entry, has_snapshot
+from streaming import start_streaming_load, get_streaming_load, discard_streaming_load
+from aggregates import DASHBOARD_AGGREGATES, STATUSES, compute_aggregates, get_aggregates, rebin_reading_time
+from table import STATUS_UNREAD, STATUS_ARCHIVED
+from timeseries import GRANULARITIES, DEFAULT_GRANULARITY
+from word_cloud import get_word_cloud_layout
+from render import get_render_pool
+from cache import make_key
+from coalesce import IN_FLIGHT, LATEST_REQUESTS
+from payload import compact_values, histogram_bars, slim_figure, install_response_size_report
+from instrumentation import timed, profiled, install_metrics
 from constants import DEFAULT_READING_SPEED, ACCESS_TOKEN, MAX_NUMBER_OF_RECORDS, DASH_APP_INDEX_STRING
+from constants import STREAM_REFRESH_INTERVAL_MS, DEFAULT_TIMEZONE, READING_TIME_BIN_MINUTES, WORD_CLOUD_SIZE
+from constants import INSTRUMENTATION, PROFILING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 INPUT_SECTION_STYLE = {'width': '100%', 'font-size': '30px'}
+ALL_RECORDS_SLIDER_VALUE = MAX_NUMBER_OF_RECORDS + 250
+STATUS_NAMES = {STATUS_UNREAD: 'Unread articles', STATUS_ARCHIVED: 'Archived articles'}
+# bars of the library composition panel, keys of data.get_composition()
+COMPOSITION_LABELS = {
+    'unread': 'Unread',
+    'archived': 'Archived',
+    'deleted': 'Deleted',
+    'favorited': 'Favorited',
+    'articles': 'Articles',
+    'videos': 'With videos',
+    'images': 'With images',
+}
 
 
 def plot_two_columns(col0: Any, col1: Any, width0_percent: float = 50) -> html.Div:
@@ -28,81 +51,177 @@ def plot_two_columns(col0: Any, col1: Any, width0_percent: float = 50) -> html.D
     ])
 
 
-def word_cloud_plot(data: List[Dict]) -> dcc.Graph:
-    word_cnts = count_words_in_title(data)
-    n_word = len(word_cnts)
-    words = list(word_cnts.keys())
-    weights = [word_cnts[w] for w in words]
-    colors = [plotly.colors.DEFAULT_PLOTLY_COLORS[random.randrange(1, 10)] for i in range(n_word)]
-    data = go.Scatter(x=[random.random() for i in range(n_word)],
-                      y=[random.random() for i in range(n_word)],
+def with_aggregates(data: Dataset, aggregates: Dict[str, Any], *names: str) -> Dict[str, Any]:
+    # plot builders can be called standalone or with the output of one shared compute_aggregates() call
+    if aggregates is not None and all(name in aggregates for name in names):
+        return aggregates
+    return compute_aggregates(data, [spec for spec in DASHBOARD_AGGREGATES if spec[0] in names])
+
+
+@timed()
+def word_cloud_plot(data: Dataset, aggregates: Dict[str, Any] = None) -> dcc.Graph:
+    word_cnts = with_aggregates(data, aggregates, 'title_word_counts')['title_word_counts']
+    placed = get_word_cloud_layout(word_cnts)
+    width, height = WORD_CLOUD_SIZE
+    data = go.Scatter(x=compact_values([p.x for p in placed]),
+                      y=compact_values([p.y for p in placed]),
                       mode='text',
-                      text=words,
-                      marker={'opacity': 0.3},
-                      textfont={'size': weights,
-                                'color': colors})
-    layout = go.Layout({'xaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False},
-                        'yaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False}})
+                      text=[p.word for p in placed],
+                      hovertext=[f'{p.word}: {p.count}' for p in placed],
+                      hoverinfo='text',
+                      textfont={'size': [p.font_size for p in placed],
+                                'color': [p.color for p in placed]})
+    # the layout is computed in pixels, so the figure has the size of the canvas
+    axis = {'showgrid': False, 'showticklabels': False, 'zeroline': False, 'fixedrange': True}
+    layout = go.Layout({'xaxis': dict(axis, range=[0, width]),
+                        'yaxis': dict(axis, range=[0, height]),
+                        'width': width, 'height': height,
+                        'margin': {'l': 0, 'r': 0, 't': 0, 'b': 0}})
     fig = go.Figure(data=[data], layout=layout)
     return dcc.Graph(figure=fig)
 
 
-def articles_over_time_plot(data: List[Dict], should_cumsum: bool = True) -> dcc.Graph:
-    df = get_added_time_series(data)
-    archived_df = get_archived_time_series(data)
-    if len(archived_df) > 0:
-        df = pd.merge(df, archived_df, how='outer', left_index=True, right_index=True)
+def articles_over_time_chart(df: 'pd.DataFrame', should_cumsum: bool = True) -> go.Figure:
+    # df: one column per event, zero filled, as returned by get_time_series()
+    import plotly.express as px  # with pandas, loaded by the first chart instead of at worker boot
     if should_cumsum:
-        df.fillna(0, inplace=True)
         df = df.cumsum()
-    fig = px.line(df,
-                  labels={'index': 'Date', 'value': 'Number of articles'},
-                  title='Article Count Over Time')
-    return dcc.Graph(figure=fig)
+    return px.line(df,
+                   labels={'index': 'Date', 'value': 'Number of articles'},
+                   title='Article Count Over Time')
+
+
+@timed()
+def articles_over_time_plot(data: Dataset, should_cumsum: bool = True, aggregates: Dict[str, Any] = None) -> dcc.Graph:
+    df = with_aggregates(data, aggregates, 'time_series')['time_series']
+    return dcc.Graph(figure=articles_over_time_chart(df, should_cumsum))
+
+
+@timed()
+def articles_over_time_section(data: Dataset, aggregates: Dict[str, Any] = None) -> html.Div:
+    df = with_aggregates(data, aggregates, 'time_series')['time_series']
+    return html.Div([
+        plot_two_columns(
+            dcc.RadioItems(
+                id='articles-over-time-granularity',
+                options=[{'label': g.capitalize(), 'value': g} for g in GRANULARITIES],
+                value=DEFAULT_GRANULARITY,
+                labelStyle={'display': 'inline-block', 'margin-right': '10px'},
+            ),
+            dcc.Dropdown(
+                id='articles-over-time-timezone',
+                options=[{'label': tz, 'value': tz} for tz in pytz.common_timezones],
+                value=DEFAULT_TIMEZONE,
+                clearable=False,
+            ),
+        ),
+        # figure will be updated by update_articles_over_time() when another granularity or timezone is picked
+        dcc.Graph(id='articles-over-time-chart', figure=articles_over_time_chart(df)),
+    ])
 
 
-def word_counts_plot(data: List[Dict]) -> dcc.Graph:
-    n_last_day_options = [360, 90, 30, 7, 2]
-    avg_readed_words = [int(get_average_readed_word(data, n_last_day)) for n_last_day in n_last_day_options]
+@timed()
+def word_counts_plot(data: Dataset, aggregates: Dict[str, Any] = None) -> dcc.Graph:
+    import dash_table
+    import plotly.express as px
+    aggregates = with_aggregates(data, aggregates, 'average_readed_words', 'words_read_rolling', 'word_count_histogram')
+    n_last_day_options = list(aggregates['average_readed_words'].keys())
+    avg_readed_words = [int(v) for v in aggregates['average_readed_words'].values()]
     avg_readed_words_table = dash_table.DataTable(
         id='readed-words',
         columns=[{'name': f'{i} days', 'id': f'{i}_days'} for i in n_last_day_options],
         data=[{f'{i}_days': avg_readed_words[pos] for pos, i in enumerate(n_last_day_options)}],
     )
-    # histogram
+    # histogram, binned by compute_aggregates()
+    histogram = aggregates['word_count_histogram']
+    edges = histogram['edges']
     fig = go.Figure()
-    fig.add_trace(go.Histogram(
-        x=get_word_counts(data, filters=[['status', '=', 0]]),  # unread
-        name='Unread articles',
-    ))
-    fig.add_trace(go.Histogram(
-        x=get_word_counts(data, filters=[['status', '=', 1]]),  # archived
-        name='Archived articles',
-    ))
+    for status in STATUSES:
+        fig.add_trace(histogram_bars(histogram[status], edges, name=STATUS_NAMES[status]))
     fig.update_layout(
         title_text='Word Count Distribution',  # title of plot
         xaxis_title_text='Number of words',
         yaxis_title_text='Number of articles',
         barmode='stack'  # The two histograms are drawn on top of another
     )
+    rolling = aggregates['words_read_rolling']
+    window_days = dict(DASHBOARD_AGGREGATES)['words_read_rolling']['window_days']
+    rolling_fig = px.line(rolling[['Words read per day']],
+                          labels={'index': 'Date', 'value': 'Number of words'},
+                          title=f'Words Read Per Day ({window_days}-day moving average)')
+    rolling_fig.update_layout(showlegend=False)
+    slim_figure(rolling_fig)
     return html.Div([
         html.H3(children='Average readed words recently (words / day)', className='center-text'),
         avg_readed_words_table,
+        dcc.Graph(figure=rolling_fig),
         dcc.Graph(figure=fig)
     ])
 
 
 # -------------------- Reading time -------------------- #
-def get_reading_time_chart(data: List[Dict], reading_speed: int) -> go.Figure:
+# mirrors get_reading_time_chart() and get_reading_time_needed() in the browser, so moving the sliders
+# needs no request: the reading time histogram is rebinned from the word count distribution in the store
+READING_TIME_CLIENTSIDE = """
+function(readingSpeed, readingMinutesDaily, store) {
+    if (!store || !readingSpeed || !readingMinutesDaily) {
+        return [window.dash_clientside.no_update, window.dash_clientside.no_update, window.dash_clientside.no_update];
+    }
+    var edges = store.edges, binMinutes = store.bin_minutes;
+    var data = store.statuses.map(function(status) {
+        var y = [];
+        for (var i = 0; i + 1 < edges.length; i++) {
+            var bin = Math.floor((edges[i] + edges[i + 1]) / 2 / readingSpeed / binMinutes);
+            while (y.length <= bin) { y.push(0); }
+            y[bin] += store.counts[status][i];
+        }
+        return {
+            type: 'bar', name: store.names[status], y: y,
+            x: y.map(function(_, i) { return (i + 0.5) * binMinutes; }),
+            width: y.map(function() { return binMinutes; })
+        };
+    });
+    var figure = {data: data, layout: {
+        title: {text: 'Reading Time Distribution'},
+        xaxis: {title: {text: 'Estimated reading time (minutes) with reading speed = ' + readingSpeed + ' wpm'}},
+        yaxis: {title: {text: 'Number of articles'}},
+        barmode: 'stack'
+    }};
+    var totalMinutes = Math.floor(store.total_unread_words / readingSpeed);
+    var days = Math.floor(totalMinutes / readingMinutesDaily);
+    var hours = Math.floor((totalMinutes % readingMinutesDaily) / 60);
+    var minutes = totalMinutes % 60;
+    var needed = (days > 0 ? ' ' + days + ' days' : '') + (hours > 0 ? ' ' + hours + ' hours' : '') +
+                 (minutes > 0 ? ' ' + minutes + ' minutes' : '');
+    var title = 'Total reading time needed (with ' + readingSpeed + ' words / minute and ' +
+                readingMinutesDaily + ' minutes / day)';
+    return [figure, title, needed];
+}
+"""
+
+
+def reading_distribution(data: Dataset, aggregates: Dict[str, Any] = None) -> Dict[Any, Any]:
+    return with_aggregates(data, aggregates, 'reading_distribution')['reading_distribution']
+
+
+def reading_distribution_store(distribution: Dict[Any, Any]) -> Dict[str, Any]:
+    # JSON for the dcc.Store read by READING_TIME_CLIENTSIDE
+    return {
+        'edges': compact_values(distribution['edges']).tolist(),
+        'statuses': [str(s) for s in STATUSES],
+        'names': {str(s): STATUS_NAMES[s] for s in STATUSES},
+        'counts': {str(s): distribution[s].tolist() for s in STATUSES},
+        'total_unread_words': distribution['total_words'][STATUS_UNREAD],
+        'bin_minutes': READING_TIME_BIN_MINUTES,
+    }
+
+
+@timed()
+def get_reading_time_chart(data: Dataset, reading_speed: int, aggregates: Dict[str, Any] = None) -> go.Figure:
+    histogram = rebin_reading_time(reading_distribution(data, aggregates), reading_speed)
     fig = go.Figure()
-    fig.add_trace(go.Histogram(
-        x=get_reading_time(data, reading_speed=reading_speed, filters=[['status', '=', 0]]),  # unread
-        name='Unread articles',
-    ))
-    fig.add_trace(go.Histogram(
-        x=get_reading_time(data, reading_speed=reading_speed, filters=[['status', '=', 1]]),  # archived
-        name='Archived articles',
-    ))
+    for status in STATUSES:
+        fig.add_trace(histogram_bars(histogram[status], histogram['edges'], name=STATUS_NAMES[status]))
     fig.update_layout(
         title_text='Reading Time Distribution',  # title of plot
         xaxis_title_text=f'Estimated reading time (minutes) with reading speed = {reading_speed} wpm',
@@ -112,8 +231,11 @@ def get_reading_time_chart(data: List[Dict], reading_speed: int) -> go.Figure:
     return fig
 
 
-def get_reading_time_needed(data: List[Dict], reading_speed: int, reading_minutes_daily: int) -> html.Div:
-    total_minutes = int(sum(get_reading_time(data, reading_speed=reading_speed, filters=[['status', '=', 0]])))
+@timed()
+def get_reading_time_needed(data: Dataset, reading_speed: int, reading_minutes_daily: int,
+                            aggregates: Dict[str, Any] = None) -> html.Div:
+    total_words = reading_distribution(data, aggregates)['total_words'][STATUS_UNREAD]
+    total_minutes = int(total_words / reading_speed)
     days = int(total_minutes / reading_minutes_daily)
     hours = int((total_minutes % reading_minutes_daily) / 60)
     minutes = total_minutes % 60
@@ -126,14 +248,18 @@ def get_reading_time_needed(data: List[Dict], reading_speed: int, reading_minute
         ans += f' {minutes} minutes'
     title = f'Total reading time needed (with {reading_speed} words / minute and {reading_minutes_daily} minutes / day)'
     return html.Div([
-        html.H3(children=title, className='center-text'),
-        html.Div(children=ans, className='center-text highlight'),
+        html.H3(id='reading-time-needed-title', children=title, className='center-text'),
+        html.Div(id='reading-time-needed-value', children=ans, className='center-text highlight'),
     ])
 
 
-def reading_time_plot(data: List[Dict]) -> html.Div:
+@timed()
+def reading_time_plot(data: Dataset, aggregates: Dict[str, Any] = None) -> html.Div:
     max_reading_speed = DEFAULT_READING_SPEED * 3
     max_reading_minutes_daily = 24 * 60
+    reading_minutes_daily = 60
+    distribution = reading_distribution(data, aggregates)
+    aggregates = {'reading_distribution': distribution}
     return html.Div([
         html.H3(children='Reading speed (words / minute)', className='center-text'),
         dcc.Slider(
@@ -145,36 +271,33 @@ def reading_time_plot(data: List[Dict]) -> html.Div:
         dcc.Slider(
             id='reading-minutes-daily',
             marks={i: str(i) for i in range(120, max_reading_minutes_daily, 240)},
-            min=10, max=max_reading_minutes_daily, step=10, value=60,
+            min=10, max=max_reading_minutes_daily, step=10, value=reading_minutes_daily,
         ),
-        html.Div(id='reading-time-needed', children=''),
-        # figure will be updated by update_reading_time_components()
-        dcc.Graph(id='reading-time-chart', figure=go.Figure()),
+        html.Div(id='reading-time-needed', children=get_reading_time_needed(
+            None, DEFAULT_READING_SPEED, reading_minutes_daily, aggregates=aggregates)),
+        # updated in the browser by READING_TIME_CLIENTSIDE when a slider moves
+        dcc.Graph(id='reading-time-chart', figure=get_reading_time_chart(None, DEFAULT_READING_SPEED, aggregates)),
+        dcc.Store(id='reading-time-distribution', data=reading_distribution_store(distribution)),
     ])
 
 
 # -------------------- Domain -------------------- #
-def domain_counts_plot(data: List[Dict], limit: int = 20) -> dcc.Graph:
-    top_pairs = list(get_domain_counts(data).items())  # both unread + archived
+@timed()
+def domain_counts_plot(data: Dataset, limit: int = 20, aggregates: Dict[str, Any] = None) -> dcc.Graph:
+    domain_counts = with_aggregates(data, aggregates, 'domain_counts')['domain_counts']
+    top_pairs = list(domain_counts['all'].items())  # both unread + archived
     top_pairs.sort(key=lambda p: -p[1])  # sort desc by count
     top_pairs = top_pairs[:limit]  # display top items only
     top_pairs.reverse()  # because px.bar display the items in a reversed order
     top_domains = [p[0] for p in top_pairs]
-    unread_domain_cnts = get_domain_counts(data, filters=[['status', '=', 0]])
-    archived_domain_cnts = get_domain_counts(data, filters=[['status', '=', 1]])
     fig = go.Figure()
-    fig.add_trace(go.Bar(
-        x=[unread_domain_cnts.get(d, 0) for d in top_domains],
-        y=top_domains,
-        name='Unread articles',
-        orientation='h',
-    ))
-    fig.add_trace(go.Bar(
-        x=[archived_domain_cnts.get(d, 0) for d in top_domains],
-        y=top_domains,
-        name='Archived articles',
-        orientation='h',
-    ))
+    for status in STATUSES:
+        fig.add_trace(go.Bar(
+            x=[domain_counts[status].get(d, 0) for d in top_domains],
+            y=top_domains,
+            name=STATUS_NAMES[status],
+            orientation='h',
+        ))
     fig.update_layout(
         title_text='Top Domains',
         barmode='stack',
@@ -183,8 +306,9 @@ def domain_counts_plot(data: List[Dict], limit: int = 20) -> dcc.Graph:
     return dcc.Graph(figure=fig)
 
 
-def language_counts_plot(data: List[Dict]) -> dcc.Graph:
-    pairs = list(get_language_counts(data).items())
+@timed()
+def language_counts_plot(data: Dataset, aggregates: Dict[str, Any] = None) -> dcc.Graph:
+    pairs = list(with_aggregates(data, aggregates, 'language_counts')['language_counts'].items())
     fig = go.Figure(
         data=[
             go.Pie(
@@ -197,8 +321,9 @@ def language_counts_plot(data: List[Dict]) -> dcc.Graph:
     return dcc.Graph(figure=fig)
 
 
-def favorite_count_plot(data: List[Dict]) -> html.Div:
-    res = get_favorite_count(data)
+@timed()
+def favorite_count_plot(data: Dataset, aggregates: Dict[str, Any] = None) -> html.Div:
+    res = with_aggregates(data, aggregates, 'favorite_count')['favorite_count']
     return html.Div(
         [
             html.H2(children='Favorite', className='center-text'),
@@ -211,6 +336,30 @@ def favorite_count_plot(data: List[Dict]) -> html.Div:
     )
 
 
+@timed()
+def composition_plot(data: Dataset, aggregates: Dict[str, Any] = None) -> dcc.Graph:
+    res = with_aggregates(data, aggregates, 'composition')['composition']
+    total = res['total']
+    keys = list(COMPOSITION_LABELS)[::-1]  # horizontal bars are drawn from the bottom
+    fig = go.Figure(go.Bar(
+        x=[res[k] for k in keys],
+        y=[COMPOSITION_LABELS[k] for k in keys],
+        text=[f'{100.0 * res[k] / total:.1f} %' if total > 0 else '' for k in keys],
+        textposition='auto',
+        orientation='h',
+    ))
+    fig.update_layout(
+        title_text=f'Library Composition ({total} items)',
+        xaxis_title_text='Number of items',
+    )
+    return dcc.Graph(figure=fig)
+
+
+def records_limit(slider_value: int) -> Optional[int]:
+    # the last step of the records slider means the whole library
+    return None if slider_value > MAX_NUMBER_OF_RECORDS else slider_value
+
+
 def input_section() -> html.Div:
     return html.Div([
         html.Div([
@@ -228,8 +377,9 @@ def input_section() -> html.Div:
                 html.Label("Number of records", style=INPUT_SECTION_STYLE),
                 dcc.Slider(
                     id='input_pocket_number_of_records',
-                    marks={i: str(i) for i in range(0, MAX_NUMBER_OF_RECORDS+1, 250)},
-                    min=1, max=MAX_NUMBER_OF_RECORDS, step=250, value=250,
+                    marks={i: str(i) if i <= MAX_NUMBER_OF_RECORDS else 'All'
+                           for i in range(0, ALL_RECORDS_SLIDER_VALUE+1, 250)},
+                    min=1, max=ALL_RECORDS_SLIDER_VALUE, step=250, value=250,
                 ),
                 width0_percent=20,
             ),
@@ -244,79 +394,205 @@ def input_section() -> html.Div:
     ])
 
 
+# section div id -> builder(data, aggregates), in the order of the layout
+SECTIONS = {
+    'word_cloud_div': lambda data, aggregates: word_cloud_plot(data, aggregates=aggregates),
+    'articles_over_time_div': lambda data, aggregates: articles_over_time_section(data, aggregates=aggregates),
+    'word_counts_div': lambda data, aggregates: word_counts_plot(data, aggregates=aggregates),
+    'reading_time_div': lambda data, aggregates: reading_time_plot(data, aggregates=aggregates),
+    'domain_counts_div': lambda data, aggregates: domain_counts_plot(data, aggregates=aggregates),
+    'language_counts_div': lambda data, aggregates: language_counts_plot(data, aggregates=aggregates),
+    'favorite_counts_div': lambda data, aggregates: favorite_count_plot(data, aggregates=aggregates),
+    'composition_div': lambda data, aggregates: composition_plot(data, aggregates=aggregates),
+}
+# below the fold: built when they scroll into view, see assets/lazy_sections.js
+LAZY_SECTIONS = ('domain_counts_div', 'language_counts_div', 'favorite_counts_div', 'composition_div')
+
+
+def streaming_section(name: str, aggregates: Dict[str, Any]) -> Any:
+    # partial section from the pages fetched so far, the interactive ones wait for the full library
+    if name == 'articles_over_time_div':
+        return articles_over_time_plot(None, aggregates=aggregates)
+    if name == 'reading_time_div':
+        return html.Div(children='Loading...', className='center-text')
+    return SECTIONS[name](None, aggregates)
+
+
+@timed()
+@profiled
+def build_section(name: str, access_token: str, limit: Optional[int]) -> Any:
+    # like streaming_section(), from the materialized aggregates only: the table is not built for an unchanged library
+    return SECTIONS[name](None, get_aggregates(access_token, limit))
+
+
+def render_section(name: str, dataset: Optional[Dict[str, Any]]) -> Any:
+    if dataset is None:
+        raise PreventUpdate
+    token, limit = dataset['token'], dataset['limit']
+    if dataset['loading']:
+        load = get_streaming_load(token, limit)
+        if load is None:
+            raise PreventUpdate
+        return streaming_section(name, load.snapshot())
+    return get_render_pool().result((name, token, limit, dataset['version']), build_section, name, token, limit)
+
+
+def prefetch_sections(dataset: Dict[str, Any]) -> None:
+    # start building the sections above the fold while their callbacks are on their way
+    pool = get_render_pool()
+    token, limit = dataset['token'], dataset['limit']
+    for name in SECTIONS:
+        if name not in LAZY_SECTIONS:
+            pool.submit((name, token, limit, dataset['version']), build_section, name, token, limit)
+
+
+def section_div(name: str) -> html.Div:
+    if name not in LAZY_SECTIONS:
+        return html.Div(id=name, children=[])
+    # the placeholder height keeps the sections below the fold until they are rendered
+    return html.Div(className='lazy-section', style={'min-height': '400px'}, children=[
+        # clicked by assets/lazy_sections.js the first time the section is visible
+        html.Button(id=f'{name}_trigger', className='lazy-section-trigger', n_clicks=0, style={'display': 'none'}),
+        html.Div(id=name, children=[]),
+    ])
+
+
 def create_app(data: List[Dict] = None, server=None) -> dash.Dash:
     app = dash.Dash() if (server is None) else dash.Dash(server=server)
     app.index_string = DASH_APP_INDEX_STRING
     app.title = "Pocket Stats"
-    app.layout = html.Div(style={}, children=[
-        input_section(),
-        html.Div(id='word_cloud_div', children=[]),
-        html.Div(id='articles_over_time_div', children=[]),
-        plot_two_columns(
-            html.Div(id='word_counts_div', children=[]),
-            html.Div(id='reading_time_div', children=[]),
-        ),
-        html.Div(id='domain_counts_div', children=[]),
-        plot_two_columns(
-            html.Div(id='language_counts_div', children=[]),
-            html.Div(id='favorite_counts_div', children=[]),
-        ),
-    ])
+    report = install_response_size_report(app.server)
+    if INSTRUMENTATION or PROFILING:
+        install_metrics(app.server, report)
+
+    def layout() -> html.Div:
+        # served on every page load, so each tab gets its own session ID
+        return html.Div(style={}, children=[
+            input_section(),
+            dcc.Interval(id='stream_interval', interval=STREAM_REFRESH_INTERVAL_MS, disabled=True),
+            # {'token', 'limit', 'version', 'loading', 'count'} of the loaded library, read by the section callbacks
+            dcc.Store(id='dataset', data=None),
+            # tells the requests of this tab from the ones of the other tabs, see LATEST_REQUESTS
+            dcc.Store(id='session', data=uuid.uuid4().hex),
+            section_div('word_cloud_div'),
+            section_div('articles_over_time_div'),
+            plot_two_columns(
+                section_div('word_counts_div'),
+                section_div('reading_time_div'),
+            ),
+            section_div('domain_counts_div'),
+            plot_two_columns(
+                section_div('language_counts_div'),
+                section_div('favorite_counts_div'),
+            ),
+            section_div('composition_div'),
+        ])
+    app.layout = layout
 
     @app.callback(
         Output('number_of_records', 'children'),
-        Output('word_cloud_div', 'children'),
-        Output('articles_over_time_div', 'children'),
-        Output('word_counts_div', 'children'),
-        Output('reading_time_div', 'children'),
-        Output('domain_counts_div', 'children'),
-        Output('language_counts_div', 'children'),
-        Output('favorite_counts_div', 'children'),
+        Output('dataset', 'data'),
+        Output('stream_interval', 'disabled'),
         Input(component_id='input_reload_button', component_property='n_clicks'),
+        Input(component_id='stream_interval', component_property='n_intervals'),
         State(component_id='input_pocket_access_token', component_property='value'),
         State(component_id='input_pocket_number_of_records', component_property='value'),
+        State(component_id='dataset', component_property='data'),
     )
     def update_data(
         n_clicks: int,
+        n_intervals: int,
         input_pocket_access_token: str,
         input_pocket_number_of_records: str,  # need to convert it to int
-    ) -> Tuple[Any, Any, Any, Any, Any, Any, Any, Any]:
+        dataset: Optional[Dict[str, Any]],
+    ) -> Tuple[Any, Any, bool]:
         if n_clicks == 0:
-            return [None] * 8
-        data = get_data(
-            access_token=input_pocket_access_token,
-            limit=input_pocket_number_of_records,
-        )
-        return (
-            [f"Fetched {len(data)} records"],
-            word_cloud_plot(data),
-            articles_over_time_plot(data),
-            word_counts_plot(data),
-            reading_time_plot(data),
-            domain_counts_plot(data),
-            language_counts_plot(data),
-            favorite_count_plot(data),
+            return None, None, True
+        token, limit = input_pocket_access_token, records_limit(input_pocket_number_of_records)
+        triggered = [t['prop_id'] for t in dash.callback_context.triggered]
+        load = None
+        if 'input_reload_button.n_clicks' in triggered:
+            # nothing cached yet: fetch in the background and render partial charts while pages arrive
+            if (peek_data_entry(token, limit) is None) and (not has_snapshot(token, limit)):
+                load = start_streaming_load(token, limit)
+        else:
+            load = get_streaming_load(token, limit)
+            if (load is not None) and load.done:
+                discard_streaming_load(token, limit)
+                if load.error is not None:
+                    return [f"Failed to load the records: {load.error!r}"], dash.no_update, True
+                load = None
+        if load is not None:
+            count = load.snapshot()['count']
+            loading = {'token': token, 'limit': limit, 'version': None, 'loading': True, 'count': count}
+            return [f"Loading... {count} records so far"], dash.no_update if loading == dataset else loading, False
+        aggregates = get_aggregates(
+            access_token=token,
+            limit=limit,
         )
+        dataset = {
+            'token': token,
+            'limit': limit,
+            'version': get_fingerprint(token, limit),  # sections rendered for the same content are reused
+            'loading': False,
+            'count': aggregates['count'],
+        }
+        prefetch_sections(dataset)
+        return [f"Fetched {aggregates['count']} records"], dataset, True
 
-    @app.callback(
+    for name in SECTIONS:
+        inputs = [Input(component_id='dataset', component_property='data')]
+        if name in LAZY_SECTIONS:
+            inputs.append(Input(component_id=f'{name}_trigger', component_property='n_clicks'))
+
+        def update_section(dataset: Optional[Dict[str, Any]], n_clicks: int = 1, name: str = name) -> Any:
+            if not n_clicks:
+                raise PreventUpdate  # not scrolled into view yet
+            return render_section(name, dataset)
+
+        app.callback(Output(component_id=name, component_property='children'), *inputs)(update_section)
+
+    app.clientside_callback(
+        READING_TIME_CLIENTSIDE,
         Output(component_id='reading-time-chart', component_property='figure'),
-        Output(component_id='reading-time-needed', component_property='children'),
+        Output(component_id='reading-time-needed-title', component_property='children'),
+        Output(component_id='reading-time-needed-value', component_property='children'),
         Input(component_id='reading-speed', component_property='value'),
         Input(component_id='reading-minutes-daily', component_property='value'),
+        State(component_id='reading-time-distribution', component_property='data'),
+        prevent_initial_call=True,  # rendered on the server with the default slider values
+    )
+
+    @app.callback(
+        Output(component_id='articles-over-time-chart', component_property='figure'),
+        Input(component_id='articles-over-time-granularity', component_property='value'),
+        Input(component_id='articles-over-time-timezone', component_property='value'),
         State(component_id='input_pocket_access_token', component_property='value'),
         State(component_id='input_pocket_number_of_records', component_property='value'),
+        State(component_id='session', component_property='data'),
+        prevent_initial_call=True,  # the section is rendered with the daily series of the dashboard aggregates
     )
-    def update_reading_time_components(
-        reading_speed: int,
-        reading_minutes_daily: int,
+    def update_articles_over_time(
+        granularity: str,
+        timezone: str,
         input_pocket_access_token: str,
         input_pocket_number_of_records: str,  # need to convert it to int
-    ) -> Tuple[go.Figure, str]:
-        data = get_data(
-            access_token=input_pocket_access_token,
-            limit=input_pocket_number_of_records,
-        )
-        return (get_reading_time_chart(data, reading_speed),
-                get_reading_time_needed(data, reading_speed, reading_minutes_daily))
+        session: Optional[str],
+    ) -> go.Figure:
+        token, limit = input_pocket_access_token, records_limit(input_pocket_number_of_records)
+        # only the latest pick in a tab is answered, the ones it superseded are dropped
+        request = ('articles-over-time', session)
+        ticket = LATEST_REQUESTS.begin(request)
+        try:
+            key = make_key('articles_over_time', token, limit, get_fingerprint(token, limit), granularity, timezone)
+            if not LATEST_REQUESTS.is_latest(request, ticket):
+                raise PreventUpdate  # superseded while the library was loading, the chart is not built
+            figure = IN_FLIGHT.do(key, lambda: articles_over_time_chart(
+                get_time_series(get_table(token, limit), granularity=granularity, tz=timezone)))
+            if not LATEST_REQUESTS.is_latest(request, ticket):
+                raise PreventUpdate
+            return figure
+        finally:
+            LATEST_REQUESTS.end(request, ticket)
 
     return app
@@ -0,0 +1,148 @@
+import math
+import zlib
+import heapq
+import random
+import numpy as np
+from plotly.colors import DEFAULT_PLOTLY_COLORS
+from typing import List, Dict, Tuple, NamedTuple, Optional
+from cache import get_cache, make_key
+from constants import WORD_CLOUD_MAX_WORDS, WORD_CLOUD_FONT_SIZES, WORD_CLOUD_SIZE
+
+
+CHAR_WIDTH = 0.6  # average width of a character, relative to the font size
+CELL_SIZE = 4  # pixels per cell of the occupancy grid
+
+
+class PlacedWord(NamedTuple):
+    word: str
+    count: int
+    x: float  # center of the text, in pixels from the bottom left corner
+    y: float
+    font_size: int
+    color: str
+
+
+def top_words(word_counts: Dict[str, int], k: int = WORD_CLOUD_MAX_WORDS) -> List[Tuple[str, int]]:
+    # most frequent first, ties broken by the word so the order doesn't depend on the dict order
+    return heapq.nsmallest(k, word_counts.items(), key=lambda p: (-p[1], p[0]))
+
+
+def font_sizes(counts: List[int], sizes: Tuple[int, int] = WORD_CLOUD_FONT_SIZES) -> List[int]:
+    # square root scaling: the area of a word grows about linearly with its count
+    min_size, max_size = sizes
+    if len(counts) == 0:
+        return []
+    low, high = math.sqrt(min(counts)), math.sqrt(max(counts))
+    if high == low:
+        return [max_size] * len(counts)
+    return [int(round(min_size + (max_size - min_size) * (math.sqrt(c) - low) / (high - low))) for c in counts]
+
+
+def word_color(word: str) -> str:
+    return DEFAULT_PLOTLY_COLORS[zlib.crc32(word.encode('utf-8')) % len(DEFAULT_PLOTLY_COLORS)]
+
+
+class OccupancyGrid:
+    """Bitmap of the canvas cells covered by the words placed so far.
+
+    Free spots for a box are searched among all the cells at once with a summed
+    area table, in ``order``: rings around the center, each started at a seeded angle.
+    """
+
+    def __init__(self, width: int, height: int, seed: int = 0, cell_size: int = CELL_SIZE):
+        self.cell_size = cell_size
+        self.shape = (math.ceil(height / cell_size), math.ceil(width / cell_size))
+        self.cells = np.zeros(self.shape, dtype=np.int32)
+        self._sums = None
+        self._candidates = {}
+        self._next = {}
+        n_rows, n_cols = self.shape
+        rows, cols = np.divmod(np.arange(n_rows * n_cols), n_cols)
+        dy, dx = rows + 0.5 - n_rows / 2, (cols + 0.5 - n_cols / 2) * n_rows / n_cols  # elliptic rings
+        start = random.Random(seed).uniform(-math.pi, math.pi)
+        angle = (np.arctan2(dy, dx) - start) % (2 * math.pi)
+        self.order = np.lexsort((angle, np.round(np.hypot(dx, dy))))
+        self.rows, self.cols = rows[self.order], cols[self.order]
+
+    def summed_area(self) -> np.ndarray:
+        if self._sums is None:
+            self._sums = np.zeros((self.shape[0] + 1, self.shape[1] + 1), dtype=np.int32)
+            self._sums[1:, 1:] = self.cells.cumsum(axis=0).cumsum(axis=1)
+        return self._sums
+
+    def candidates(self, box_rows: int, box_cols: int) -> Tuple[np.ndarray, np.ndarray]:
+        # top left cells of the boxes centered on the cells of ``order`` that are inside the canvas
+        key = (box_rows, box_cols)
+        if key not in self._candidates:
+            n_rows, n_cols = self.shape
+            r0, c0 = self.rows - box_rows // 2, self.cols - box_cols // 2
+            inside = (r0 >= 0) & (c0 >= 0) & (r0 + box_rows <= n_rows) & (c0 + box_cols <= n_cols)
+            self._candidates[key] = (r0[inside], c0[inside])
+        return self._candidates[key]
+
+    def find(self, box_rows: int, box_cols: int) -> Optional[Tuple[int, int]]:
+        """Top left cell of the first free ``box_rows`` x ``box_cols`` box, ``None`` when it doesn't fit."""
+        rows, cols = self.candidates(box_rows, box_cols)
+        s = self.summed_area()
+        # cells are never freed, so the candidates before the last spot found for this box size stay taken
+        start = self._next.get((box_rows, box_cols), 0)
+        chunk = 1024
+        while start < len(rows):
+            r0, c0 = rows[start:start + chunk], cols[start:start + chunk]
+            r1, c1 = r0 + box_rows, c0 + box_cols
+            free = np.flatnonzero(s[r1, c1] - s[r0, c1] - s[r1, c0] + s[r0, c0] == 0)
+            if len(free) > 0:
+                self._next[(box_rows, box_cols)] = start + int(free[0])
+                return int(r0[free[0]]), int(c0[free[0]])
+            start += chunk
+            chunk *= 2
+        self._next[(box_rows, box_cols)] = len(rows)
+        return None
+
+    def occupy(self, row: int, col: int, box_rows: int, box_cols: int) -> None:
+        self.cells[row:row + box_rows, col:col + box_cols] = 1
+        self._sums = None
+
+
+def layout_words(word_counts: Dict[str, int], k: int = WORD_CLOUD_MAX_WORDS,
+                 size: Tuple[int, int] = WORD_CLOUD_SIZE, font_size_range: Tuple[int, int] = WORD_CLOUD_FONT_SIZES,
+                 seed: int = 0) -> List[PlacedWord]:
+    """Place the ``k`` most frequent words on a ``size`` canvas without overlaps.
+
+    Words are placed from the most frequent one, each at the free spot closest to
+    the center. Words that don't fit are left out. The result only depends on
+    ``word_counts``, the parameters and ``seed``.
+    """
+    width, height = size
+    grid = OccupancyGrid(width, height, seed)
+    c = grid.cell_size
+    words = top_words(word_counts, k)
+    ans = []
+    failed = []  # (rows, cols) of boxes that didn't fit, no box at least as large in both directions will
+    for (word, count), font_size in zip(words, font_sizes([cnt for _, cnt in words], font_size_range)):
+        box_rows = math.ceil(font_size / c)
+        box_cols = math.ceil(CHAR_WIDTH * font_size * len(word) / c)
+        if any(box_rows >= r and box_cols >= cols for r, cols in failed):
+            continue
+        spot = grid.find(box_rows, box_cols)
+        if spot is None:
+            failed.append((box_rows, box_cols))
+            continue
+        row, col = spot
+        grid.occupy(row, col, box_rows, box_cols)
+        ans.append(PlacedWord(word, count, (col + box_cols / 2) * c, height - (row + box_rows / 2) * c,
+                              font_size, word_color(word)))
+    return ans
+
+
+def get_word_cloud_layout(word_counts: Dict[str, int], k: int = WORD_CLOUD_MAX_WORDS,
+                          size: Tuple[int, int] = WORD_CLOUD_SIZE, seed: int = 0) -> List[PlacedWord]:
+    # the layout is deterministic, so it is cached by the top words it is made of
+    words = top_words(word_counts, k)
+    key = make_key('word_cloud', words, size, WORD_CLOUD_FONT_SIZES, seed)
+    cache = get_cache()
+    ans = cache.get(key)
+    if ans is None:
+        ans = layout_words(dict(words), k=k, size=size, seed=seed)
+        cache.set(key, ans)
+    return ans
@@ -1,5 +1,5 @@
-# download nltk data
-python3 -c "import nltk ; nltk.download('stopwords')"
+# download nltk data, unless a previous boot of the instance already did
+python3 -c "import nltk ; nltk.data.find('corpora/stopwords')" 2>/dev/null || python3 -c "import nltk ; nltk.download('stopwords')"
 
-# start the webserver
-gunicorn --workers 4 'pocket_stats.app:server' -b :$PORT
+# start the webserver, the app is imported once and the workers are forked from it
+gunicorn --workers 4 --preload 'pocket_stats.app:server' -b :$PORT
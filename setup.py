@@ -34,6 +34,7 @@ setup(
         'nltk',
         'tldextract',
         'pandas',
+        'joblib',
         'gunicorn',
         'flask-wtf',
     ],
@@ -0,0 +1,3 @@
+# pandas is only imported on first use by the code under test: import it before freezegun
+# replaces datetime, or its C extensions fail to load when a test module is run on its own
+import pandas  # noqa: F401
@@ -0,0 +1,190 @@
+import os
+import pytest
+from typing import List, Dict
+from unittest.mock import patch
+from freezegun import freeze_time
+
+from pocket_stats.data import load_cache, build_table, get_domain_counts, get_language_counts, get_favorite_count
+from pocket_stats.data import get_added_time_series, get_archived_time_series, get_average_readed_word
+from pocket_stats.data import count_words_in_title, get_time_series, get_words_read_rolling, get_word_counts
+from pocket_stats.aggregates import compute_aggregates, rebin_reading_time, DASHBOARD_AGGREGATES
+from pocket_stats.data import get_composition
+from pocket_stats.aggregates import materialize, serve_aggregates, get_aggregates
+from pocket_stats.cache import MemoryCache, make_key
+from pocket_stats.incremental import view_delta
+from pocket_stats.fingerprint import content_fingerprint
+from pocket_stats.storage import Sync, order_key
+from pocket_stats import data as data_module
+from tests.test_streaming import assert_same_aggregates
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+@freeze_time("2020-07-01")
+def test_compute_aggregates_matches_get_functions(data: List[Dict]):
+    ans = compute_aggregates(build_table(data), DASHBOARD_AGGREGATES)
+    assert ans['count'] == 7
+    assert ans['title_word_counts'] == count_words_in_title(data)
+    assert ans['time_series'].equals(get_time_series(data))
+    added = ans['time_series']['All articles']
+    assert added[added > 0].to_frame().equals(get_added_time_series(data))
+    archived = ans['time_series']['Archived articles']
+    assert archived[archived > 0].to_frame().equals(get_archived_time_series(data))
+    assert ans['average_readed_words'] == {n: get_average_readed_word(data, n) for n in [360, 90, 30, 7, 2]}
+    assert ans['words_read_rolling'].equals(get_words_read_rolling(data, window_days=7))
+    assert ans['domain_counts']['all'] == get_domain_counts(data)
+    assert ans['domain_counts'][0] == get_domain_counts(data, filters=[['status', '=', 0]])
+    assert ans['domain_counts'][1] == get_domain_counts(data, filters=[['status', '=', 1]])
+    assert ans['language_counts'] == get_language_counts(data)
+    assert ans['favorite_count'] == get_favorite_count(data)
+    assert ans['composition'] == get_composition(data)
+
+
+def test_word_count_histogram(data: List[Dict]):
+    histogram = compute_aggregates(data, [('word_count_histogram', {'bin_size': 1000})])['word_count_histogram']
+    assert histogram['edges'].tolist() == [0, 1000, 2000, 3000, 4000, 5000, 6000]
+    assert histogram[0].tolist() == [1, 1, 1, 1, 1, 0]
+    assert histogram[1].tolist() == [1, 0, 0, 0, 0, 1]
+    assert histogram['all'].tolist() == [2, 1, 1, 1, 1, 1]
+
+
+def test_compute_aggregates_invalid():
+    with pytest.raises(NotImplementedError):
+        compute_aggregates([], [('median_word_count', {})])
+
+
+def test_rebin_reading_time(data: List[Dict]):
+    distribution = compute_aggregates(data, [('reading_distribution', {'bin_words': 25})])['reading_distribution']
+    assert distribution['total_words'] == {0: sum(get_word_counts(data, filters=[['status', '=', 0]])),
+                                           1: sum(get_word_counts(data, filters=[['status', '=', 1]]))}
+    for reading_speed, bin_minutes in [(200, 5), (100, 10), (250, 2)]:
+        # exact when a minutes bin is a whole number of word count bins
+        rebinned = rebin_reading_time(distribution, reading_speed, bin_minutes)
+        spec = ('reading_time_histogram', {'reading_speed': reading_speed, 'bin_minutes': bin_minutes})
+        expected = compute_aggregates(data, [spec])['reading_time_histogram']
+        for k in [0, 1, 'edges']:
+            assert rebinned[k].tolist() == expected[k].tolist(), (reading_speed, k)
+
+
+def test_materialize_recomputes_changed_columns(data: List[Dict]):
+    snapshot = materialize(build_table(data), DASHBOARD_AGGREGATES, 'v1')
+    assert set(serve_aggregates(snapshot, DASHBOARD_AGGREGATES)) == set(name for name, _ in DASHBOARD_AGGREGATES)
+    changed = [dict(r) for r in data]
+    unread = next(r for r in changed if r['status'] == '0')
+    unread['status'], unread['time_updated'] = '1', str(int(unread['time_updated']) + 1)
+    with patch('pocket_stats.aggregates.count_words_in_title') as count_words:
+        updated = materialize(build_table(changed), DASHBOARD_AGGREGATES, 'v2', previous=snapshot)
+    assert count_words.call_count == 0  # titles and languages are unchanged
+    ans, expected = serve_aggregates(updated, DASHBOARD_AGGREGATES), compute_aggregates(changed)
+    assert ans['title_word_counts'] is serve_aggregates(snapshot, DASHBOARD_AGGREGATES)['title_word_counts']
+    assert ans['domain_counts'] == expected['domain_counts']
+    assert ans['composition'] == expected['composition'] != compute_aggregates(data)['composition']
+    assert ans['average_readed_words'] == expected['average_readed_words']
+    changed[0]['resolved_title'] = changed[0]['given_title'] = 'A brand new title'
+    updated = materialize(build_table(changed), DASHBOARD_AGGREGATES, 'v3', previous=updated)
+    assert serve_aggregates(updated, DASHBOARD_AGGREGATES)['title_word_counts'] == count_words_in_title(changed)
+    with pytest.raises(NotImplementedError):
+        materialize(build_table(data), [('median_word_count', {})], 'v1')
+
+
+def test_get_aggregates_from_snapshot(data: List[Dict]):
+    table = build_table(data)
+    entry = {'items': data, 'complete': True, 'version': 1.0, 'last_sync': None, 'changes': None}
+    with patch('pocket_stats.aggregates.get_cache', return_value=MemoryCache()), \
+            patch('pocket_stats.aggregates.get_data_entry', return_value=entry), \
+            patch('pocket_stats.aggregates.get_fingerprint', return_value='v1') as get_fingerprint, \
+            patch('pocket_stats.aggregates.get_table', return_value=table) as get_table:
+        assert get_aggregates('token')['count'] == 7
+        # a refetch of the same content is served from the snapshot, without building the table
+        assert get_aggregates('token')['count'] == 7
+        assert get_table.call_count == 1
+        language_counts = get_aggregates('token', specs=[('language_counts', {})])['language_counts']
+        assert language_counts == get_language_counts(data)
+        assert get_table.call_count == 1
+        # a spec the snapshot does not have yet is added to it
+        assert get_aggregates('token', specs=[('added_time_series', {})])['added_time_series'] is not None
+        assert get_table.call_count == 2
+        get_fingerprint.return_value = 'v2'
+        assert get_aggregates('token')['count'] == 7
+        assert get_table.call_count == 3
+
+
+def assert_non_negative(incremental) -> None:
+    assert incremental.count >= 0 and min(incremental.total_words.values()) >= 0
+    counters = [incremental.composition, incremental.title_words, incremental.languages, incremental.archived_reads]
+    counters += list(incremental.domains.values()) + list(incremental.word_count_bins.values())
+    counters += list(incremental.reading_bins.values()) + list(incremental.event_days.values())
+    assert all(cnt > 0 for counter in counters for cnt in counter.values())
+
+
+@freeze_time("2020-07-01")
+@pytest.mark.parametrize('limit', [None, 5])
+def test_get_aggregates_follows_delta_syncs(data: List[Dict], limit: int):
+    entries = []
+    cache = MemoryCache()
+
+    def sync(items: List[Dict], sync: Sync) -> None:
+        with patch.object(data_module, 'get_cache', return_value=MemoryCache()):
+            entries.append(data_module.put_data_entry('token', sorted(items, key=order_key), sync=sync))
+
+    def view() -> List[Dict]:
+        return entries[-1]['items'][:limit]
+
+    def check() -> None:
+        assert_same_aggregates(get_aggregates('token', limit), compute_aggregates(view()))
+        assert_non_negative(cache.get(make_key('aggregates', 'token', limit))['incremental'])
+
+    sync(data, Sync(100))
+    unread = next(r for r in data if r['status'] == '0')
+    archived = dict(unread, status='1', time_read='1593000000', time_updated='1593000000')
+    deleted = {'item_id': data[1]['item_id'], 'status': '2'}
+    added = dict(data[0], item_id='1', time_added=str(int(data[0]['time_added']) + 1), given_title='Brand new words')
+    library = [added] + [archived if r is unread else r for r in data if r['item_id'] != deleted['item_id']]
+    newer = [dict(data[2], item_id=str(i), time_added=str(int(data[0]['time_added']) + i)) for i in (2, 3)]
+    removed = [{'item_id': r['item_id'], 'status': '2'} for r in library[:3]]
+    with patch('pocket_stats.aggregates.get_cache', return_value=cache), \
+            patch('pocket_stats.aggregates.get_data_entry', side_effect=lambda *args: entries[-1]), \
+            patch('pocket_stats.aggregates.get_fingerprint', side_effect=lambda *args: content_fingerprint(view())), \
+            patch('pocket_stats.aggregates.get_table', side_effect=lambda *args: build_table(view())) as get_table:
+        check()
+        assert get_table.call_count == 1
+        # only the changed items are applied to the aggregates, the table is not built again
+        sync(library, Sync(200, since=100, changed=[archived, deleted, added]))
+        check()
+        # new items push the oldest ones out of a view of the newest items, deleted ones pull the next ones in
+        sync(newer + library, Sync(300, since=200, changed=newer))
+        check()
+        sync(newer + library[3:], Sync(350, since=300, changed=removed))
+        check()
+        assert get_table.call_count == 1
+        # a delta sync of another snapshot of the library: materialized again
+        sync(library[4:], Sync(400, since=1000, changed=[{'item_id': library[3]['item_id'], 'status': '2'}]))
+        check()
+        assert get_table.call_count == 2
+
+
+def test_view_delta_only_reads_the_changes():
+    class Items(list):
+        # counts the records read
+        reads = 0
+
+        def __getitem__(self, i):
+            Items.reads += 1
+            return list.__getitem__(self, i)
+
+    library = [{'item_id': str(i), 'time_added': str(2000000 - i)} for i in range(100000)]
+    old = Items(library)
+    new = Items([{'item_id': 'new', 'time_added': '3000000'}] + library[:500] + library[501:])
+    previous = {r['item_id']: r for r in library[:1000]}
+    changed = {'new': 3000000, '500': None, '10': 1999990}
+    retracted, applied = view_delta(previous, (old, 1000), (new, 1000), changed)
+    assert sorted(r['item_id'] for r in retracted) == ['10', '500']
+    assert sorted(r['item_id'] for r in applied) == ['10', 'new']
+    assert set(previous) == {r['item_id'] for r in new[:1000]}
+    assert Items.reads < 200
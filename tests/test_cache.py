@@ -0,0 +1,220 @@
+import time
+import pickle
+import socketserver
+import threading
+import pytest
+from unittest.mock import patch
+
+import numpy as np
+from pocket_stats.cache import MemoryCache, FileCache, MemcachedCache, make_key, create_cache, estimate_size
+from pocket_stats.records import CompactRecord
+import pocket_stats.data as data_module
+
+
+class FakeMemcachedHandler(socketserver.StreamRequestHandler):
+    # just enough of the memcached text protocol for MemcachedCache, with its expiry and item size limit
+    def handle(self):
+        server = self.server
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode().split()
+            if parts[0] == 'get':
+                for key in parts[1:]:
+                    entry = server.store.get(key)
+                    if entry is not None and (not entry[0] or entry[0] > time.time()):
+                        _, flags, value = entry
+                        self.wfile.write(f'VALUE {key} {flags} {len(value)}\r\n'.encode() + value + b'\r\n')
+                self.wfile.write(b'END\r\n')
+            elif parts[0] == 'set':
+                key, flags, exptime, n_bytes = parts[1], int(parts[2]), int(parts[3]), int(parts[4])
+                value = self.rfile.read(n_bytes + 2)[:-2]
+                server.exptimes.append(exptime)
+                if len(key) + n_bytes > server.max_item_bytes:
+                    self.wfile.write(b'SERVER_ERROR object too large for cache\r\n')
+                    continue
+                server.store[key] = (time.time() + exptime if exptime else 0, flags, value)
+                self.wfile.write(b'STORED\r\n')
+            elif parts[0] == 'delete':
+                self.wfile.write(b'DELETED\r\n' if server.store.pop(parts[1], None) is not None else b'NOT_FOUND\r\n')
+
+
+@pytest.fixture(scope='module')
+def memcached_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeMemcachedHandler)
+    server.daemon_threads = True
+    server.store = {}
+    server.exptimes = []
+    server.max_item_bytes = 1024 * 1024
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def memcached_address(server) -> str:
+    return '%s:%d' % server.server_address
+
+
+@pytest.fixture(params=['memory', 'file', 'memcached'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache()
+    elif request.param == 'file':
+        return FileCache(directory=str(tmp_path))
+    return MemcachedCache(server=memcached_address(request.getfixturevalue('memcached_server')))
+
+
+def test_cache_get_set_delete(cache):
+    key = make_key('data', 'token')
+    assert cache.get(key) is None
+    cache.set(key, {'items': [1, 2, 3]})
+    assert cache.get(key) == {'items': [1, 2, 3]}
+    cache.delete(key)
+    assert cache.get(key) is None
+    assert cache.stats.as_dict() == {'hits': 1, 'misses': 2, 'sets': 1, 'rejected': 0, 'evictions': 0,
+                                     'hit_ratio': 1 / 3}
+
+
+def test_cache_ttl(cache):
+    # memcached expiration times are whole seconds
+    ttl = 1 if isinstance(cache, MemcachedCache) else 0.01
+    cache.set('a', 1, ttl=ttl)
+    cache.set('b', 2)
+    time.sleep(ttl + 0.05)
+    assert cache.get('a') is None
+    assert cache.get('b') == 2
+
+
+def test_memory_cache_eviction():
+    cache = MemoryCache(max_bytes=3200)
+    for key in 'abc':
+        cache.set(key, b'x' * 1000)
+    cache.get('a')  # most recently used now
+    cache.set('d', b'x' * 1000)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.n_bytes <= 3200
+    assert cache.stats.evictions >= 1
+
+
+def test_file_cache_eviction_and_sharing(tmp_path):
+    cache = FileCache(directory=str(tmp_path), max_bytes=2500)
+    for i, key in enumerate('abc'):
+        cache.set(key, b'x' * 1000)
+        time.sleep(0.01)
+    assert cache.get('a') is None
+    assert cache.n_bytes <= 2500
+    assert FileCache(directory=str(tmp_path)).get('c') == b'x' * 1000  # another process, same directory
+
+
+def test_file_cache_entry_evicted_while_read(tmp_path):
+    cache = FileCache(directory=str(tmp_path))
+    cache.set('a', 1)
+    with patch('pocket_stats.cache.os.utime', side_effect=FileNotFoundError):
+        assert cache.get('a') is None
+    assert cache.stats.misses == 1
+
+
+def test_estimate_size():
+    items = [{'item_id': str(i), 'given_title': 'a title'} for i in range(10000)]
+    table = data_module.build_table(items)
+    records = [CompactRecord(item) for item in items]
+    pickled_size = len(pickle.dumps(records))
+    # without pickling the values
+    with patch('pocket_stats.cache.pickle.dumps', side_effect=AssertionError):
+        cache = MemoryCache()
+        cache.set('table', table)
+        assert cache.n_bytes == table.nbytes > sum(col.nbytes for col in table.columns.values())
+        assert estimate_size(np.zeros(1000)) == 8000
+        # in memory, the records are larger than their pickles
+        assert estimate_size({'items': records}) > pickled_size
+        assert 900 < estimate_size(items) / estimate_size(items[:10]) < 1100
+
+
+def test_memcached_cache_expiration_times(memcached_server):
+    cache = MemcachedCache(server=memcached_address(memcached_server), default_ttl=0.2)
+    del memcached_server.exptimes[:]
+    cache.set('a', 1)  # not 0, which would never expire
+    cache.set('b', 1, ttl=60 * 24 * 3600)  # a unix time for memcached
+    cache.set('c', 1, ttl=0)
+    assert memcached_server.exptimes[0] == 1
+    assert memcached_server.exptimes[1] > time.time()
+    assert memcached_server.exptimes[2] == 0
+
+
+def test_memcached_cache_large_values(memcached_server):
+    address = memcached_address(memcached_server)
+    cache = MemcachedCache(server=address, max_item_bytes=64 * 1024)
+    value = {'items': [{'item_id': str(i), 'given_title': f'title {i}'} for i in range(20000)]}
+    cache.set('large', value)
+    assert cache.stats.sets == 1
+    assert max(len(entry[2]) for entry in memcached_server.store.values()) <= 64 * 1024
+    assert cache.get('large') == value
+    assert MemcachedCache(server=address).get('large') == value  # another worker
+    # a chunk that does not match the listing, then a chunk evicted by the server
+    chunk = next(k for k in memcached_server.store if k.startswith('large.'))
+    expire_at, flags, payload = memcached_server.store[chunk]
+    memcached_server.store[chunk] = (expire_at, flags, payload[::-1])
+    assert cache.get('large') is None
+    memcached_server.store.pop(chunk)
+    assert cache.get('large') is None
+    assert cache.stats.as_dict()['misses'] == 2
+
+
+def test_memcached_cache_rejected(memcached_server):
+    # a server started with a smaller item size limit than the client was told
+    memcached_server.max_item_bytes = 1000
+    try:
+        cache = MemcachedCache(server=memcached_address(memcached_server))
+        cache.set('too_large', b'x' * 10000)
+    finally:
+        memcached_server.max_item_bytes = 1024 * 1024
+    assert cache.get('too_large') is None
+    assert cache.stats.as_dict()['rejected'] == 1
+    assert cache.stats.sets == 0
+
+
+def test_cache_stats_threads():
+    stats = MemoryCache().stats
+
+    def count():
+        for _ in range(10000):
+            stats.count('hits')
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stats.hits == 80000
+
+
+def test_memcached_cache_unreachable():
+    cache = MemcachedCache(server='127.0.0.1:1', timeout=0.1)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+
+
+def test_create_cache():
+    assert isinstance(create_cache('memory'), MemoryCache)
+    with pytest.raises(NotImplementedError):
+        create_cache('redis')
+
+
+def test_get_data_serves_smaller_limits_from_cache():
+    items = [{'item_id': str(i)} for i in range(10)]
+    with patch.object(data_module, 'get_cache', return_value=MemoryCache()), \
+            patch.object(data_module, 'sync_data', side_effect=lambda limit, **kwargs: items[:limit]) as sync:
+        assert data_module.get_data('token', limit=5) == items[:5]
+        assert data_module.get_data('token', limit=3) == items[:3]
+        assert sync.call_count == 1
+        assert data_module.get_data('token', limit=8) == items[:8]
+        assert data_module.get_data('token', limit=5) == items[:5]
+        assert sync.call_count == 2
+        assert data_module.get_data('token', limit=None) == items
+        assert data_module.get_data('token', limit=20) == items
+        assert sync.call_count == 3
+        assert len(data_module.get_table('token', limit=4)) == 4
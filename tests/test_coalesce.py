@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+import pytest
+from typing import List, Dict
+from unittest.mock import patch
+
+from pocket_stats import data as data_module
+from pocket_stats.data import load_cache, build_table
+from pocket_stats.cache import MemoryCache
+from pocket_stats.coalesce import SingleFlight, LatestRequests
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def run_concurrently(fn, n: int = 4) -> list:
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_single_flight():
+    calls = []
+    flight = SingleFlight()
+
+    def slow(value):
+        calls.append(value)
+        time.sleep(0.1)
+        return [value]
+
+    results = run_concurrently(lambda: flight.do('key', slow, 1))
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert not flight.in_flight('key')
+    # finished calls are not kept
+    assert flight.do('key', slow, 2) == [2]
+    assert flight.do('other', slow, 3) == [3]
+    assert calls == [1, 2, 3]
+
+
+def test_single_flight_error():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.1)
+        raise ValueError('boom')
+
+    errors = []
+
+    def call():
+        try:
+            flight.do('key', failing)
+        except ValueError as e:
+            errors.append(e)
+    run_concurrently(call)
+    assert len(errors) == 4
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+
+def test_latest_requests():
+    latest = LatestRequests()
+    first = latest.begin('slider')
+    assert latest.is_latest('slider', first)
+    second = latest.begin('slider')
+    assert not latest.is_latest('slider', first)
+    assert latest.is_latest('slider', second)
+    assert latest.is_latest('other', latest.begin('other'))
+    # only the keys of the requests in flight are kept, and a ticket is never handed out twice
+    latest.end('slider', first)
+    assert latest.is_latest('slider', second)
+    latest.end('slider', second)
+    assert 'slider' not in latest._latest
+    third = latest.begin('slider')
+    assert not latest.is_latest('slider', first) and not latest.is_latest('slider', second)
+    assert latest.is_latest('slider', third)
+
+
+def test_get_table_builds_once_for_concurrent_misses(data: List[Dict]):
+    builds = []
+
+    def slow_build(items):
+        builds.append(len(items))
+        time.sleep(0.1)
+        return build_table(items)
+
+    with patch.object(data_module, 'get_cache', return_value=MemoryCache()), \
+            patch.object(data_module, 'build_table', side_effect=slow_build):
+        data_module.put_data_entry('token', data)
+        tables = run_concurrently(lambda: data_module.get_table('token', limit=5))
+        assert builds == [5]
+        assert all(table is tables[0] for table in tables)
+        assert data_module.get_table('token', limit=5) is tables[0]
+
+
+def test_cached_build_checks_the_cache_again():
+    # a caller that missed the cache before the leader filled it does not build again
+    cache = MemoryCache()
+    with patch.object(data_module, 'get_cache', return_value=cache), \
+            patch.object(cache, 'get', side_effect=[None, 'built by the leader']):
+        assert data_module._cached_build('key', lambda: 'built again') == 'built by the leader'
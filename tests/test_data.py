@@ -10,7 +10,8 @@ from pocket_stats.data import fetch_data, load_cache, is_valid_word, normalize_l
 from pocket_stats.data import should_pass_filters, count_words_in_title, get_word_counts, get_favorite_count
 from pocket_stats.data import get_reading_time, get_added_time_series, get_archived_time_series
 from pocket_stats.data import get_average_readed_word, get_domain_counts, get_language_counts
-from pocket_stats.data import get_unread_count
+from pocket_stats.data import get_unread_count, build_table, get_top_terms, get_composition, COMPOSITION_KEYS
+from pocket_stats.data import count_items
 
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -59,11 +60,13 @@ def test_load_cache(data: List[Dict]):
 @patch('pocket_stats.data.open')
 @patch('pocket.Pocket.retrieve')
 def test_fetch_data_ok(mocked_pocket_retrieve, mocked_open, mocked_json_dump):
-    mocked_pocket_retrieve.return_value = {'list': {1: 2, 2: 3}}
-    fetch_data(offset=10, limit=100, consumer_key='invalid', access_token='none')
+    mocked_pocket_retrieve.return_value = {'list': {'1': {'item_id': '1'}, '2': {'item_id': '2'}}}
+    assert fetch_data(offset=10, limit=100, consumer_key='invalid', access_token='none') == [
+        {'item_id': '1'}, {'item_id': '2'}]
 
 
-def test_fetch_data_failed():
+@patch('time.sleep')  # no backoff between the retries of the failing requests
+def test_fetch_data_failed(mocked_sleep):
     with pytest.raises(Exception):
         fetch_data(consumer_key='invalid', access_token='none')
 
@@ -95,16 +98,26 @@ def test_should_pass_filters(record: Dict):
     assert should_pass_filters([['favorite', '=', '0']], record) is True
     assert should_pass_filters([['status', '!=', 1]], record) is True
     assert should_pass_filters([['word_count', '=', 2207], ['status', '=', 1]], record) is False
-    with pytest.raises(NotImplementedError):
-        for invalid_op in ['and', 'or', 'not', 'is not', '>', '<', '==']:
+    assert should_pass_filters([['word_count', '>', 2000], ['word_count', '<=', 2207]], record) is True
+    assert should_pass_filters([['word_count', 'between', [0, 1000]]], record) is False
+    assert should_pass_filters([['status', 'in', [0, 1]], ['lang', 'not in', ['vi']]], record) is True
+    assert should_pass_filters([['resolved_url', 'contains', 'brendangregg']], record) is True
+    assert should_pass_filters([['missing_key', '>=', 0]], record) is False
+    for invalid_op in ['and', 'or', 'not', 'is not', '==']:
+        with pytest.raises(NotImplementedError):
             should_pass_filters([["favorite", invalid_op, 0]], record)
 
 
 def test_count_words_in_title(data: List[Dict]):
     assert count_words_in_title(data) == Counter({
-        'strace': 1, 'wow': 1, 'much': 1, 'syscall': 1, 'martin': 1, 'heinz': 1, '-': 1, 'personal': 1, 'website': 1,
-        '&': 1, 'blog': 1, 'call': 1, 'programmer,': 1, 'career': 1, 'advice': 1, '|': 1, 'kalzumeus': 1, 'softw': 1
+        'strace': 1, 'wow': 1, 'much': 1, 'syscall': 1, 'martin': 1, 'heinz': 1, 'personal': 1, 'website': 1,
+        'blog': 1, 'call': 1, 'programmer': 1, 'career': 1, 'advice': 1, 'kalzumeus': 1, 'softw': 1
     })
+    assert count_words_in_title(data, filters=[['status', '=', 1]]) == Counter({
+        'martin': 1, 'heinz': 1, 'personal': 1, 'website': 1, 'blog': 1,
+        'call': 1, 'programmer': 1, 'career': 1, 'advice': 1, 'kalzumeus': 1, 'softw': 1
+    })
+    assert get_top_terms(data, n=2, filters=[['domain', '=', 'martinheinz.dev']]) == [('martin', 1), ('heinz', 1)]
 
 
 def test_get_word_counts(data: List[Dict]):
@@ -150,3 +163,28 @@ def test_get_favorite_count(data: List[Dict]):
 
 def test_get_unread_count(data: List[Dict]):
     assert get_unread_count(data) == 5
+
+
+def test_get_composition(data: List[Dict]):
+    assert get_composition(data) == {
+        'total': 7, 'unread': 5, 'archived': 2, 'deleted': 0, 'favorited': 2, 'articles': 6, 'videos': 0, 'images': 4,
+    }
+    assert get_composition(data, filters=[['favorite', '=', 1]]) == {
+        'total': 2, 'unread': 0, 'archived': 2, 'deleted': 0, 'favorited': 2, 'articles': 1, 'videos': 0, 'images': 0,
+    }
+    assert get_composition([]) == {k: 0 for k in COMPOSITION_KEYS}
+    # raw records can be filtered on fields that are not columns of the table
+    url_filters = [['resolved_url', 'contains', 'kalzumeus']]
+    composition = get_composition(data, filters=url_filters)
+    assert composition['total'] == count_items(data, 'total', url_filters) == 3
+    assert composition == {key: count_items(data, key, url_filters) for key in COMPOSITION_KEYS}
+
+
+def test_get_functions_accept_table(data: List[Dict]):
+    table = build_table(data)
+    assert get_word_counts(table, filters=[['status', '=', 0]]) == [2207, 4721, 3245, 805, 1849]
+    assert get_domain_counts(table) == get_domain_counts(data)
+    assert get_language_counts(table) == get_language_counts(data)
+    assert get_favorite_count(table) == get_favorite_count(data)
+    assert get_unread_count(table) == 5
+    assert get_archived_time_series(table).equals(get_archived_time_series(data))
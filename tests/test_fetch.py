@@ -0,0 +1,139 @@
+import json
+import threading
+import socketserver
+import pytest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest.mock import patch
+from pocket import Pocket, PocketException, PocketAutException
+
+from pocket_stats.data import fetch_data
+from pocket_stats.fetch import fetch_pages, retrieve_page, backoff_delay, is_retryable
+
+
+def make_items(n: int):
+    return [{'item_id': str(i), 'time_added': str(1600000000 - i)} for i in range(n)]
+
+
+class _Server(socketserver.ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is only in Python 3.7+
+    daemon_threads = True
+
+
+class FakePocketHandler(BaseHTTPRequestHandler):
+    # serves POST /v3/get like the Pocket retrieve API, failing the first requests when asked to
+    def do_POST(self):
+        server = self.server
+        params = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.requests.append(params)
+            failure = server.failures.pop(0) if server.failures else None
+        if failure is not None:
+            self.send_response(failure)
+            self.send_header('X-Error-Code', '199' if failure != 401 else '138')
+            self.send_header('X-Error', 'fake error')
+            if failure == 403:
+                for header in ['User-Limit', 'Key-Limit']:
+                    self.send_header(f'X-Limit-{header}', '10')
+                for header in ['User-Remaining', 'Key-Remaining']:
+                    self.send_header(f'X-Limit-{header}', '0')
+                for header in ['User-Reset', 'Key-Reset']:
+                    self.send_header(f'X-Limit-{header}', '0.01')
+            self.end_headers()
+            return
+        offset, count = params.get('offset', 0), min(params.get('count', 30), server.max_count)
+        items = server.items[offset:offset + count]
+        body = json.dumps({'status': 1, 'list': {item['item_id']: item for item in items} or []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def pocket_server():
+    server = _Server(('127.0.0.1', 0), FakePocketHandler)
+    server.lock = threading.Lock()
+    server.items = make_items(1234)
+    server.requests = []
+    server.failures = []
+    server.max_count = 10 ** 9
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    with patch.object(Pocket, 'api_url', 'http://%s:%d/v3' % server.server_address):
+        yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_pages_concurrently(pocket_server):
+    api = Pocket('key', 'token')
+    pages = list(fetch_pages(api, count=100, concurrency=4))
+    assert [item for page in pages for item in page] == pocket_server.items
+    assert [len(page) for page in pages] == [100] * 12 + [34]
+    # windows after the end of the library are requested at most once per worker
+    assert len(pocket_server.requests) <= 13 + 4
+
+
+def test_fetch_pages_capped_count(pocket_server):
+    # Pocket may return fewer items than the count asked for before the end of the library
+    pocket_server.max_count = 300
+    api = Pocket('key', 'token')
+    pages = list(fetch_pages(api, count=500, concurrency=3))
+    assert [item for page in pages for item in page] == pocket_server.items
+    assert [len(page) for page in pages] == [300] * 4 + [34]
+    assert {r['offset'] for r in pocket_server.requests} >= {0, 300, 600, 900, 1200, 1234}
+
+
+def test_fetch_pages_limit_and_offset(pocket_server):
+    api = Pocket('key', 'token')
+    pages = list(fetch_pages(api, offset=50, limit=120, count=100, concurrency=3))
+    assert [item for page in pages for item in page] == pocket_server.items[50:170]
+    assert sorted(r['count'] for r in pocket_server.requests) == [20, 100]
+
+
+def test_fetch_pages_retries(pocket_server):
+    pocket_server.failures = [503, 403, 500]
+    api = Pocket('key', 'token')
+    pages = list(fetch_pages(api, count=500, concurrency=2, backoff_base=0.001))
+    assert sum(len(page) for page in pages) == 1234
+
+
+def test_fetch_pages_gives_up(pocket_server):
+    api = Pocket('key', 'token')
+    pocket_server.failures = [401]
+    with pytest.raises(PocketAutException):
+        list(fetch_pages(api, count=500, concurrency=1, backoff_base=0.001))
+    pocket_server.failures = [503] * 3
+    with pytest.raises(PocketException):
+        retrieve_page(api, offset=0, count=10, max_retries=2, backoff_base=0.001)
+
+
+def test_fetch_data_dedup_and_progress(pocket_server):
+    pocket_server.items = pocket_server.items[:300] + pocket_server.items[250:300]  # duplicated across pages
+    progress = []
+    with patch('pocket_stats.data.fetch_pages',
+               lambda *args, **kwargs: fetch_pages(*args, **dict(kwargs, count=100))):
+        items = fetch_data(consumer_key='key', access_token='token', progress=progress.append)
+    assert [item['item_id'] for item in items] == [str(i) for i in range(300)]
+    assert progress == [100, 200, 300]
+
+
+def test_backoff_delay():
+    rate_limited = PocketException(403, 199, 'limit', '10', '0', '7', '100', '50', '3')
+    assert is_retryable(rate_limited)
+    assert backoff_delay(0, rate_limited) == 7
+    assert not is_retryable(PocketException(400, 199, 'bad request'))
+    assert not is_retryable(PocketAutException(401, 138, 'auth'))
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, ConnectionError(), base=1, max_delay=5) <= 5
+
+
+def test_fetch_data_more_than_a_thousand_records(pocket_server):
+    items = fetch_data(limit=1200, consumer_key='key', access_token='token', compact=True)
+    assert len(items) == 1200
+    assert items[-1]['item_id'] == '1199'
+    assert items[0].get('excerpt') is None
@@ -0,0 +1,134 @@
+import os
+import time
+import pytest
+from datetime import date, datetime, timezone
+from typing import List, Dict
+
+from pocket_stats.data import load_cache, build_table, should_pass_filters
+from pocket_stats.data import get_filter_mask, get_word_counts, get_domain_counts, count_words_in_title
+from pocket_stats.filters import match_value, record_value, OPERATORS
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+@pytest.mark.parametrize('filters', [
+    [['status', '=', 0]],
+    [['status', '!=', '1'], ['favorite', '=', 0]],
+    [['word_count', '>', 2000]],
+    [['word_count', '<', 2000], ['word_count', '>=', 0]],
+    [['word_count', 'between', [800, 3300]]],
+    [['status', 'in', [1, 2]]],
+    [['status', 'not in', ['0']]],
+    [['lang', '=', 'unknown']],
+    [['lang', 'in', ['en', 'vi']]],
+    [['domain', 'contains', 'kalzumeus']],
+    [['domain', '!=', 'kalzumeus.com']],
+    [['word_count', 'contains', '07']],
+    [['status', '=', 'abc']],
+])
+def test_mask_matches_record_filters(data: List[Dict], filters: List[List]):
+    table = build_table(data)
+    # the table stores the parsed domain and the normalized language
+    records = [dict(record,
+                    domain=table.categories['domain'][domain_code],
+                    lang=table.categories['lang'][lang_code])
+               for record, domain_code, lang_code in zip(data, table.column('domain'), table.column('lang'))]
+    expected = [should_pass_filters(filters, record) for record in records]
+    assert get_filter_mask(table, filters).tolist() == expected
+
+
+def test_mask_date_range(data: List[Dict]):
+    table = build_table(data)
+    start = datetime(2020, 7, 4, tzinfo=timezone.utc)
+    end = datetime(2020, 7, 5, tzinfo=timezone.utc)
+    mask = get_filter_mask(table, [['time_added', 'between', [start, end]]])
+    assert mask.tolist() == [True, True, False, False, False, False, False]
+
+
+@pytest.mark.skipif(not hasattr(time, 'tzset'), reason='time.tzset() is only on Unix')
+def test_naive_datetimes_are_in_the_default_timezone(data: List[Dict]):
+    filters = [['time_added', '>=', datetime(2020, 7, 4, 3)]]
+    masks = []
+    tz = os.environ.get('TZ')
+    try:
+        for name in ['UTC', 'America/Los_Angeles', 'Asia/Tokyo']:
+            os.environ['TZ'] = name
+            time.tzset()
+            masks.append(get_filter_mask(build_table(data), filters).tolist())  # a new table: not cached
+            assert [should_pass_filters(filters, record) for record in data] == masks[-1]
+    finally:
+        if tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = tz
+        time.tzset()
+    # 2020-07-04 03:00 UTC
+    assert masks == [[True, True, False, False, False, False, False]] * 3
+    table = build_table(data)
+    aware = datetime(2020, 7, 4, 3, tzinfo=timezone.utc)
+    assert get_filter_mask(table, [['time_added', '>=', aware]]).tolist() == masks[0]
+    assert get_filter_mask(table, [['time_added', '<', date(2020, 7, 4)]]).tolist() == [False] * 2 + [True] * 5
+
+
+def test_mask_is_cached(data: List[Dict]):
+    table = build_table(data)
+    mask = get_filter_mask(table, [['status', '=', 0]])
+    assert get_filter_mask(table, [['status', '=', 0]]) is mask
+    assert not mask.flags.writeable
+    assert get_filter_mask(table, [['status', 'in', [0, 1]]]).sum() == 7
+
+
+def test_mask_invalid(data: List[Dict]):
+    table = build_table(data)
+    with pytest.raises(NotImplementedError):
+        get_filter_mask(table, [['status', '==', 0]])
+    with pytest.raises(KeyError):
+        get_filter_mask(table, [['excerpt', '=', '']])
+
+
+def records_with_missing_values(data: List[Dict]) -> List[Dict]:
+    records = [dict(r) for r in data]
+    del records[0]['word_count']
+    records[1]['word_count'] = 'n/a'
+    del records[2]['status']
+    del records[3]['time_read']
+    return records
+
+
+@pytest.mark.parametrize('key', ['word_count', 'status', 'time_read', 'time_favorited', 'time_added'])
+def test_mask_matches_match_value(data: List[Dict], key: str):
+    # every operator, including the missing values and Pocket's 0 for unset epochs
+    records = records_with_missing_values(data)
+    table = build_table(records)
+    expected_values = {
+        '=': 0, '!=': 0, '<': 2000, '<=': 1593838984, '>': 0, '>=': 1,
+        'in': [0, 1, 805], 'not in': [0], 'between': [-1, 1593838984], 'contains': '9',
+    }
+    for op in OPERATORS:
+        expected = [match_value(op, record_value(r, key, op), expected_values[op]) for r in records]
+        assert get_filter_mask(table, [[key, op, expected_values[op]]]).tolist() == expected, op
+    # the missing values never pass a numeric comparison
+    assert not get_filter_mask(table, [['word_count', '<', 10 ** 9]])[:2].any()
+    assert not get_filter_mask(table, [['time_read', '<=', 10 ** 10]])[[0, 3, 4]].any()
+
+
+def test_mask_on_fields_outside_the_table(data: List[Dict]):
+    table = build_table(data)
+    url = data[1]['resolved_url']
+    mask = get_filter_mask(table, [['resolved_url', '=', url]], records=data)
+    assert mask.tolist() == [r['resolved_url'] == url for r in data]
+    assert get_filter_mask(table, [['item_id', '=', data[2]['item_id']]]).tolist() == [i == 2 for i in range(7)]
+    title = data[0]['given_title']
+    assert get_filter_mask(table, [['given_title', '=', title]]).sum() == 1
+    # the get_* functions given raw records accept them, like the record filters did
+    filters = [['resolved_url', 'contains', 'kalzumeus']]
+    passing = [r for r in data if should_pass_filters(filters, r)]
+    assert get_word_counts(data, filters=filters) == get_word_counts(passing)
+    assert get_domain_counts(data, filters=filters) == get_domain_counts(passing)
+    assert count_words_in_title(data, filters=filters) == count_words_in_title(passing)
@@ -0,0 +1,39 @@
+import os
+import pytest
+from typing import List, Dict
+
+from pocket_stats.data import load_cache, build_table
+from pocket_stats.records import compact_records
+from pocket_stats.fingerprint import content_fingerprint, column_fingerprints
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def test_content_fingerprint(data: List[Dict]):
+    fingerprint = content_fingerprint(data)
+    assert fingerprint == content_fingerprint([dict(r) for r in data])
+    assert fingerprint == content_fingerprint(compact_records(data))
+    assert fingerprint != content_fingerprint(data[1:])
+    changed = [dict(r) for r in data]
+    changed[2]['time_updated'] = str(int(changed[2]['time_updated']) + 1)
+    assert fingerprint != content_fingerprint(changed)
+    # fields other than the item ID and time_updated are not read
+    changed = [dict(r, excerpt='') for r in data]
+    assert fingerprint == content_fingerprint(changed)
+
+
+def test_column_fingerprints(data: List[Dict]):
+    columns = column_fingerprints(build_table(data))
+    assert columns == column_fingerprints(build_table(compact_records(data)))
+    assert columns['rows'] == '7'
+    changed = [dict(r) for r in data]
+    changed[0]['favorite'] = '0' if changed[0]['favorite'] == '1' else '1'
+    changed[0]['given_title'] = changed[0]['resolved_title'] = 'Another title'
+    other = column_fingerprints(build_table(changed))
+    assert {name for name in columns if columns[name] != other[name]} == {'favorite', 'titles'}
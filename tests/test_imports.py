@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+# seconds to import a module in a fresh interpreter, about 5x what it takes on a laptop
+IMPORT_TIME_BUDGET = {
+    'pocket_stats.data': 1.0,
+    'pocket_stats.__main__': 1.0,  # the fetch-data CLI
+    'pocket_stats.visualization': 1.5,  # gunicorn worker boot, dash itself takes most of it
+}
+# loaded on first use only
+LAZY_MODULES = ('pandas', 'nltk', 'tldextract', 'pocket', 'requests', 'plotly.express', 'dash_table', 'joblib')
+
+
+def import_module(name: str) -> dict:
+    code = ('import sys, time, json; start = time.perf_counter(); import {name}; '
+            'print(json.dumps({{"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}}))')
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', code.format(name=name)],
+                         cwd=ROOT_DIR, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         universal_newlines=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+@pytest.mark.parametrize('name', sorted(IMPORT_TIME_BUDGET))
+def test_import_time_budget(name: str):
+    import_module(name)  # compiles the modules the first time, like a deployed app already has
+    ans = import_module(name)
+    assert ans['seconds'] < IMPORT_TIME_BUDGET[name], f'importing {name} took {ans["seconds"]:.2f}s'
+    assert [m for m in LAZY_MODULES if m in ans['modules']] == []
+
+
+def test_import_does_not_configure_logging():
+    code = 'import logging, pocket_stats.data; print(len(logging.getLogger().handlers))'
+    out = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], cwd=ROOT_DIR, check=True,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True).stdout
+    assert out.strip() == '0'
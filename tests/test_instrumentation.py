@@ -0,0 +1,87 @@
+import time
+import flask
+import pytest
+from unittest.mock import patch
+
+from pocket_stats.instrumentation import Metrics, Profiler, timed, span, profiled, install_metrics, prometheus_text
+from pocket_stats.payload import install_response_size_report
+
+
+@pytest.fixture
+def metrics():
+    metrics = Metrics(enabled=True)
+    with patch('pocket_stats.instrumentation.METRICS', metrics):
+        yield metrics
+
+
+def test_timed(metrics: Metrics):
+    @timed()
+    def add(a, b):
+        return a + b
+
+    assert add(1, b=2) == 3
+    with span('block'):
+        time.sleep(0.01)
+    calls = metrics.functions.as_dict()
+    assert calls[f'{__name__}.add']['count'] == 1
+    assert calls['block']['sum'] >= 0.01
+    metrics.enabled = False
+    assert add(1, 2) == 3
+    assert metrics.functions.as_dict()[f'{__name__}.add']['count'] == 1
+
+
+def test_prometheus_text(metrics: Metrics):
+    metrics.functions.add('data.get_table', 0.5)
+    metrics.functions.add('data.get_table', 1.5)
+    metrics.callbacks.add('word_cloud_div.children', 2)
+    metrics.inc('fetch_items_total', 1000)
+    text = prometheus_text(metrics)
+    assert 'pocket_stats_function_seconds_count{function="data.get_table"} 2' in text
+    assert 'pocket_stats_function_seconds_sum{function="data.get_table"} 2.000000' in text
+    assert 'pocket_stats_function_seconds_max{function="data.get_table"} 1.500000' in text
+    assert 'pocket_stats_callback_seconds_count{output="word_cloud_div.children"} 1' in text
+    assert 'pocket_stats_fetch_items_total 1000' in text
+    assert 'pocket_stats_cache_hit_ratio' in text
+
+
+def test_profiler():
+    profiler = Profiler()
+    assert profiler.begin() is None
+    profiler.start(60)
+
+    def work():
+        return sum(range(1000))
+
+    with patch('pocket_stats.instrumentation.PROFILER', profiler):
+        profiled(work)()
+    assert 'work' in profiler.text()
+    profiler.start(0)
+    assert profiler.text() == 'Nothing profiled yet\n'
+
+
+def test_install_metrics(metrics: Metrics):
+    server = flask.Flask(__name__)
+
+    @server.route('/_dash-update-component', methods=['POST'])
+    def update():
+        return 'x' * 10
+
+    report = install_response_size_report(server)
+    install_metrics(server, report, metrics=metrics, profiling=True, profiler=Profiler())
+    client = server.test_client()
+    assert client.get('/_profile?seconds=60').status_code == 200
+    client.post('/_dash-update-component', json={'output': 'chart.figure'})
+    text = client.get('/metrics').data.decode()
+    assert 'pocket_stats_callback_seconds_count{output="chart.figure"} 1' in text
+    assert 'pocket_stats_callback_response_bytes_sum{output="chart.figure"} 10' in text
+    assert 'function calls' in client.get('/_profile?sort=tottime').data.decode()
+    assert client.get('/_profile?sort=bad').status_code == 400
+
+    server = flask.Flask(__name__)
+    install_metrics(server, metrics=metrics, profiling=False)
+    assert server.test_client().get('/_profile').status_code == 404
+    # profiling only: no metrics to serve
+    server = flask.Flask(__name__)
+    install_metrics(server, metrics=Metrics(enabled=False), profiling=True, profiler=Profiler())
+    assert server.test_client().get('/metrics').status_code == 404
+    assert server.test_client().get('/_profile').status_code == 200
@@ -0,0 +1,82 @@
+import os
+import numpy as np
+import pytest
+from typing import List, Dict
+from unittest.mock import patch
+
+from pocket_stats.data import load_cache, build_table, get_title_index
+from pocket_stats.text import TitleIndex
+from pocket_stats.parallel import parallel_jobs, shard_bounds, encode_strings, decode_strings, parallel_title_index
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def serial_title_index(titles: List[str], lang_codes: np.ndarray, langs: List[str]) -> TitleIndex:
+    return TitleIndex.from_titles(titles, (langs[code] for code in lang_codes))
+
+
+def assert_same_index(actual: TitleIndex, expected: TitleIndex):
+    assert actual.terms == expected.terms
+    assert actual.offsets.tolist() == expected.offsets.tolist()
+    assert actual.token_ids.tolist() == expected.token_ids.tolist()
+
+
+def test_parallel_jobs():
+    with patch('pocket_stats.parallel.os.cpu_count', return_value=8):
+        assert parallel_jobs(10, n_jobs=-1, min_records=100) == 1
+        assert parallel_jobs(1000, n_jobs=-1, min_records=100) == 8
+        assert parallel_jobs(1000, n_jobs=-2, min_records=100) == 7
+        assert parallel_jobs(1000, n_jobs=4, min_records=100) == 4
+        assert parallel_jobs(1000, n_jobs=16, min_records=100) == 8
+    with patch('pocket_stats.parallel.os.cpu_count', return_value=1):
+        assert parallel_jobs(10 ** 6, n_jobs=-1, min_records=100) == 1
+
+
+def test_shard_bounds():
+    assert shard_bounds(10, 3) == [(0, 3), (3, 6), (6, 10)]
+    assert shard_bounds(2, 4) == [(0, 1), (1, 2)]
+    assert shard_bounds(0, 2) == []
+
+
+def test_encode_strings():
+    strings = ['Café crème', '', 'Tiếng Việt', 'plain']
+    buffer, offsets = encode_strings(strings)
+    assert buffer.dtype == np.uint8 and len(offsets) == len(strings) + 1
+    assert decode_strings(buffer, offsets, 0, 4) == strings
+    assert decode_strings(buffer, offsets, 1, 3) == strings[1:3]
+
+
+def test_title_index_concat(data: List[Dict]):
+    table = build_table(data)
+    codes, langs = table.column('lang'), table.categories['lang']
+    expected = serial_title_index(table.titles, codes, langs)
+    parts = [serial_title_index(table.titles[start:end], codes[start:end], langs)
+             for start, end in shard_bounds(len(table), 3)]
+    assert_same_index(TitleIndex.concat(parts), expected)
+    assert len(TitleIndex.concat([])) == 0
+
+
+def test_parallel_title_index(data: List[Dict]):
+    table = build_table(data * 3)
+    codes, langs = table.column('lang'), table.categories['lang']
+    actual = parallel_title_index(table.titles, codes, langs, n_jobs=2)
+    assert_same_index(actual, serial_title_index(table.titles, codes, langs))
+    assert actual.top_terms(5) == serial_title_index(table.titles, codes, langs).top_terms(5)
+
+
+def test_get_title_index_switches_to_processes(data: List[Dict]):
+    table = build_table(data)
+    expected = serial_title_index(table.titles, table.column('lang'), table.categories['lang'])
+    with patch('pocket_stats.data.parallel_jobs', return_value=2), \
+            patch('pocket_stats.data.parallel_title_index', return_value=expected) as parallel:
+        assert get_title_index(table) is expected
+        assert parallel.call_args[0][3] == 2
+    with patch('pocket_stats.data.parallel_title_index') as parallel:
+        assert_same_index(get_title_index(build_table(data)), expected)  # below the threshold
+        assert parallel.call_count == 0
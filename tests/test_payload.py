@@ -0,0 +1,78 @@
+import os
+import json
+import flask
+import numpy as np
+import plotly.graph_objs as go
+import plotly.express as px
+from plotly.utils import PlotlyJSONEncoder
+import pandas as pd
+from typing import List, Dict
+import pytest
+
+from pocket_stats.data import load_cache, get_reading_time
+from pocket_stats.aggregates import compute_aggregates
+from pocket_stats.payload import compact_values, histogram_bars, slim_figure, install_response_size_report
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def test_compact_values():
+    assert compact_values(np.array([1.0, 2.0])).dtype == np.int64
+    assert compact_values(np.array([1 / 3, 2.0])).tolist() == [0.33, 2.0]
+    assert compact_values([1, 2]).tolist() == [1, 2]
+
+
+def test_histogram_bars_payload():
+    values = np.random.default_rng(0).integers(0, 10000, size=10000)
+    counts, edges = np.histogram(values, bins=np.arange(0, 10001, 500))
+    bars = histogram_bars(counts, edges, name='all')
+    assert bars.x.tolist()[:2] == [250, 750] and bars.width.tolist()[0] == 500
+
+    # trace payloads only, the figure template is the same for both
+    def payload(trace) -> int:
+        return len(json.dumps(trace.to_plotly_json(), cls=PlotlyJSONEncoder))
+
+    assert payload(bars) * 20 < payload(go.Histogram(x=values / 225))
+
+
+def test_slim_figure():
+    fig = slim_figure(px.line(pd.DataFrame({'a': [1 / 3, 2 / 3]})))
+    assert fig.data[0].y.tolist() == [0.33, 0.67]
+
+
+def test_reading_time_histogram(data: List[Dict]):
+    ans = compute_aggregates(data, [('reading_time_histogram', {'reading_speed': 200, 'bin_minutes': 10})])
+    histogram = ans['reading_time_histogram']
+    assert histogram['edges'].tolist() == [0, 10, 20, 30]
+    expected, _ = np.histogram(get_reading_time(data, reading_speed=200), bins=histogram['edges'])
+    assert histogram['all'].tolist() == expected.tolist()
+    assert (histogram[0] + histogram[1]).tolist() == expected.tolist()
+    edges = [0, 5, 60]
+    custom = compute_aggregates(data, [('reading_time_histogram', {'reading_speed': 200, 'edges': edges})])
+    expected, _ = np.histogram(get_reading_time(data, reading_speed=200), bins=edges)
+    assert custom['reading_time_histogram']['all'].tolist() == expected.tolist()
+
+
+def test_response_size_report():
+    server = flask.Flask(__name__)
+
+    @server.route('/_dash-update-component', methods=['POST'])
+    def update():
+        return 'x' * 100
+
+    report = install_response_size_report(server, serve=True)
+    client = server.test_client()
+    for _ in range(2):
+        client.post('/_dash-update-component', json={'output': 'chart.figure'})
+    assert report.as_dict() == {'chart.figure': {'count': 2, 'total_bytes': 200, 'max_bytes': 100, 'mean_bytes': 100}}
+    assert json.loads(client.get('/_response-sizes').data)['chart.figure']['count'] == 2
+    # only served with the instrumentation
+    server = flask.Flask(__name__)
+    install_response_size_report(server, serve=False)
+    assert server.test_client().get('/_response-sizes').status_code == 404
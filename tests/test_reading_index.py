@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from freezegun import freeze_time
+
+from pocket_stats.reading_index import ReadingIndex
+
+
+DAY = 24 * 3600
+
+
+def test_window_average_matches_scan():
+    rng = np.random.default_rng(0)
+    time_updated = rng.integers(0, 100 * DAY, size=500)
+    word_counts = rng.integers(0, 5000, size=500)
+    index = ReadingIndex(time_updated, word_counts)
+    assert len(index) == 500
+    for start, end in [(0, None), (10 * DAY, 20 * DAY), (50 * DAY + 17, 50 * DAY + 17), (200 * DAY, None)]:
+        mask = (time_updated >= start) & ((end is None) or (time_updated < end))
+        expected = float(word_counts[mask].mean()) if mask.any() else 0
+        assert np.isclose(index.average_words(start, end), expected)
+
+
+@freeze_time("2020-07-10")
+def test_average_words_since():
+    now = pd.Timestamp('2020-07-10').timestamp()
+    index = ReadingIndex(np.array([now - 1 * DAY, now - 3 * DAY, now - 10 * DAY]), np.array([100, 300, 1000]))
+    assert index.average_words_since(2) == 100
+    assert index.average_words_since(7) == 200
+    assert index.average_words_since(30) == 1400 / 3
+    assert ReadingIndex(np.array([]), np.array([])).average_words_since(7) == 0
+
+
+def test_rolling():
+    day = pd.Timestamp('2020-07-01 12:00', tz='UTC').timestamp()
+    index = ReadingIndex(np.array([day, day + 2 * DAY, day + 2 * DAY]), np.array([300, 100, 200]))
+    rolling = index.rolling(window_days=2)
+    assert rolling.index.tolist() == list(pd.date_range('2020-07-01', '2020-07-03', freq='D', tz='UTC'))
+    assert rolling['Words read per day'].tolist() == [150, 150, 150]
+    assert rolling['Words per article read'].tolist() == [300, 300, 150]
+    assert len(ReadingIndex(np.array([]), np.array([])).rolling()) == 0
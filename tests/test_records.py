@@ -0,0 +1,43 @@
+import os
+import json
+import pickle
+import pytest
+from typing import List, Dict
+
+from pocket_stats.data import load_cache, build_table, get_domain_counts, should_pass_filters
+from pocket_stats.records import CompactRecord, compact_records
+from pocket_stats.domains import get_domain_from_url
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def test_compact_record(data: List[Dict]):
+    record = CompactRecord(data[0])
+    assert record['status'] == 0
+    assert record.get('word_count') == 2207
+    assert record['given_title'] == 'strace Wow Much Syscall'
+    assert record['domain'] == get_domain_from_url(data[0]['resolved_url'])
+    assert record.get('excerpt') is None
+    with pytest.raises(KeyError):
+        record['excerpt']
+    with pytest.raises(AttributeError):
+        record.excerpt = ''  # no __dict__
+    assert json.loads(json.dumps(dict(record)))['item_id'] == '615710633'
+    assert pickle.loads(pickle.dumps(record)) == record
+
+
+def test_compact_records_give_same_stats(data: List[Dict]):
+    records = compact_records(data)
+    assert compact_records(records)[0] is records[0]
+    assert get_domain_counts(records) == get_domain_counts(data)
+    assert build_table(records).columns.keys() == build_table(data).columns.keys()
+    for name, column in build_table(records).columns.items():
+        assert column.tolist() == build_table(data).columns[name].tolist(), name
+    assert [should_pass_filters([['status', '=', '1']], r) for r in records] == \
+        [should_pass_filters([['status', '=', '1']], r) for r in data]
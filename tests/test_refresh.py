@@ -0,0 +1,98 @@
+import os
+import time
+import functools
+import threading
+import pytest
+from typing import List, Dict
+from unittest.mock import patch
+
+from pocket_stats import data as data_module
+from pocket_stats.data import load_cache
+from pocket_stats.cache import MemoryCache
+from pocket_stats.storage import SnapshotStore
+from pocket_stats.refresh import KeyedLocks, RefreshScheduler
+from tests.test_storage import pages
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def test_keyed_locks():
+    locks = KeyedLocks()
+    with locks.hold('a'):
+        with locks.hold('b'):  # other keys are not blocked
+            assert set(locks._locks) == {'a', 'b'}
+    assert locks._locks == {}
+
+
+def test_refresh_scheduler_single_flight_and_bounded_queue():
+    calls = []
+    started, release = threading.Event(), threading.Event()
+
+    def refresh(token, limit):
+        calls.append((token, limit))
+        started.set()
+        release.wait(5)
+        if token == 'b':
+            raise ConnectionError('offline')
+
+    scheduler = RefreshScheduler(refresh, n_threads=1, max_queued=1)
+    assert scheduler.schedule('a', 10)
+    assert started.wait(5)
+    assert not scheduler.schedule('a', 10)  # already being refreshed
+    assert scheduler.schedule('b')
+    assert not scheduler.schedule('b')  # already queued
+    assert not scheduler.schedule('c')  # the queue is full
+    release.set()
+    scheduler.join()
+    assert calls == [('a', 10), ('b', None)]
+    assert not scheduler.pending('a') and not scheduler.pending('b')
+    # a failed refresh does not stop the thread
+    assert scheduler.schedule('c')
+    scheduler.join()
+    assert calls[-1] == ('c', None)
+
+
+def test_get_data_entry_stale_while_revalidate(tmp_path, data: List[Dict]):
+    retrieve, calls = pages(data)
+
+    def fetches(delta: bool) -> int:
+        # fetch_pages() asks for several pages at once, each fetch starts at offset 0
+        return sum(1 for c in calls if c['offset'] == 0 and (c['since'] is not None) == delta)
+
+    def slow_retrieve(**kwargs):
+        time.sleep(0.05)
+        return retrieve(**kwargs)
+
+    store = SnapshotStore(snapshot_dir=str(tmp_path))
+    sync = functools.partial(data_module.sync_data, consumer_key='key', store=store, compact=False)
+    scheduler = RefreshScheduler(data_module.refresh_data_entry)
+    with patch('pocket.Pocket.retrieve', side_effect=slow_retrieve), \
+            patch.object(data_module, 'sync_data', sync), \
+            patch.object(data_module, 'get_cache', return_value=MemoryCache()), \
+            patch.object(data_module, '_refresh_scheduler', scheduler):
+        # concurrent requests for a library that is not cached share one fetch
+        entries = []
+        threads = [threading.Thread(target=lambda: entries.append(data_module.get_data_entry('token')))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert fetches(delta=False) == 1
+        assert all(entry is entries[0] for entry in entries)
+        # a fresh entry is served without refreshing it
+        assert data_module.get_data_entry('token', refresh_after=3600) is entries[0]
+        assert fetches(delta=True) == 0
+        # an old one is served right away and refreshed in the background with a delta sync
+        assert data_module.get_data_entry('token', refresh_after=1e-9) is entries[0]
+        scheduler.join()
+        assert (fetches(delta=False), fetches(delta=True)) == (1, 1)
+        refreshed = data_module.get_data_entry('token')
+        assert refreshed['version'] > entries[0]['version']
+        assert refreshed['items'] == data
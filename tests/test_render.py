@@ -0,0 +1,40 @@
+import threading
+import pytest
+
+from pocket_stats.render import RenderPool
+
+
+def test_render_pool_builds_once_per_key():
+    calls = []
+    release = threading.Event()
+
+    def build(name):
+        calls.append(name)
+        release.wait(5)
+        return name.upper()
+
+    pool = RenderPool(max_workers=2, max_results=2)
+    first = pool.submit('a', build, 'a')
+    assert pool.submit('a', build, 'a') is first  # in progress builds are shared
+    release.set()
+    assert pool.result('a', build, 'a') == 'A'
+    assert pool.result('b', build, 'b') == 'B'
+    assert calls == ['a', 'b']
+    pool.result('c', build, 'c')  # evicts 'a'
+    pool.result('a', build, 'a')
+    assert calls == ['a', 'b', 'c', 'a']
+
+
+def test_render_pool_retries_failed_builds():
+    attempts = []
+
+    def build():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ValueError('boom')
+        return 'ok'
+
+    pool = RenderPool(max_workers=1)
+    with pytest.raises(ValueError):
+        pool.result('key', build)
+    assert pool.result('key', build) == 'ok'
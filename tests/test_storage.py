@@ -0,0 +1,99 @@
+import os
+import pytest
+from typing import List, Dict
+from unittest.mock import patch
+
+from pocket_stats.data import load_cache, sync_data, fetch_data
+from pocket_stats.storage import SnapshotStore
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(snapshot_dir=str(tmp_path))
+
+
+def pages(items: List[Dict], count: int = 500, server_time: int = 1600000000):
+    # fake Pocket.retrieve() serving the given items, newest first, at the given time of Pocket's clock
+    calls = []
+
+    def retrieve(offset=0, count=count, since=None, **kwargs):
+        calls.append({'offset': offset, 'count': count, 'since': since})
+        selected = items[offset:offset + count]
+        return {'list': {item['item_id']: item for item in selected}, 'since': server_time + len(calls)}
+    return retrieve, calls
+
+
+def test_snapshot_store_roundtrip(store: SnapshotStore, data: List[Dict]):
+    assert store.load('token') is None
+    store.save('token', data, last_sync=100, complete=True)
+    snapshot = store.load('token')
+    assert snapshot.items == data
+    assert snapshot.last_sync == 100
+    assert snapshot.covers(10 ** 6)
+    assert store.load('token', limit=3).items == data[:3]
+    assert 'token' not in os.path.basename(store.path('token'))
+    assert store.load('another token') is None
+
+
+def test_snapshot_store_apply_delta(store: SnapshotStore, data: List[Dict]):
+    store.save('token', data[:5], last_sync=100, complete=False)
+    archived = dict(data[0], status='1')
+    deleted = {'item_id': data[1]['item_id'], 'status': '2'}
+    added = dict(data[4], item_id='new', time_added=str(int(data[0]['time_added']) + 1))
+    store.apply_delta('token', [archived, deleted, added], last_sync=200)
+    snapshot = store.load('token')
+    assert [item['item_id'] for item in snapshot.items] == ['new'] + [data[i]['item_id'] for i in [0, 2, 3, 4]]
+    assert snapshot.items[1]['status'] == '1'
+    assert snapshot.last_sync == 200
+    assert snapshot.complete is False
+    assert store.covers('token', 5) and not store.covers('token', 6)
+
+
+def test_snapshot_store_delta_keeps_window(store: SnapshotStore, data: List[Dict]):
+    # an item older than the newest 3 that changed is not stored, it would leave a gap before it
+    store.save('token', data[:3], last_sync=100, complete=False)
+    store.apply_delta('token', [dict(data[5], status='1')], last_sync=200)
+    assert [item['item_id'] for item in store.load('token').items] == [data[i]['item_id'] for i in range(3)]
+    assert store.covers('token', 3) and not store.covers('token', 4)
+    assert not store.load('token').covers(4)
+
+
+def test_sync_data_full_then_delta(store: SnapshotStore, data: List[Dict]):
+    retrieve, calls = pages(data)
+    with patch('pocket.Pocket.retrieve', side_effect=retrieve):
+        assert sync_data('token', limit=5, consumer_key='key', store=store, compact=False) == data[:5]
+        assert calls[-1]['since'] is None
+        # Pocket's time of the first request, not the local clock
+        assert store.load('token').last_sync == 1600000001
+        # served from the snapshot, only asking Pocket for the changes
+        n_calls = len(calls)
+        syncs = []
+        assert sync_data('token', limit=3, consumer_key='key', store=store, compact=False,
+                         on_sync=syncs.append) == data[:3]
+        assert calls[n_calls]['since'] == 1600000001
+        assert (syncs[0].since, syncs[0].last_sync) == (1600000001, n_calls + 1600000001)
+        assert [item['item_id'] for item in syncs[0].changed] == [item['item_id'] for item in data]
+        # more items than the snapshot holds: full fetch again
+        assert sync_data('token', limit=7, consumer_key='key', store=store, compact=False) == data
+        assert store.load('token').complete is False
+        assert sync_data('token', limit=None, consumer_key='key', store=store, compact=False) == data
+        assert store.load('token').complete is True
+
+
+def test_fetch_data_overwrite_cache(tmp_path, data: List[Dict]):
+    retrieve, _ = pages(data)
+    with patch('pocket.Pocket.retrieve', side_effect=retrieve), \
+            patch('pocket_stats.data.SNAPSHOT_DIR', str(tmp_path)), \
+            patch('pocket_stats.data.SnapshotStore', lambda: SnapshotStore(str(tmp_path))):
+        fetch_data(limit=10, consumer_key='key', access_token='token', overwrite_cache=True)
+        with pytest.raises(AssertionError):
+            fetch_data(offset=2, consumer_key='key', access_token='token', overwrite_cache=True)
+    assert SnapshotStore(str(tmp_path)).load('token').items == data
@@ -0,0 +1,120 @@
+import os
+import pytest
+import threading
+import numpy as np
+from typing import List, Dict
+from unittest.mock import patch
+from freezegun import freeze_time
+
+from pocket_stats.data import load_cache
+from pocket_stats.aggregates import compute_aggregates
+from pocket_stats.incremental import IncrementalAggregates
+from pocket_stats.cache import MemoryCache
+from pocket_stats import streaming
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def assert_same_aggregates(actual: Dict, expected: Dict):
+    assert actual.keys() == expected.keys()
+    for name in expected:
+        if name in ('word_count_histogram', 'reading_distribution'):
+            for k in expected[name]:
+                assert np.array_equal(actual[name][k], expected[name][k]), k
+        elif name.endswith('time_series') or name == 'words_read_rolling':
+            assert actual[name].equals(expected[name]), name
+        else:
+            assert actual[name] == expected[name], name
+
+
+@freeze_time("2020-07-01")
+def test_incremental_aggregates_match_full_computation(data: List[Dict]):
+    aggregates = IncrementalAggregates()
+    for page in [data[:3], data[3:4], data[4:]]:
+        aggregates.apply(page)
+    assert_same_aggregates(aggregates.to_aggregates(), compute_aggregates(data))
+
+
+def test_incremental_aggregates_partial(data: List[Dict]):
+    aggregates = IncrementalAggregates()
+    assert aggregates.to_aggregates()['count'] == 0
+    aggregates.apply(data[:2])
+    partial = aggregates.to_aggregates()
+    assert partial['count'] == 2
+    assert partial['domain_counts'][1] == {'martinheinz.dev': 1}
+
+
+def test_streaming_load(data: List[Dict]):
+    cache = MemoryCache()
+    started = threading.Event()
+
+    def pages(**kwargs):
+        started.wait(timeout=5)  # still loading when it is asked for again
+        yield data[:4]
+        yield data[4:]
+    with patch.object(streaming, 'iter_data', pages), \
+            patch.object(streaming, 'save_snapshot') as save_snapshot, \
+            patch('data.get_cache', return_value=cache):
+        load = streaming.start_streaming_load('token', limit=250)
+        assert streaming.start_streaming_load('token', limit=250) is load
+        started.set()
+        load.join(timeout=5)
+        assert load.done and load.error is None
+        assert load.snapshot()['count'] == 7
+        assert load.items == data
+        assert save_snapshot.call_count == 1
+        # dropped once in the cache, even if no tab asks for it again
+        assert streaming.get_streaming_load('token', limit=250) is None
+    # the fetched library is in the data cache for the next get_data() call
+    assert len(cache._entries) == 1
+
+
+def test_streaming_load_error():
+    def failing(**kwargs):
+        raise ConnectionError('offline')
+        yield
+    with patch.object(streaming, 'iter_data', failing):
+        load = streaming.start_streaming_load('token', limit=None)
+        load.join(timeout=5)
+    assert load.done
+    assert isinstance(load.error, ConnectionError)
+    # kept to report the error, for a while only
+    assert streaming.get_streaming_load('token', limit=None) is load
+    with patch.object(streaming, 'STREAM_ERROR_TTL', -1), patch.object(streaming, 'iter_data', failing):
+        other = streaming.start_streaming_load('other token', limit=None)
+        other.join(timeout=5)
+    assert streaming.get_streaming_load('token', limit=None) is None
+
+
+@freeze_time("2020-07-01")
+def test_incremental_aggregates_apply_delta(data: List[Dict]):
+    aggregates = IncrementalAggregates()
+    aggregates.apply(data)
+    previous = {r['item_id']: r for r in data}
+    unread = next(r for r in data if r['status'] == '0')
+    archived = dict(unread, status='1', time_read='1593000000', time_updated='1593000000')
+    deleted = dict(next(r for r in data if r['status'] == '1'), status='2')
+    added = dict(data[0], item_id='1', given_title='Brand new words', resolved_title='Brand new words')
+    aggregates.apply_delta([archived, deleted, added], previous)
+    library = [archived if r is unread else r for r in data if r['item_id'] != deleted['item_id']] + [added]
+    assert_same_aggregates(aggregates.to_aggregates(), compute_aggregates(library))
+    # retracting every record leaves empty aggregates
+    aggregates.retract(library)
+    assert_same_aggregates(aggregates.to_aggregates(), IncrementalAggregates().to_aggregates())
+    assert not any(aggregates.domains.values()) and not aggregates.title_words
+
+
+def test_incremental_aggregates_retract_not_applied(data: List[Dict]):
+    aggregates = IncrementalAggregates()
+    aggregates.apply(data[:3])
+    before = aggregates.to_aggregates()
+    with pytest.raises(ValueError):
+        aggregates.retract(data[2:4])
+    # nothing was retracted
+    assert_same_aggregates(aggregates.to_aggregates(), before)
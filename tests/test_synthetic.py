@@ -0,0 +1,34 @@
+import os
+import sys
+
+from pocket_stats.data import build_table, get_domain_counts, get_language_counts
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'benchmarks'))
+
+from synthetic import synthetic_records  # noqa: E402
+from run_benchmarks import regressions  # noqa: E402
+
+
+def test_synthetic_records():
+    records = synthetic_records(500, seed=1)
+    assert records == synthetic_records(500, seed=1)
+    assert len({r['item_id'] for r in records}) == 500
+    assert [int(r['time_added']) for r in records] == sorted((int(r['time_added']) for r in records), reverse=True)
+    table = build_table(records)
+    assert len(table) == 500
+    domains = get_domain_counts(table)
+    assert domains.most_common(1)[0][0] == 'medium.com'
+    assert get_language_counts(table).most_common(1)[0][0] == 'en'
+    for r in records:
+        assert int(r['time_updated']) >= int(r['time_added'])
+        assert (r['status'] == '1') == (r['time_read'] != '0')
+
+
+def test_regressions():
+    baseline = {'1000': {'reload': {'seconds': 0.1, 'peak_mb': 10}, 'get_unread_count': {'seconds': 0, 'peak_mb': 0}}}
+    results = {'1000': {'reload': {'seconds': 0.2, 'peak_mb': 10},
+                        'get_unread_count': {'seconds': 0.001, 'peak_mb': 0}},  # too fast to be compared
+               '10000': {'reload': {'seconds': 1, 'peak_mb': 100}}}
+    found = regressions(results, baseline, tolerance=1.5)
+    assert len(found) == 1 and found[0].startswith('reload on 1000 records')
+    assert regressions(results, baseline, tolerance=3) == []
@@ -0,0 +1,41 @@
+import os
+import pytest
+import numpy as np
+from typing import List, Dict
+
+from pocket_stats.data import load_cache, build_table
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def test_build_table(data: List[Dict]):
+    table = build_table(data)
+    assert len(table) == 7
+    assert table.column('status').tolist() == [0, 1, 1, 0, 0, 0, 0]
+    assert table.column('word_count').dtype == np.int64
+    assert table.categories['lang'] == ['en', 'unknown']
+    assert table.categories['domain'][table.column('domain')[1]] == 'martinheinz.dev'
+    assert table.titles[0] == 'strace Wow Much Syscall'
+    with pytest.raises(KeyError):
+        table.column('excerpt')
+
+
+def test_build_table_missing_fields():
+    table = build_table([{'word_count': '12'}])
+    assert table.column('word_count').tolist() == [12]
+    assert table.column('status').tolist() == [-1]
+
+
+def test_take_and_category_counts(data: List[Dict]):
+    table = build_table(data)
+    unread = table.take(table.column('status') == 0)
+    assert len(unread) == 5
+    assert unread.category_counts('domain') == {
+        'brendangregg.com': 1, 'kalzumeus.com': 2, 'awealthofcommonsense.com': 1, 'jlcollinsnh.com': 1,
+    }
@@ -0,0 +1,31 @@
+import numpy as np
+
+from pocket_stats.text import get_stopwords, normalize_text, tokenize_title, TitleIndex
+
+
+def test_get_stopwords():
+    assert isinstance(get_stopwords('en'), frozenset)
+    assert 'the' in get_stopwords('en')
+    assert get_stopwords('unknown') == get_stopwords('en')
+    assert get_stopwords('EN-us') >= get_stopwords('en')
+
+
+def test_tokenize_title():
+    assert normalize_text('Ｃafé’s') == "café's"
+    assert tokenize_title("Don't Call Yourself A Programmer, And Other Career Advice | Kalzumeus") == \
+        ['call', 'programmer', 'career', 'advice', 'kalzumeus']
+    assert tokenize_title('Straße & Café: e-mail_2020 — Ünïcode!') == ['strasse', 'café', 'e-mail', '2020', 'ünïcode']
+    assert tokenize_title('') == []
+
+
+def test_title_index():
+    index = TitleIndex.from_titles(['Python tips', 'The python book', '', 'Book of tips, tips'], ['en'] * 4)
+    assert len(index) == 4
+    assert index.terms == ['python', 'tips', 'book']
+    assert index.row_tokens(3) == ['book', 'tips', 'tips']
+    assert index.term_counts() == {'python': 2, 'tips': 3, 'book': 2}
+    assert index.term_counts(np.array([True, True, True, False])) == {'python': 2, 'tips': 1, 'book': 1}
+    assert index.top_terms(2) == [('tips', 3), ('python', 2)]
+    assert index.top_terms(10, np.array([False, False, True, False])) == []
+    assert index.rows_with('Tips').tolist() == [0, 3]
+    assert index.rows_with('missing').tolist() == []
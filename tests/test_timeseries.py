@@ -0,0 +1,53 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+from typing import List, Dict
+from collections import Counter
+
+from pocket_stats.data import load_cache, build_table
+from pocket_stats.timeseries import bin_epochs, time_series, merge_counts, event_epochs, DEFAULT_EVENTS
+
+
+CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+
+@pytest.fixture
+def data():
+    return load_cache(cache_file=os.path.join(CURRENT_DIR, 'test_cache_data.json'))
+
+
+def test_bin_epochs():
+    epochs = np.array([
+        pd.Timestamp('2020-07-05 23:30', tz='UTC').timestamp(),  # Sunday
+        pd.Timestamp('2020-07-06 00:30', tz='UTC').timestamp(),  # Monday
+        pd.Timestamp('2020-08-01 03:00', tz='UTC').timestamp(),
+    ], dtype=np.int64)
+    assert bin_epochs(epochs).astype(str).tolist() == ['2020-07-05', '2020-07-06', '2020-08-01']
+    assert bin_epochs(epochs, 'week').astype(str).tolist() == ['2020-06-29', '2020-07-06', '2020-07-27']
+    assert bin_epochs(epochs, 'month').astype(str).tolist() == ['2020-07-01', '2020-07-01', '2020-08-01']
+    assert bin_epochs(epochs, tz='Asia/Ho_Chi_Minh').astype(str).tolist() == ['2020-07-06', '2020-07-06', '2020-08-01']
+    assert bin_epochs(epochs, tz='America/New_York').astype(str).tolist() == ['2020-07-05', '2020-07-05', '2020-07-31']
+    with pytest.raises(NotImplementedError):
+        bin_epochs(epochs, 'year')
+
+
+def test_time_series(data: List[Dict]):
+    df = time_series(build_table(data))
+    assert list(df.columns) == ['All articles', 'Archived articles', 'Favorited articles', 'Read articles']
+    assert df['All articles'].sum() == 7
+    assert df['Archived articles'].sum() == 2
+    assert str(df.index.tz) == 'UTC'
+    weekly = time_series(build_table(data), ('added',), granularity='week', tz='Europe/Paris')
+    assert weekly.to_dict() == {'All articles': {pd.Timestamp('2020-06-29', tz='Europe/Paris'): 7}}
+    assert len(time_series(build_table([]))) == 0
+
+
+def test_merge_counts_matches_time_series(data: List[Dict]):
+    table = build_table(data)
+    day_counts = {}
+    for event in DEFAULT_EVENTS:
+        days, counts = np.unique(bin_epochs(event_epochs(table, event)), return_counts=True)
+        day_counts[event] = Counter(dict(zip(days.tolist(), counts.tolist())))
+    for granularity in ['day', 'week', 'month']:
+        assert merge_counts(day_counts, granularity).equals(time_series(table, granularity=granularity))
@@ -1,9 +1,20 @@
 import os
+import json
+import shutil
+import subprocess
 import pytest
+from unittest.mock import patch
+from dash.exceptions import PreventUpdate
 import dash_html_components as html
 import plotly.graph_objs as go
-from pocket_stats.data import load_cache
+from pocket_stats.data import load_cache, build_table
+from pocket_stats.aggregates import compute_aggregates
 from pocket_stats.visualization import create_app, get_reading_time_chart, get_reading_time_needed
+from pocket_stats.visualization import word_cloud_plot, articles_over_time_plot, word_counts_plot
+from pocket_stats.visualization import domain_counts_plot, language_counts_plot, favorite_count_plot
+from pocket_stats.visualization import composition_plot
+from pocket_stats.visualization import READING_TIME_CLIENTSIDE, reading_distribution_store
+from pocket_stats.visualization import SECTIONS, LAZY_SECTIONS, render_section, streaming_section
 
 
 CURRENT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -26,4 +37,50 @@ def test_get_reading_time_needed():
 
 
 def test_create_app(data):
-    create_app(data)  # won't load cache
+    app = create_app(data)  # won't load cache
+
+    def session(layout) -> str:
+        return next(c.data for c in layout.children if getattr(c, 'id', None) == 'session')
+    # every page load, i.e. every tab, has its own session
+    assert session(app.layout()) != session(app.layout())
+
+
+def test_plot_builders_share_aggregates(data):
+    table = build_table(data)
+    aggregates = compute_aggregates(table)
+    for builder in [word_cloud_plot, articles_over_time_plot, word_counts_plot, domain_counts_plot,
+                    language_counts_plot, favorite_count_plot, composition_plot]:
+        assert builder(table, aggregates=aggregates) is not None
+        assert builder(data) is not None  # standalone call computes its own aggregates
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_reading_time_clientside_matches_server(data):
+    table = build_table(data)
+    store = reading_distribution_store(compute_aggregates(table)['reading_distribution'])
+    script = (f'var window = {{dash_clientside: {{no_update: null}}}}; var f = {READING_TIME_CLIENTSIDE};'
+              f'console.log(JSON.stringify(f(200, 60, {json.dumps(store)})));')
+    out = subprocess.run(['node', '-e', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         universal_newlines=True, check=True).stdout
+    figure, title, needed = json.loads(out)
+    assert [trace['y'] for trace in figure['data']] == [list(t.y) for t in get_reading_time_chart(table, 200).data]
+    server_needed = get_reading_time_needed(table, 200, 60).children
+    assert [title, needed] == [server_needed[0].children, server_needed[1].children]
+
+
+def test_render_section(data):
+    table = build_table(data)
+    aggregates = compute_aggregates(table)
+    dataset = {'token': 'token', 'limit': None, 'version': 1.0, 'loading': False, 'count': 7}
+    with patch('pocket_stats.visualization.get_table', return_value=table) as get_table, \
+            patch('pocket_stats.visualization.get_aggregates', return_value=aggregates) as get_aggregates:
+        for name in SECTIONS:
+            assert render_section(name, dataset) is not None
+            assert render_section(name, dataset) is render_section(name, dataset)  # built once per version
+        assert get_aggregates.call_count == len(SECTIONS)
+        assert get_table.call_count == 0  # sections are built from the aggregates only
+    with pytest.raises(PreventUpdate):
+        render_section('word_cloud_div', None)
+    assert set(LAZY_SECTIONS) < set(SECTIONS)
+    for name in SECTIONS:
+        assert streaming_section(name, aggregates) is not None
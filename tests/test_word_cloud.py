@@ -0,0 +1,41 @@
+import itertools
+from unittest.mock import patch
+
+from pocket_stats.cache import MemoryCache
+from pocket_stats.word_cloud import CHAR_WIDTH, layout_words, font_sizes, top_words, get_word_cloud_layout
+
+
+WORD_COUNTS = {f'word{i}': 1000 // (i + 1) for i in range(300)}
+
+
+def test_top_words_and_font_sizes():
+    assert top_words({'b': 2, 'a': 2, 'c': 5}, k=2) == [('c', 5), ('a', 2)]
+    assert font_sizes([100, 25, 1], sizes=(10, 60)) == [60, 32, 10]
+    assert font_sizes([3, 3], sizes=(10, 60)) == [60, 60]
+
+
+def test_layout_words_is_deterministic():
+    placed = layout_words(WORD_COUNTS, k=100)
+    assert len(placed) == 100
+    assert [p.word for p in placed[:3]] == ['word0', 'word1', 'word2']
+    assert layout_words(dict(reversed(list(WORD_COUNTS.items()))), k=100) == placed
+    assert layout_words(WORD_COUNTS, k=100, seed=1) != placed
+
+
+def test_layout_words_without_overlap():
+    placed = layout_words(WORD_COUNTS, k=300, size=(800, 400))
+    assert 0 < len(placed) <= 300
+    boxes = [(p.x - CHAR_WIDTH * p.font_size * len(p.word) / 2, p.y - p.font_size / 2,
+              p.x + CHAR_WIDTH * p.font_size * len(p.word) / 2, p.y + p.font_size / 2) for p in placed]
+    for x0, y0, x1, y1 in boxes:
+        assert 0 <= x0 and x1 <= 800 and 0 <= y0 and y1 <= 400
+    for a, b in itertools.combinations(boxes, 2):
+        assert a[2] <= b[0] or b[2] <= a[0] or a[3] <= b[1] or b[3] <= a[1], (a, b)
+
+
+def test_get_word_cloud_layout_is_cached():
+    cache = MemoryCache()
+    with patch('pocket_stats.word_cloud.get_cache', return_value=cache):
+        placed = get_word_cloud_layout(WORD_COUNTS, k=50)
+        assert get_word_cloud_layout(WORD_COUNTS, k=50) == placed
+    assert (cache.stats.sets, cache.stats.hits) == (1, 1)